@@ -0,0 +1,238 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from flask import current_app
+
+from similarity import char_ngrams
+
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_SIZE = 2000
+# Trigram Jaccard needed for a near-duplicate hit. Off by default: a high score doesn't mean the same
+# question ("MBA in 2024" vs "MBA in 2025" scores 0.857), so only enable it knowing some answers will
+# be reused for questions that differ in a word or two. Questions must also have the same numbers.
+DEFAULT_SIMILARITY = 0
+
+
+def normalize_prompt(text):
+    """Lower-case, turn punctuation into spaces (keeping the + and # of C++ / C#) and collapse whitespace."""
+    return ' '.join(''.join(c if c.isalnum() or c in '+#' else ' ' for c in (text or '').lower()).split())
+
+
+def _number_tokens(question):
+    """Tokens with a digit in them (years, versions, amounts), which near-duplicates must share exactly."""
+    return frozenset(token for token in question.split() if any(c.isdigit() for c in token))
+
+
+def _fingerprint(question):
+    return set(char_ngrams(question)), _number_tokens(question)
+
+
+def _jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class _ResponseStore:
+    """One app's cache file, counters and trigram index. The file is opened on first use."""
+
+    def __init__(self, path, ttl, max_size, similarity):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.similarity = similarity
+        self.enabled = ttl > 0 and max_size > 0
+        self._lock = threading.Lock()
+        self._db = None
+        self._grams = None # key -> (context hash, trigram set, number tokens), loaded on first near-duplicate lookup
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+
+    @property
+    def _conn(self):
+        # Called with self._lock held
+        if self._db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode = WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS ai_response (
+                    key TEXT PRIMARY KEY,
+                    context TEXT NOT NULL,
+                    question TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    used_at REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    cost_seconds REAL NOT NULL DEFAULT 0
+                )
+            """)
+            self._db.execute("CREATE INDEX IF NOT EXISTS ix_ai_response_used_at ON ai_response (used_at)")
+        return self._db
+
+    @staticmethod
+    def _context_hash(context):
+        return hashlib.sha256(context.encode('utf-8')).hexdigest()[:16]
+
+    def _key(self, context_hash, question):
+        return context_hash + ':' + hashlib.sha256(question.encode('utf-8')).hexdigest()
+
+    def _load_grams(self):
+        if self._grams is None:
+            rows = self._conn.execute("SELECT key, context, question FROM ai_response").fetchall()
+            self._grams = {key: (context,) + _fingerprint(question) for key, context, question in rows}
+        return self._grams
+
+    def _nearest(self, context_hash, question):
+        grams, numbers = _fingerprint(question)
+        best_key, best_score = None, self.similarity
+        for key, (context, candidate, candidate_numbers) in self._load_grams().items():
+            if context != context_hash or candidate_numbers != numbers:
+                continue
+            score = _jaccard(grams, candidate)
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    def _forget(self, key):
+        self._conn.execute("DELETE FROM ai_response WHERE key = ?", (key,))
+        if self._grams is not None:
+            self._grams.pop(key, None)
+
+    def get(self, question, context=''):
+        if not self.enabled:
+            return None
+        question = normalize_prompt(question)
+        context_hash = self._context_hash(context)
+        now = time.time()
+        with self._lock:
+            key = self._key(context_hash, question)
+            row = self._conn.execute("SELECT response, created_at, cost_seconds FROM ai_response WHERE key = ?", (key,)).fetchone()
+            near = False
+            if row is None and self.similarity > 0:
+                key = self._nearest(context_hash, question)
+                if key is not None:
+                    row = self._conn.execute("SELECT response, created_at, cost_seconds FROM ai_response WHERE key = ?", (key,)).fetchone()
+                    if row is None:
+                        self._grams.pop(key, None) # Evicted since the trigrams were loaded
+                    near = True
+            if row is not None and row[1] + self.ttl < now:
+                self._forget(key)
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE ai_response SET used_at = ?, hits = hits + 1 WHERE key = ?", (now, key))
+            if near:
+                self.near_hits += 1
+            else:
+                self.hits += 1
+            self.seconds_saved += row[2]
+            return row[0]
+
+    def set(self, question, response, context='', cost_seconds=0.0):
+        if not self.enabled or not response:
+            return
+        question = normalize_prompt(question)
+        context_hash = self._context_hash(context)
+        now = time.time()
+        with self._lock:
+            key = self._key(context_hash, question)
+            self._conn.execute("""
+                INSERT OR REPLACE INTO ai_response (key, context, question, response, created_at, used_at, hits, cost_seconds)
+                VALUES (?, ?, ?, ?, ?, ?, 0, ?)
+            """, (key, context_hash, question, response, now, now, cost_seconds))
+            if self._grams is not None:
+                self._grams[key] = (context_hash,) + _fingerprint(question)
+            self._evict(now)
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM ai_response WHERE created_at < ?", (now - self.ttl,))
+        self._conn.execute("""
+            DELETE FROM ai_response WHERE key IN (
+                SELECT key FROM ai_response ORDER BY used_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_size,))
+        if self._grams is not None and len(self._grams) > self.max_size:
+            self._grams = None # Reloaded from the surviving rows on the next lookup
+
+    def clear(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._conn.execute("DELETE FROM ai_response")
+            self._grams = None
+
+    def __len__(self):
+        if not self.enabled:
+            return 0
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM ai_response").fetchone()[0]
+
+    def stats(self):
+        with self._lock:
+            hits, near_hits, misses = self.hits, self.near_hits, self.misses
+            seconds_saved = self.seconds_saved
+        total = hits + near_hits + misses
+        return {
+            'hits': hits,
+            'near_hits': near_hits,
+            'misses': misses,
+            'hit_rate': round((hits + near_hits) / total, 4) if total else 0.0,
+            'seconds_saved': round(seconds_saved, 2),
+            'size': len(self)
+        }
+
+
+class AIResponseCache:
+    """Answers to previously asked questions, kept in a small SQLite file.
+
+    Entries are keyed on the normalized question plus a context string (model
+    name and system instruction), so changing either starts a fresh cache.
+    Expired rows are dropped on read; past AI_CACHE_SIZE the least recently
+    used rows are evicted. Only successful model answers should be stored.
+    Reusing answers for reworded questions is opt-in through
+    AI_CACHE_SIMILARITY (see DEFAULT_SIMILARITY for the trade-off).
+    Each app gets its own store in app.extensions['ai_cache'].
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('AI_CACHE_PATH', os.environ.get('AI_CACHE_PATH', os.path.join(app.instance_path, 'ai_cache.db')))
+        app.config.setdefault('AI_CACHE_TTL', int(os.environ.get('AI_CACHE_TTL', DEFAULT_TTL)))
+        app.config.setdefault('AI_CACHE_SIZE', int(os.environ.get('AI_CACHE_SIZE', DEFAULT_SIZE)))
+        app.config.setdefault('AI_CACHE_SIMILARITY', float(os.environ.get('AI_CACHE_SIMILARITY', DEFAULT_SIMILARITY)))
+        app.extensions['ai_cache'] = _ResponseStore(app.config['AI_CACHE_PATH'], app.config['AI_CACHE_TTL'],
+                                                    app.config['AI_CACHE_SIZE'], app.config['AI_CACHE_SIMILARITY'])
+
+    @staticmethod
+    def _store():
+        return current_app.extensions['ai_cache']
+
+    def get(self, question, context=''):
+        """Cached answer for `question`, or None."""
+        return self._store().get(question, context)
+
+    def set(self, question, response, context='', cost_seconds=0.0):
+        """Store a successful answer; `cost_seconds` is how long the model took."""
+        self._store().set(question, response, context, cost_seconds)
+
+    def clear(self):
+        self._store().clear()
+
+    def __len__(self):
+        return len(self._store())
+
+    def stats(self):
+        return self._store().stats()
+
+
+ai_cache = AIResponseCache()
@@ -0,0 +1,327 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from flask import current_app
+
+from ai_cache import ai_cache
+from ai_sessions import ai_sessions
+
+DEFAULT_MODEL_NAME = 'gemini-2.0-flash'
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_QUEUE = 4 # With the workers, a quarter of serve.py's default threads
+DEFAULT_TIMEOUT = 30
+DEFAULT_BUSY_RETRY_AFTER = 5 # Seconds suggested to clients turned away with AIBusy
+
+CONFIG_ERROR_MISSING_KEY = "CONFIG_ERROR: It looks like your Gemini API key is missing or not set yet. Please add it to `api_key.txt` in the project folder to start chatting!"
+CONFIG_ERROR_INVALID_KEY = "CONFIG_ERROR: Your API key appears to be invalid. Please check your key in `api_key.txt`."
+FALLBACK_RESPONSE = "I'm sorry, I'm having trouble connecting to my brain right now. Please try again later!"
+
+# System Instruction for Education-Only Bot
+SYSTEM_INSTRUCTION = """
+You are a helpful and knowledgeable Career & Education Assistant on the Pathseeker platform. 
+Your goal is to help students with questions specifically related to:
+1. Higher education and college searches.
+2. Career paths and professional development.
+3. Skill-building and learning resources.
+4. Resume tips and interview preparation.
+
+LIMITATION: You MUST NOT answer questions unrelated to education, careers, or professional growth. 
+If a user asks about anything else (e.g., cooking, sports, general entertainment, or casual conversation outside of career/education), 
+politely decline and remind them that you are here specifically to assist with their career and education journey.
+
+Be encouraging, professional, and concise.
+"""
+
+
+class AIBusy(Exception):
+    """Every worker is busy and the wait queue is full."""
+
+
+def load_gemini_key(key_file=None):
+    # 1. Check environment variable
+    key = os.environ.get("GOOGLE_API_KEY")
+    if key:
+        return key
+
+    # 2. Check local file (api_key.txt)
+    try:
+        key_file = key_file or os.path.join(os.path.abspath(os.path.dirname(__file__)), "api_key.txt")
+        if os.path.exists(key_file):
+            with open(key_file, "r") as f:
+                content = f.read().strip()
+                if content and "PASTE_YOUR" not in content:
+                    return content
+    except Exception as e:
+        print(f"Error reading api_key.txt: {e}")
+
+    return None
+
+
+def map_ai_error(error):
+    """Turn a model exception into the message shown to the user."""
+    error_msg = str(error)
+    print(f"AI Error: {error_msg}")
+    if "API_KEY_INVALID" in error_msg or "403" in error_msg:
+        return CONFIG_ERROR_INVALID_KEY
+    return FALLBACK_RESPONSE
+
+
+class GeminiModel:
+    """Configured Gemini client, built once per API key and shared by all requests."""
+
+    def __init__(self, api_key, model_name, system_instruction):
+        # Imported here so workers, scripts and tests only pay for the SDK on the first AI request
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        self._model = genai.GenerativeModel(model_name, system_instruction=system_instruction)
+
+    def generate(self, contents, timeout):
+        response = self._model.generate_content(contents, request_options={'timeout': timeout})
+        return response.text
+
+    def stream(self, contents, timeout):
+        for chunk in self._model.generate_content(contents, stream=True, request_options={'timeout': timeout}):
+            if chunk.text:
+                yield chunk.text
+
+
+class _ModelPool:
+    """One app's worker pool, admission slots, API key and model client."""
+
+    def __init__(self, config):
+        self.model_name = config['AI_MODEL_NAME']
+        self.timeout = config['AI_TIMEOUT']
+        self.key_file = config['AI_KEY_FILE']
+        self.model_factory = config['AI_MODEL_FACTORY']
+        workers = config['AI_MAX_WORKERS']
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ai-worker')
+        self._slots = threading.BoundedSemaphore(workers + config['AI_MAX_QUEUE'])
+        self._key_stamp = self._api_key = self._model = None
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _key_file_stamp(self):
+        try:
+            stat = os.stat(self.key_file)
+            return (os.environ.get("GOOGLE_API_KEY"), stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return (os.environ.get("GOOGLE_API_KEY"), None, None)
+
+    def _refresh_key(self):
+        stamp = self._key_file_stamp()
+        if stamp == self._key_stamp:
+            return self._api_key
+        with self._lock:
+            if stamp != self._key_stamp:
+                api_key = load_gemini_key(self.key_file)
+                if api_key != self._api_key:
+                    self._model = None
+                self._api_key = api_key
+                self._key_stamp = stamp
+        return self._api_key
+
+    def _get_model(self):
+        model = self._model
+        if model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self.model_factory(self._api_key, self.model_name, SYSTEM_INSTRUCTION)
+                model = self._model
+        return model
+
+    def submit(self, fn, *args):
+        """Run fn(model, *args) on the pool. Raises AIBusy when the pool and queue are full."""
+        if not self._slots.acquire(blocking=False):
+            raise AIBusy()
+        try:
+            future = self._executor.submit(lambda: fn(self._get_model(), *args))
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def generate(self, contents):
+        """Model text for `contents`; raises AIBusy, TimeoutError or the model's own errors."""
+        future = self.submit(lambda model, c: model.generate(c, self.timeout), contents)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise TimeoutError(f"AI call exceeded {self.timeout}s")
+
+    def stream(self, contents):
+        """Iterator over text chunks as the model produces them.
+
+        Raises AIBusy immediately if there is no free slot; while iterating,
+        raises TimeoutError if no chunk arrives within the timeout, or the
+        model's own errors. Closing the iterator early stops the worker
+        after its current chunk.
+        """
+        chunks = queue.Queue()
+        stopped = threading.Event()
+
+        def produce(model, c):
+            try:
+                for chunk in model.stream(c, self.timeout):
+                    if stopped.is_set():
+                        return
+                    chunks.put(('chunk', chunk))
+                chunks.put(('done', None))
+            except Exception as e:
+                chunks.put(('error', e))
+
+        self.submit(produce, contents)
+
+        def consume():
+            try:
+                while True:
+                    try:
+                        kind, value = chunks.get(timeout=self.timeout)
+                    except queue.Empty:
+                        raise TimeoutError(f"AI stream stalled for {self.timeout}s")
+                    if kind == 'done':
+                        return
+                    if kind == 'error':
+                        raise value
+                    yield value
+            finally:
+                stopped.set()
+
+        return consume()
+
+    def has_key(self):
+        return bool(self._refresh_key())
+
+
+class AIService:
+    """Runs model calls on a bounded thread pool with per-call timeouts.
+
+    The API key is read on the first AI request and re-read only when
+    api_key.txt changes on disk; the model client is rebuilt only when the
+    key does. The system instruction is given to the client once rather than
+    sent with each prompt. Set AI_MODEL_FACTORY to a callable
+    (api_key, model_name, system_instruction) -> model with
+    generate(contents, timeout) and stream(contents, timeout) methods to run
+    against a fake model; `contents` is a list of
+    {'role': 'user' | 'model', 'parts': [text]} turns. Each app gets its own
+    pool in app.extensions['ai_service'].
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('AI_MODEL_NAME', os.environ.get('AI_MODEL_NAME', DEFAULT_MODEL_NAME))
+        app.config.setdefault('AI_MAX_WORKERS', int(os.environ.get('AI_MAX_WORKERS', DEFAULT_MAX_WORKERS)))
+        app.config.setdefault('AI_MAX_QUEUE', int(os.environ.get('AI_MAX_QUEUE', DEFAULT_MAX_QUEUE)))
+        app.config.setdefault('AI_TIMEOUT', float(os.environ.get('AI_TIMEOUT', DEFAULT_TIMEOUT)))
+        app.config.setdefault('AI_BUSY_RETRY_AFTER', int(os.environ.get('AI_BUSY_RETRY_AFTER', DEFAULT_BUSY_RETRY_AFTER)))
+        app.config.setdefault('AI_KEY_FILE', os.path.join(app.root_path, 'api_key.txt'))
+        app.config.setdefault('AI_MODEL_FACTORY', GeminiModel)
+        app.extensions['ai_service'] = _ModelPool(app.config)
+
+    @staticmethod
+    def _pool(app=None):
+        return (app or current_app).extensions['ai_service']
+
+    def shutdown(self, app=None):
+        self._pool(app).shutdown()
+
+    @property
+    def model_name(self):
+        return self._pool().model_name
+
+    def generate(self, contents):
+        return self._pool().generate(contents)
+
+    def stream(self, contents):
+        return self._pool().stream(contents)
+
+    def has_key(self):
+        return self._pool().has_key()
+
+
+ai_service = AIService()
+
+
+def _cache_context():
+    # Part of the cache key, so a new model or instruction never serves stale answers
+    return f"{ai_service.model_name}\n{SYSTEM_INSTRUCTION}"
+
+
+def get_ai_response(user_input, user_id=None):
+    """Answer `user_input`, continuing user_id's conversation when one is given."""
+    if not ai_service.has_key():
+        return CONFIG_ERROR_MISSING_KEY
+
+    session = ai_sessions.load(user_id)
+    # Follow-ups depend on the conversation so far; only opening questions are cacheable
+    cacheable = not ai_sessions.has_history(session)
+    if cacheable:
+        cached = ai_cache.get(user_input, _cache_context())
+        if cached is not None:
+            ai_sessions.record(user_id, session, user_input, cached)
+            return cached
+
+    try:
+        started = time.monotonic()
+        response = ai_service.generate(ai_sessions.build_contents(session, user_input))
+    except AIBusy:
+        raise
+    except Exception as e:
+        return map_ai_error(e)
+
+    # Errors never get here, so CONFIG_ERROR and fallback messages are neither cached nor remembered
+    if cacheable:
+        ai_cache.set(user_input, response, _cache_context(), time.monotonic() - started)
+    ai_sessions.record(user_id, session, user_input, response)
+    return response
+
+
+def stream_ai_response(user_input, user_id=None):
+    """Streaming counterpart of get_ai_response.
+
+    Yields ('chunk', text) as the model writes, or ('error', message) using
+    the same CONFIG_ERROR / fallback mapping. Raises AIBusy before the first
+    item when no worker is free.
+    """
+    if not ai_service.has_key():
+        return iter([('error', CONFIG_ERROR_MISSING_KEY)])
+
+    session = ai_sessions.load(user_id)
+    cacheable = not ai_sessions.has_history(session)
+    if cacheable:
+        cached = ai_cache.get(user_input, _cache_context())
+        if cached is not None:
+            ai_sessions.record(user_id, session, user_input, cached)
+            return iter([('chunk', cached)])
+
+    started = time.monotonic()
+    chunks = ai_service.stream(ai_sessions.build_contents(session, user_input))
+
+    def events():
+        parts = []
+        try:
+            for chunk in chunks:
+                parts.append(chunk)
+                yield ('chunk', chunk)
+        except Exception as e:
+            yield ('error', map_ai_error(e))
+            return
+        finally:
+            chunks.close()
+        response = ''.join(parts)
+        if cacheable:
+            ai_cache.set(user_input, response, _cache_context(), time.monotonic() - started)
+        ai_sessions.record(user_id, session, user_input, response)
+
+    return events()
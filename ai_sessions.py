@@ -0,0 +1,102 @@
+import os
+
+from flask import current_app
+
+from user_cache import LocalCacheBackend, RedisCacheBackend
+
+DEFAULT_HISTORY_TOKENS = 1500
+DEFAULT_SUMMARY_TOKENS = 200
+DEFAULT_SESSION_TTL = 2 * 3600
+DEFAULT_SESSION_MAX = 5000
+SUMMARY_ITEM_TOKENS = 30
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English; close enough for budgeting
+    return len(text) // 4 + 1
+
+
+def _clip(text, tokens):
+    limit = tokens * 4
+    return text if len(text) <= limit else text[:limit - 3].rstrip() + '...'
+
+
+class AISessions:
+    """Server-side AI assistant conversations, one per user.
+
+    A session is {'summary': [earlier questions], 'turns': [[role, text], ...]}.
+    The turns are kept within AI_HISTORY_TOKENS; when a new exchange pushes
+    them over, the oldest exchanges are folded into the summary, which keeps
+    only their questions and is itself capped at AI_SUMMARY_TOKENS. The
+    prompt sent to the model therefore stays the same size however long the
+    conversation runs. Sessions expire after AI_SESSION_TTL seconds idle.
+    Set AI_SESSION_URL to a Redis URL to share them between worker processes.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('AI_HISTORY_TOKENS', int(os.environ.get('AI_HISTORY_TOKENS', DEFAULT_HISTORY_TOKENS)))
+        app.config.setdefault('AI_SUMMARY_TOKENS', int(os.environ.get('AI_SUMMARY_TOKENS', DEFAULT_SUMMARY_TOKENS)))
+        app.config.setdefault('AI_SESSION_TTL', int(os.environ.get('AI_SESSION_TTL', DEFAULT_SESSION_TTL)))
+        app.config.setdefault('AI_SESSION_MAX', int(os.environ.get('AI_SESSION_MAX', DEFAULT_SESSION_MAX)))
+        app.config.setdefault('AI_SESSION_URL', os.environ.get('AI_SESSION_URL'))
+        url = app.config['AI_SESSION_URL']
+        # Budgets are read from app.config on each call; only the store is kept per app
+        app.extensions['ai_sessions'] = (RedisCacheBackend(url, 'ai_session', 'AI_SESSION_URL') if url
+                                         else LocalCacheBackend(app.config['AI_SESSION_MAX']))
+
+    @property
+    def backend(self):
+        return current_app.extensions['ai_sessions']
+
+    @staticmethod
+    def _key(user_id):
+        return f'ai_session:{user_id}'
+
+    def load(self, user_id):
+        session = self.backend.get(self._key(user_id)) if user_id is not None else None
+        return session or {'summary': [], 'turns': []}
+
+    @staticmethod
+    def has_history(session):
+        return bool(session['turns'] or session['summary'])
+
+    def build_contents(self, session, message):
+        """The model's `contents`: summary, recent turns, then the new message."""
+        contents = []
+        if session['summary']:
+            contents.append({'role': 'user', 'parts': ["Earlier in this conversation I asked about: " + '; '.join(session['summary'])]})
+            contents.append({'role': 'model', 'parts': ["Noted, I'll keep that in mind."]})
+        for role, text in session['turns']:
+            contents.append({'role': role, 'parts': [text]})
+        contents.append({'role': 'user', 'parts': [_clip(message, current_app.config['AI_HISTORY_TOKENS'])]})
+        return contents
+
+    def record(self, user_id, session, message, response):
+        """Append an exchange, fold what no longer fits into the summary and save."""
+        if user_id is None:
+            return
+        config = current_app.config
+        history_tokens = config['AI_HISTORY_TOKENS']
+        # A single oversized exchange is clipped so it cannot blow the budget alone
+        turns = session['turns'] + [['user', _clip(message, history_tokens // 2)],
+                                    ['model', _clip(response, history_tokens // 2)]]
+        summary = list(session['summary'])
+        while len(turns) > 2 and sum(estimate_tokens(text) for _, text in turns) > history_tokens:
+            summary.append(_clip(turns[0][1], SUMMARY_ITEM_TOKENS))
+            turns = turns[2:]
+        while summary and sum(estimate_tokens(item) for item in summary) > config['AI_SUMMARY_TOKENS']:
+            summary.pop(0)
+        self.backend.set(self._key(user_id), {'summary': summary, 'turns': turns}, config['AI_SESSION_TTL'])
+
+    def reset(self, user_id):
+        self.backend.delete(self._key(user_id))
+
+    def clear(self):
+        self.backend.clear()
+
+
+ai_sessions = AISessions()
@@ -1,30 +1,112 @@
-from flask import Flask, render_template, redirect, url_for, flash, request, jsonify
+import time
+_IMPORT_STARTED = time.perf_counter() # Start of the import-to-ready time in app.extensions['startup']
+
+from flask import Blueprint, Flask, current_app, render_template, redirect, url_for, flash, request, jsonify, Response, stream_with_context
 from flask_login import LoginManager, current_user, login_user, logout_user, login_required
 from werkzeug.security import generate_password_hash, check_password_hash
-from models import db, User, CareerMoment, ExperienceReply, MentorRating, Chat, Message
+from models import db, User, CareerMoment, ExperienceReply, MentorRating, Chat, Message, set_mentor_skills
+from similarity import similarity_index
+from similar_cache import similar_cache, SIMILAR_LIMIT
+from jobs import job, job_queue
+from instrumentation import instrumentation
+from query_budget import query_repeat_guard
+from mentor_search import mentor_search, search_mentors, init_mentor_search
+from migrations import run_migrations, latest_version
+from database import configure_database, install_sqlite_pragmas
+from user_cache import user_cache
+from ai_cache import ai_cache
+from ai_sessions import ai_sessions
+from rate_limit import rate_limiter
+from stream_limit import stream_limiter
+from ai_service import ai_service, get_ai_response, stream_ai_response, AIBusy
+from chat_events import chat_events, message_payload
+from feed import feed_page, InvalidCursor
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from chat_service import (load_messages, CHAT_PAGE_SIZE, ensure_read_states, record_new_message,
+                          mark_chat_read, unread_summary)
+import json
 import os
 import sys
-from difflib import SequenceMatcher
 import jwt
 import datetime
-import google.generativeai as genai
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'pathseeker-secret-key'
 # Use absolute path for database to avoid ambiguity
 basedir = os.path.abspath(os.path.dirname(__file__))
 db_path = os.path.join(basedir, 'instance', 'pathseeker.db')
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-db.init_app(app)
 login_manager = LoginManager()
-login_manager.login_view = 'login'
-login_manager.init_app(app)
+login_manager.login_view = 'main.login'
+
+bp = Blueprint('main', __name__)
+
+def _bare_endpoint(error, endpoint, values):
+    # Templates written before the blueprint use url_for('index') rather than 'main.index'
+    if '.' not in endpoint and f'main.{endpoint}' in current_app.view_functions:
+        return url_for(f'main.{endpoint}', **values)
+    return None
+
+def create_app(config=None):
+    """Build and configure the app. `config` overrides the defaults and environment.
+
+    Nothing here touches the database or imports the Gemini SDK, so creating
+    an app is cheap for workers, scripts and tests. Creating and migrating
+    the schema is a separate step, prepare_database(app).
+    """
+    started = time.perf_counter()
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'pathseeker-secret-key'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config.update(config or {})
+    # DATABASE_URL, SQLITE_* pragmas and DB_POOL_* sizing come from the environment
+    configure_database(app, f'sqlite:///{db_path}')
+
+    db.init_app(app)
+    login_manager.init_app(app)
+    chat_events.init_app(app)
+    user_cache.init_app(app)
+    ai_service.init_app(app)
+    ai_cache.init_app(app)
+    ai_sessions.init_app(app)
+    rate_limiter.init_app(app)
+    stream_limiter.init_app(app)
+    job_queue.init_app(app)
+    similar_cache.init_app(app)
+    instrumentation.init_app(app)
+    similarity_index.init_app(app)
+    mentor_search.init_app(app)
+    instrumentation.add_stats(app, 'user_cache', lambda: user_cache.stats())
+    instrumentation.add_stats(app, 'ai_cache', lambda: ai_cache.stats())
+    instrumentation.add_stats(app, 'jobs', lambda: job_queue.stats(app))
+    instrumentation.add_stats(app, 'streams', lambda: stream_limiter.stats(app))
+    query_repeat_guard.init_app(app)
+
+    app.register_blueprint(bp)
+    app.url_build_error_handlers.append(_bare_endpoint)
+    with app.app_context():
+        install_sqlite_pragmas(db.engine, app.config)
+
+    # import_to_ready_seconds runs from the start of this module's import, so it includes Flask, SQLAlchemy etc.
+    now = time.perf_counter()
+    app.extensions['startup'] = {
+        'create_app_seconds': round(now - started, 4),
+        'import_to_ready_seconds': round(now - _IMPORT_STARTED, 4)
+    }
+    instrumentation.add_stats(app, 'startup', lambda: app.extensions['startup'])
+    app.logger.info("App ready in %.3fs (%.3fs since import)", now - started, now - _IMPORT_STARTED)
+    return app
+
+def prepare_database(app):
+    """Create missing tables, apply migrations and set up mentor search. Run once per deploy or start, not per worker."""
+    with app.app_context():
+        db.create_all()
+        run_migrations(db.engine)
+        init_mentor_search()
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Runs on every authenticated request, polls included, so go through the cache
+    return user_cache.get(int(user_id))
 
 # Token Logic
 def generate_confirmation_token(email):
@@ -32,118 +114,55 @@ def generate_confirmation_token(email):
         'sub': email,
         'exp': datetime.datetime.utcnow() + datetime.timedelta(days=1)
     }
-    return jwt.encode(payload, app.config['SECRET_KEY'], algorithm='HS256')
+    return jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm='HS256')
 
 def confirm_token(token):
     try:
-        payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
+        payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
         return payload['sub']
     except jwt.ExpiredSignatureError:
         return 'Signature expired. Please register again.'
     except jwt.InvalidTokenError:
         return 'Invalid token. Please register again.'
 
-# Configure Gemini AI
-def load_gemini_key():
-    # 1. Check environment variable
-    key = os.environ.get("GOOGLE_API_KEY")
-    if key:
-        return key
-    
-    # 2. Check local file (api_key.txt)
-    try:
-        key_file = os.path.join(os.path.abspath(os.path.dirname(__file__)), "api_key.txt")
-        if os.path.exists(key_file):
-            with open(key_file, "r") as f:
-                content = f.read().strip()
-                if content and "PASTE_YOUR" not in content:
-                    return content
-    except Exception as e:
-        print(f"Error reading api_key.txt: {e}")
+@bp.route('/')
+def index():
+    # First page of OPEN moments globally; later pages come from /feed
+    moments, next_cursor = feed_page(current_user, with_replies=True)
     
-    return None
+    return render_template('feed.html', moments=moments, next_cursor=next_cursor)
 
-api_key = load_gemini_key()
-if api_key:
-    genai.configure(api_key=api_key)
-
-# System Instruction for Education-Only Bot
-SYSTEM_INSTRUCTION = """
-You are a helpful and knowledgeable Career & Education Assistant on the Pathseeker platform. 
-Your goal is to help students with questions specifically related to:
-1. Higher education and college searches.
-2. Career paths and professional development.
-3. Skill-building and learning resources.
-4. Resume tips and interview preparation.
-
-LIMITATION: You MUST NOT answer questions unrelated to education, careers, or professional growth. 
-If a user asks about anything else (e.g., cooking, sports, general entertainment, or casual conversation outside of career/education), 
-politely decline and remind them that you are here specifically to assist with their career and education journey.
-
-Be encouraging, professional, and concise.
-"""
-
-def get_ai_response(user_input):
-    api_key = load_gemini_key()
-    if not api_key:
-        return "CONFIG_ERROR: It looks like your Gemini API key is missing or not set yet. Please add it to `api_key.txt` in the project folder to start chatting!"
-        
+@bp.route('/feed')
+def feed_json():
+    # Infinite scroll: ?cursor=<next_cursor from the previous page>
     try:
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        chat = model.start_chat(history=[])
-        full_prompt = f"{SYSTEM_INSTRUCTION}\n\nUser Question: {user_input}"
-        response = chat.send_message(full_prompt)
-        return response.text
-    except Exception as e:
-        error_msg = str(e)
-        print(f"AI Error: {error_msg}")
-        if "API_KEY_INVALID" in error_msg or "403" in error_msg:
-            return "CONFIG_ERROR: Your API key appears to be invalid. Please check your key in `api_key.txt`."
-        return "I'm sorry, I'm having trouble connecting to my brain right now. Please try again later!"
-
-# AI/Helper Logic
-def find_similar_moments(current_moment_title, limit=3):
-    """Simple offline text similarity to find related past moments."""
-    all_moments = CareerMoment.query.filter(CareerMoment.status != 'Open').all() # Prefer resolved ones
-    if not all_moments:
-        all_moments = CareerMoment.query.all()
-        
-    scored_moments = []
-    for m in all_moments:
-        if m.title == current_moment_title: continue # Skip self
-        score = SequenceMatcher(None, current_moment_title.lower(), m.title.lower()).ratio()
-        if score > 0.3: # Threshold
-            scored_moments.append((score, m))
-            
-    scored_moments.sort(key=lambda x: x[0], reverse=True)
-    return [m[1] for m in scored_moments[:limit]]
-
-@app.route('/')
-def index():
-    # Show all OPEN moments globally
-    query = CareerMoment.query.filter(CareerMoment.status != 'Resolved')
-    
-    # If the user is a mentor, hide moments they've already replied to
-    if current_user.is_authenticated and current_user.role == 'mentor':
-        replied_ids = [r.moment_id for r in ExperienceReply.query.filter_by(mentor_id=current_user.id).all()]
-        if replied_ids:
-            query = query.filter(CareerMoment.id.notin_(replied_ids))
-            
-    moments = query.order_by(
-        CareerMoment.urgency.desc(), 
-        CareerMoment.created_at.desc()
-    ).all()
+        moments, next_cursor = feed_page(current_user, cursor=request.args.get('cursor'))
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
     
-    return render_template('feed.html', moments=moments)
+    return jsonify({
+        'moments': [{
+            'id': m.id,
+            'title': m.title,
+            'description': m.description,
+            'urgency': m.urgency,
+            'status': m.status,
+            'author_name': m.author.name,
+            'reply_count': m.reply_count,
+            'created_at': m.created_at.strftime('%b %d, %Y'),
+            'url': url_for('.view_moment', moment_id=m.id)
+        } for m in moments],
+        'next_cursor': next_cursor
+    })
 
-@app.route('/post/new', methods=['GET', 'POST'])
+@bp.route('/post/new', methods=['GET', 'POST'])
 @login_required
 def create_moment():
     if request.method == 'POST':
         title = request.form.get('title')
         description = request.form.get('description')
         background = request.form.get('background')
-        urgency = request.form.get('urgency')
+        urgency = request.form.get('urgency') or 'Normal' # Feed cursors can't page past NULLs
         
         moment = CareerMoment(
             author_id=current_user.id,
@@ -154,40 +173,44 @@ def create_moment():
         )
         db.session.add(moment)
         db.session.commit()
-        
-        # Check for similar moments immediately
-        similar = find_similar_moments(title)
+        similarity_index.add(moment)
+        # Only the count is needed here; the rows the detail page lists are materialized by the job
+        similar = similarity_index.search(moment.title, limit=SIMILAR_LIMIT)
+        similar_cache.moment_changed(moment)
         if similar:
             flash(f'We found {len(similar)} similar past moments that might help while you wait!', 'info')
             
-        return redirect(url_for('view_moment', moment_id=moment.id))
+        return redirect(url_for('.view_moment', moment_id=moment.id))
     return render_template('create_moment.html')
 
-@app.route('/post/<int:moment_id>')
+@bp.route('/post/<int:moment_id>')
 @login_required
 def view_moment(moment_id):
-    moment = CareerMoment.query.get_or_404(moment_id)
+    # The page lists every reply with its mentor, so load them up front rather than one query per reply
+    moment = CareerMoment.query.options(
+        db.joinedload(CareerMoment.author),
+        db.selectinload(CareerMoment.replies).joinedload(ExperienceReply.mentor)
+    ).filter_by(id=moment_id).first_or_404()
     
     # Permission Check: 
     # Mentors can view everything. 
     # Students can only view their own moments.
     if current_user.role != 'mentor' and moment.author_id != current_user.id:
         flash('You do not have permission to view this moment.', 'danger')
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
     
     
     # Identify which replies the current user (if author) has already rated
     rated_reply_ids = []
     if current_user.is_authenticated and moment.author_id == current_user.id:
-        # Filter ratings for this moment's replies to be more efficient if needed, 
-        # but simple query is fine for MVP
-        ratings = MentorRating.query.filter_by(student_id=current_user.id).all()
-        rated_reply_ids = [r.reply_id for r in ratings]
+        rated_reply_ids = [reply_id for (reply_id,) in db.session.query(MentorRating.reply_id)
+                           .join(ExperienceReply, ExperienceReply.id == MentorRating.reply_id)
+                           .filter(MentorRating.student_id == current_user.id, ExperienceReply.moment_id == moment.id)]
 
-    similar_moments = find_similar_moments(moment.title)
+    similar_moments = similar_cache.get(moment)
     return render_template('post_detail.html', moment=moment, similar_moments=similar_moments, rated_reply_ids=rated_reply_ids)
 
-@app.route('/reply/<int:moment_id>', methods=['POST'])
+@bp.route('/reply/<int:moment_id>', methods=['POST'])
 @login_required
 def reply_moment(moment_id):
     content = request.form.get('content')
@@ -204,19 +227,21 @@ def reply_moment(moment_id):
     db.session.add(reply)
     db.session.commit()
     flash('Thank you for sharing your lived experience.')
-    return redirect(url_for('view_moment', moment_id=moment_id))
+    return redirect(url_for('.view_moment', moment_id=moment_id))
 
-@app.route('/resolve/<int:moment_id>')
+@bp.route('/resolve/<int:moment_id>')
 @login_required
 def resolve_moment(moment_id):
     moment = CareerMoment.query.get_or_404(moment_id)
     if moment.author_id == current_user.id:
         moment.status = 'Resolved'
         db.session.commit()
+        similarity_index.update_status(moment)
+        similar_cache.moment_changed(moment)
         flash('Moment marked as resolved. Hope you found clarity!')
-    return redirect(url_for('view_moment', moment_id=moment_id))
+    return redirect(url_for('.view_moment', moment_id=moment_id))
 
-@app.route('/rate_mentor/<int:reply_id>', methods=['POST'])
+@bp.route('/rate_mentor/<int:reply_id>', methods=['POST'])
 @login_required
 def rate_mentor(reply_id):
     reply = ExperienceReply.query.get_or_404(reply_id)
@@ -225,7 +250,7 @@ def rate_mentor(reply_id):
     # Security: Only the author of the moment can rate the reply
     if not moment or moment.author_id != current_user.id:
         flash('You are not authorized to rate this reply.', 'danger')
-        return redirect(url_for('view_moment', moment_id=moment.id if moment else 0))
+        return redirect(url_for('.view_moment', moment_id=moment.id if moment else 0))
 
     # Check if already rated
     existing_rating = MentorRating.query.filter_by(
@@ -235,18 +260,18 @@ def rate_mentor(reply_id):
 
     if existing_rating:
         flash('You have already rated this mentor.', 'warning')
-        return redirect(url_for('view_moment', moment_id=moment.id))
+        return redirect(url_for('.view_moment', moment_id=moment.id))
 
     rating_value = request.form.get('rating')
     try:
         rating_value = int(rating_value)
     except (ValueError, TypeError):
         flash('Invalid rating.', 'danger')
-        return redirect(url_for('view_moment', moment_id=moment.id))
+        return redirect(url_for('.view_moment', moment_id=moment.id))
     
     if rating_value < 1 or rating_value > 5:
         flash('Invalid rating.', 'danger')
-        return redirect(url_for('view_moment', moment_id=moment.id))
+        return redirect(url_for('.view_moment', moment_id=moment.id))
 
     # Create Rating
     rating = MentorRating(
@@ -256,19 +281,36 @@ def rate_mentor(reply_id):
         rating=rating_value
     )
     db.session.add(rating)
-
-    # Update Mentor's Credit Points
-    mentor = User.query.get(reply.mentor_id)
-    mentor.credit_points += rating_value
+    db.session.flush()
+    rating_id, moment_id = rating.id, moment.id # Read before commit expires them
     db.session.commit()
+    # Mentor's credit points and rating aggregates are updated by a job
+    job_queue.enqueue('apply_rating', rating_id=rating_id)
 
     flash('Thank you for rating the mentor!', 'success')
-    return redirect(url_for('view_moment', moment_id=moment.id))
+    return redirect(url_for('.view_moment', moment_id=moment_id))
+
+@job('apply_rating')
+def apply_rating(rating_id):
+    """Add a rating to the mentor's credit points and aggregates, exactly once."""
+    # Flipping the flag and bumping the counters commit together, so a retried job can't count twice
+    claimed = MentorRating.query.filter_by(id=rating_id, applied=False).update(
+        {MentorRating.applied: True}, synchronize_session=False)
+    if not claimed:
+        return
+    mentor_id, value = db.session.query(MentorRating.mentor_id, MentorRating.rating).filter_by(id=rating_id).one()
+    User.query.filter_by(id=mentor_id).update({
+        User.credit_points: db.func.coalesce(User.credit_points, 0) + value,
+        User.rating_count: User.rating_count + 1,
+        User.rating_sum: User.rating_sum + value
+    }, synchronize_session=False)
+    db.session.commit()
+    user_cache.invalidate(mentor_id)
 
 # Auth Routes (Reused/Adapted)
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
-    if current_user.is_authenticated: return redirect(url_for('index'))
+    if current_user.is_authenticated: return redirect(url_for('.index'))
     if request.method == 'POST':
         name = request.form.get('name')
         email = request.form.get('email')
@@ -280,7 +322,7 @@ def register():
         
         if User.query.filter_by(email=email).first():
             flash('Email already registered')
-            return redirect(url_for('register'))
+            return redirect(url_for('.register'))
         
         # AUTO-VERIFY FOR ROBUST MVP
         user = User(
@@ -293,137 +335,135 @@ def register():
             bio=bio,
             is_verified=True
         )
+        if role == 'mentor':
+            set_mentor_skills(user, skills)
         db.session.add(user)
         db.session.commit()
         
         login_user(user)
         flash('Welcome to Pathseeker! You are now logged in.', 'success')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('.dashboard'))
     return render_template('register.html')
 
 # Legacy verification routes removed for clarity/stability
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
-    if current_user.is_authenticated: return redirect(url_for('dashboard'))
+    if current_user.is_authenticated: return redirect(url_for('.dashboard'))
     if request.method == 'POST':
         email = request.form.get('email')
         password = request.form.get('password')
         user = User.query.filter_by(email=email).first()
         if user and check_password_hash(user.password, password):
             login_user(user)
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('.dashboard'))
         else:
             flash('Login failed. Please check your email and password.', 'danger')
     return render_template('login.html')
 
 # ROLE-BASED DASHBOARD ROUTING
-@app.route('/dashboard')
+@bp.route('/dashboard')
 @login_required
 def dashboard():
     if current_user.role == 'mentor':
-        return redirect(url_for('mentor_dashboard'))
+        return redirect(url_for('.mentor_dashboard'))
     else:
-        return redirect(url_for('student_dashboard'))
+        return redirect(url_for('.student_dashboard'))
 
-@app.route('/student/dashboard')
+@bp.route('/student/dashboard')
 @login_required
 def student_dashboard():
-    # Show authored moments
-    authored = CareerMoment.query.filter_by(author_id=current_user.id).all()
-    
-    # Show moments where I (student) replied (uncommon but possible if students reply to each other)
-    replied_ids = [r.moment_id for r in ExperienceReply.query.filter_by(mentor_id=current_user.id).all()]
-    interacted = CareerMoment.query.filter(CareerMoment.id.in_(replied_ids)).all() if replied_ids else []
-    
-    # Merge and deduplicate
-    moment_ids = set([m.id for m in authored] + [m.id for m in interacted])
-    my_moments = CareerMoment.query.filter(CareerMoment.id.in_(moment_ids)).order_by(CareerMoment.created_at.desc()).all() if moment_ids else []
+    # Moments I authored, plus any I replied to (uncommon but possible if
+    # students reply to each other), in one query
+    my_moments = CareerMoment.query.filter(
+        (CareerMoment.author_id == current_user.id) |
+        CareerMoment.replies.any(ExperienceReply.mentor_id == current_user.id)
+    ).options(db.selectinload(CareerMoment.replies)).order_by(CareerMoment.created_at.desc()).all()
     
     return render_template('student_dashboard.html', my_moments=my_moments)
 
-@app.route('/mentor/dashboard')
+@bp.route('/mentor/dashboard')
 @login_required
 def mentor_dashboard():
     # Show ONLY moments this mentor has already replied to
-    replied_ids = [r.moment_id for r in ExperienceReply.query.filter_by(mentor_id=current_user.id).all()]
-    past_contributions = CareerMoment.query.filter(CareerMoment.id.in_(replied_ids)).order_by(CareerMoment.created_at.desc()).all() if replied_ids else []
+    past_contributions = CareerMoment.query.filter(
+        CareerMoment.replies.any(ExperienceReply.mentor_id == current_user.id)
+    ).options(
+        db.joinedload(CareerMoment.author),
+        db.selectinload(CareerMoment.replies)
+    ).order_by(CareerMoment.created_at.desc()).all()
     
     return render_template('mentor_dashboard.html', past_contributions=past_contributions)
 
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for('login'))
+    return redirect(url_for('.login'))
 
 # SEARCH & MENTOR DISCOVERY
-@app.route('/search')
+@bp.route('/search')
 @login_required
 def search():
     name_query = request.args.get('name_q', '')
     domain_query = request.args.get('domain_q', '').lower()
+    text_query = request.args.get('q', '')
+    # 'fts' ranks token/prefix matches; 'substring' keeps the exact
+    # case-sensitive name / case-insensitive domain matching
+    mode = request.args.get('mode', 'fts')
+    # Comma-separated domains match mentors having 'any' (default) or 'all' of them
+    skill_match = request.args.get('skill_match', 'any')
+    page = request.args.get('page', 1, type=int)
     
     mentors = []
-    has_searched = bool(name_query or domain_query)
+    has_next = False
+    has_searched = bool(name_query or domain_query or text_query)
     
     if has_searched:
-        # Start with all mentors
-        all_mentors = User.query.filter_by(role='mentor').all()
-        
-        for mentor in all_mentors:
-            match = True
-            
-            # Name Search: CASE SENSITIVE
-            if name_query and name_query not in mentor.name:
-                match = False
-                
-            # Domain Search: CASE INSENSITIVE
-            if match and domain_query:
-                if not mentor.skills or domain_query not in mentor.skills.lower():
-                    match = False
-            
-            if match:
-                mentors.append(mentor)
+        mentors, has_next = search_mentors(name_query, domain_query, text_query, mode=mode,
+                                           skill_match=skill_match, page=page)
     
-    return render_template('search.html', mentors=mentors, name_query=name_query, domain_query=domain_query, has_searched=has_searched)
+    return render_template('search.html', mentors=mentors, name_query=name_query, domain_query=domain_query,
+                           text_query=text_query, mode=mode, skill_match=skill_match, page=page, has_next=has_next, has_searched=has_searched)
 
-@app.route('/mentor/<int:mentor_id>')
+@bp.route('/mentor/<int:mentor_id>')
 @login_required
 def mentor_profile(mentor_id):
     mentor = User.query.get_or_404(mentor_id)
     if mentor.role != 'mentor':
         flash('This user is not a mentor.', 'danger')
-        return redirect(url_for('search'))
+        return redirect(url_for('.search'))
     return render_template('mentor_profile.html', mentor=mentor)
 
 # CHAT SYSTEM
-@app.route('/chat/start/<int:mentor_id>', methods=['POST'])
+@bp.route('/chat/start/<int:mentor_id>', methods=['POST'])
 @login_required
 def start_chat(mentor_id):
     if current_user.role != 'student':
         flash('Only students can start chats with mentors.', 'danger')
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
     
     mentor = User.query.get_or_404(mentor_id)
     if mentor.role != 'mentor':
         flash('You can only chat with mentors.', 'danger')
-        return redirect(url_for('search'))
+        return redirect(url_for('.search'))
     
     # Check if chat already exists
     existing_chat = Chat.query.filter_by(student_id=current_user.id, mentor_id=mentor_id).first()
     if existing_chat:
-        return redirect(url_for('view_chat', chat_id=existing_chat.id))
+        return redirect(url_for('.view_chat', chat_id=existing_chat.id))
     
     # Create new chat
     new_chat = Chat(student_id=current_user.id, mentor_id=mentor_id)
     db.session.add(new_chat)
+    db.session.flush()
+    ensure_read_states(new_chat)
     db.session.commit()
     
     flash(f'Chat started with {mentor.name}!', 'success')
-    return redirect(url_for('view_chat', chat_id=new_chat.id))
+    return redirect(url_for('.view_chat', chat_id=new_chat.id))
 
-@app.route('/chat/<int:chat_id>')
+@bp.route('/chat/<int:chat_id>')
 @login_required
 def view_chat(chat_id):
     chat = Chat.query.get_or_404(chat_id)
@@ -431,23 +471,21 @@ def view_chat(chat_id):
     # Security: Only participants can view
     if current_user.id != chat.student_id and current_user.id != chat.mentor_id:
         flash('You do not have permission to view this chat.', 'danger')
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
     
-    messages = Message.query.filter_by(chat_id=chat_id).order_by(Message.created_at.asc()).all()
+    # Latest page only; older history is fetched from get_messages with before_id
+    messages, has_more_history = load_messages(chat_id, limit=CHAT_PAGE_SIZE)
     
     # Determine the other participant
     other_user = chat.mentor if current_user.id == chat.student_id else chat.student
 
     # Mark messages from other user as read
-    unread_messages = Message.query.filter_by(chat_id=chat_id, sender_id=other_user.id, is_read=False).all()
-    if unread_messages:
-        for msg in unread_messages:
-            msg.is_read = True
-        db.session.commit()
+    mark_chat_read(chat_id, current_user.id)
     
-    return render_template('chat.html', chat=chat, messages=messages, other_user=other_user)
+    return render_template('chat.html', chat=chat, messages=messages, other_user=other_user,
+                           has_more_history=has_more_history)
 
-@app.route('/chat/<int:chat_id>/send', methods=['POST'])
+@bp.route('/chat/<int:chat_id>/send', methods=['POST'])
 @login_required
 def send_message(chat_id):
     chat = Chat.query.get_or_404(chat_id)
@@ -462,7 +500,10 @@ def send_message(chat_id):
     
     message = Message(chat_id=chat_id, sender_id=current_user.id, content=content)
     db.session.add(message)
+    db.session.flush()
+    record_new_message(message, chat.mentor_id if current_user.id == chat.student_id else chat.student_id)
     db.session.commit()
+    chat_events.publish_message(message, current_user.name)
     
     return jsonify({
         'success': True,
@@ -474,8 +515,69 @@ def send_message(chat_id):
         }
     })
 
-@app.route('/chat/<int:chat_id>/messages')
+@bp.route('/chat/<int:chat_id>/stream')
+@login_required
+@stream_limiter.limit
+def stream_messages(chat_id):
+    """Server-Sent Events feed of new messages in a chat.
+
+    Pass since_id (or let the browser send Last-Event-ID on reconnect) to
+    replay anything missed while disconnected.
+    """
+    chat = Chat.query.get_or_404(chat_id)
+    
+    # Security: Only participants can listen
+    if current_user.id != chat.student_id and current_user.id != chat.mentor_id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    user_id = current_user.id
+    last_id = request.headers.get('Last-Event-ID', type=int) or request.args.get('since_id', type=int)
+    heartbeat = current_app.config['CHAT_HEARTBEAT_SECONDS']
+    # Subscribe before reading the backlog so nothing sent in between is lost
+    subscription = chat_events.subscribe(chat_id)
+
+    def missed_since(message_id):
+        missed, _ = load_messages(chat_id, since_id=message_id)
+        payloads = [message_payload(msg, msg.sender.name) for msg in missed]
+        # Don't hold a pooled connection for the lifetime of the stream
+        db.session.remove()
+        return payloads
+
+    def event(payload):
+        payload = dict(payload, is_mine=payload['sender_id'] == user_id)
+        return f"id: {payload['id']}\ndata: {json.dumps(payload)}\n\n"
+
+    def generate():
+        nonlocal last_id
+        try:
+            if last_id is None:
+                # Fresh connection: only messages from now on
+                last_id = db.session.query(db.func.max(Message.id)).filter(Message.chat_id == chat_id).scalar() or 0
+            pending = missed_since(last_id)
+            while True:
+                for payload in pending:
+                    if payload['id'] > last_id:
+                        last_id = payload['id']
+                        yield event(payload)
+                # An event is only a wake-up: the database is the source of truth, so messages
+                # committed by other workers or dropped from a full queue arrive too, in id order.
+                # Neither broker is lossless, so heartbeats catch up the same way.
+                if subscription.get(timeout=heartbeat) is None:
+                    yield ': keep-alive\n\n'
+                else:
+                    # One read covers every event already queued
+                    while subscription.get(timeout=0) is not None:
+                        pass
+                pending = missed_since(last_id)
+        finally:
+            subscription.close()
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@bp.route('/chat/<int:chat_id>/messages')
 @login_required
+@rate_limiter.limit('chat_poll')
 def get_messages(chat_id):
     chat = Chat.query.get_or_404(chat_id)
     
@@ -483,15 +585,17 @@ def get_messages(chat_id):
     if current_user.id != chat.student_id and current_user.id != chat.mentor_id:
         return jsonify({'error': 'Unauthorized'}), 403
     
-    messages = Message.query.filter_by(chat_id=chat_id).order_by(Message.created_at.asc()).all()
+    # since_id: only messages newer than the client's last one
+    # before_id: one page of older history for upward infinite scroll
+    messages, has_more = load_messages(
+        chat_id,
+        since_id=request.args.get('since_id', type=int),
+        before_id=request.args.get('before_id', type=int),
+        limit=request.args.get('limit', CHAT_PAGE_SIZE, type=int)
+    )
     
-    # Mark messages from other user as read
-    other_id = chat.mentor_id if current_user.id == chat.student_id else chat.student_id
-    unread = Message.query.filter_by(chat_id=chat_id, sender_id=other_id, is_read=False).all()
-    if unread:
-        for msg in unread:
-            msg.is_read = True
-        db.session.commit()
+    # Mark messages from other user as read (no write when nothing is unread)
+    mark_chat_read(chat_id, current_user.id)
     
     return jsonify({
         'messages': [{
@@ -501,20 +605,35 @@ def get_messages(chat_id):
             'content': msg.content,
             'created_at': msg.created_at.strftime('%I:%M %p'),
             'is_mine': msg.sender_id == current_user.id
-        } for msg in messages]
+        } for msg in messages],
+        'has_more': has_more,
+        'oldest_id': messages[0].id if messages else None,
+        'newest_id': messages[-1].id if messages else None
     })
 
-@app.route('/my-chats')
+@bp.route('/chat/<int:chat_id>/read', methods=['POST'])
+@login_required
+def mark_read(chat_id):
+    # For clients on the SSE stream, which no longer poll get_messages
+    chat = Chat.query.get_or_404(chat_id)
+    if current_user.id != chat.student_id and current_user.id != chat.mentor_id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    return jsonify({'success': True, 'changed': mark_chat_read(chat_id, current_user.id)})
+
+@bp.route('/my-chats')
 @login_required
 def my_chats():
+    # Preload read states so get_unread_count doesn't query per chat
+    query = Chat.query.options(db.selectinload(Chat.read_states))
     if current_user.role == 'student':
-        chats = Chat.query.filter_by(student_id=current_user.id).all()
+        chats = query.filter_by(student_id=current_user.id).all()
     else:
-        chats = Chat.query.filter_by(mentor_id=current_user.id).all()
+        chats = query.filter_by(mentor_id=current_user.id).all()
     
     return render_template('my_chats.html', chats=chats)
 
-@app.route('/edit-profile', methods=['GET', 'POST'])
+@bp.route('/edit-profile', methods=['GET', 'POST'])
 @login_required
 def edit_profile():
     if request.method == 'POST':
@@ -532,82 +651,145 @@ def edit_profile():
         
         if current_user.role == 'mentor':
             current_user.skills = request.form.get('skills')
+            set_mentor_skills(current_user, current_user.skills)
             current_user.bio = request.form.get('bio')
             
         db.session.commit()
+        user_cache.invalidate(current_user.id)
         flash('Profile updated successfully!', 'success')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('.dashboard'))
         
     return render_template('edit_profile.html')
     
-@app.route('/notifications/check')
+@bp.route('/notifications/check')
 @login_required
+@rate_limiter.limit('notifications')
 def check_notifications():
-    # Only notify for messages NOT sent by current user and NOT read
-    # We join with Chat to ensure user is a participant
-    unread_messages = Message.query.join(Chat, Message.chat_id == Chat.id).filter(
-        (Chat.student_id == current_user.id) | (Chat.mentor_id == current_user.id),
-        Message.sender_id != current_user.id,
-        Message.is_read == False
-    ).order_by(Message.created_at.desc()).all()
+    # Counters and read cursors answer this without scanning every unread message
+    unread_count, unread_messages = unread_summary(current_user.id, preview_limit=5)
     
     return jsonify({
-        'unread_count': len(unread_messages),
+        'unread_count': unread_count,
         'notifications': [{
             'id': msg.id,
             'sender_name': msg.sender.name,
             'content': msg.content[:50] + ('...' if len(msg.content) > 50 else ''),
             'chat_id': msg.chat_id,
             'created_at': msg.created_at.strftime('%I:%M %p')
-        } for msg in unread_messages[:5]] # Only return last 5 for popup
+        } for msg in unread_messages] # Only the latest 5 for the popup
     })
 
-@app.route('/chat/<int:chat_id>/delete', methods=['POST'])
+@bp.route('/chat/<int:chat_id>/delete', methods=['POST'])
 @login_required
 def delete_chat(chat_id):
     chat = Chat.query.get_or_404(chat_id)
     # Ensure current user is part of the chat
     if current_user.id not in [chat.student_id, chat.mentor_id]:
         flash('You do not have permission to delete this chat.', 'danger')
-        return redirect(url_for('my_chats'))
+        return redirect(url_for('.my_chats'))
     
     db.session.delete(chat)
     db.session.commit()
     flash('Chat deleted successfully.', 'success')
-    return redirect(url_for('my_chats'))
+    return redirect(url_for('.my_chats'))
 
-@app.route('/moment/<int:moment_id>/delete', methods=['POST'])
+@bp.route('/moment/<int:moment_id>/delete', methods=['POST'])
 @login_required
 def delete_moment(moment_id):
     moment = CareerMoment.query.get_or_404(moment_id)
     # Ensure current user is the author
     if moment.author_id != current_user.id:
         flash('You do not have permission to delete this moment.', 'danger')
-        return redirect(url_for('dashboard'))
-    
+        return redirect(url_for('.dashboard'))
+    
+    # The replies' ratings are deleted with the moment, so take the applied ones back out of
+    # the mentors' aggregates; credit points already earned are kept, as they always were
+    removed = (db.session.query(MentorRating.mentor_id, db.func.count(MentorRating.id), db.func.sum(MentorRating.rating))
+               .join(ExperienceReply, ExperienceReply.id == MentorRating.reply_id)
+               .filter(ExperienceReply.moment_id == moment_id, MentorRating.applied == True)
+               .group_by(MentorRating.mentor_id)
+               .all())
+    for mentor_id, count, total in removed:
+        User.query.filter_by(id=mentor_id).update({
+            User.rating_count: User.rating_count - count,
+            User.rating_sum: User.rating_sum - total
+        }, synchronize_session=False)
+    similar_cache.moment_deleted(moment_id)
     db.session.delete(moment)
     db.session.commit()
+    for mentor_id, _, _ in removed:
+        user_cache.invalidate(mentor_id)
+    similarity_index.remove(moment_id)
     flash('Career moment deleted successfully.', 'success')
-    return redirect(url_for('dashboard'))
-
+    return redirect(url_for('.dashboard'))
 
-with app.app_context():
-    db.create_all()
 
+def ai_busy_response():
+    # Every AI worker and queue slot is taken; the caps keep slow model calls from tying up the whole server
+    response = jsonify({'error': 'The assistant is busy right now. Please try again in a moment.'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(current_app.config['AI_BUSY_RETRY_AFTER'])
+    return response
 
 # AI Chat Endpoint
-@app.route('/ai/chat', methods=['POST'])
+@bp.route('/ai/chat', methods=['POST'])
 @login_required
+@rate_limiter.limit('ai')
 def ai_chat():
     data = request.get_json()
     user_message = data.get('message')
     if not user_message:
         return jsonify({'error': 'No message provided'}), 400
     
-    ai_response = get_ai_response(user_message)
+    try:
+        ai_response = get_ai_response(user_message, current_user.id)
+    except AIBusy:
+        return ai_busy_response()
     return jsonify({'response': ai_response})
 
-@app.route('/chat/<int:chat_id>/video_room')
+@bp.route('/ai/chat/reset', methods=['POST'])
+@login_required
+def ai_chat_reset():
+    ai_sessions.reset(current_user.id)
+    return jsonify({'success': True})
+
+@bp.route('/ai/cache/stats')
+@login_required
+def ai_cache_stats():
+    return jsonify(ai_cache.stats())
+
+@bp.route('/ai/chat/stream', methods=['POST'])
+@login_required
+@rate_limiter.limit('ai')
+@stream_limiter.limit
+def ai_chat_stream():
+    """Server-Sent Events version of /ai/chat.
+
+    Emits a `data: {"text": ...}` event per chunk, then `event: done`. Errors
+    arrive as `event: error` carrying the same message /ai/chat would return.
+    """
+    data = request.get_json()
+    user_message = data.get('message')
+    if not user_message:
+        return jsonify({'error': 'No message provided'}), 400
+    
+    try:
+        events = stream_ai_response(user_message, current_user.id)
+    except AIBusy:
+        return ai_busy_response()
+
+    def generate():
+        for kind, value in events:
+            if kind == 'error':
+                yield f"event: error\ndata: {json.dumps({'response': value})}\n\n"
+                return
+            yield f"data: {json.dumps({'text': value})}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@bp.route('/chat/<int:chat_id>/video_room')
 @login_required
 def get_video_room(chat_id):
     chat = Chat.query.get_or_404(chat_id)
@@ -619,6 +801,42 @@ def get_video_room(chat_id):
     room_name = f"Pathseeker_Room_{chat_id}_" + datetime.datetime.now().strftime("%Y%m%d")
     return jsonify({'room_name': room_name})
 
+# Health checks for load balancers and orchestrators: plain SQL on a pooled
+# connection, no session, ORM objects or login lookup
+@bp.route('/healthz')
+def healthz():
+    try:
+        with db.engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+    except SQLAlchemyError as e:
+        return jsonify({'status': 'unavailable', 'error': type(e).__name__}), 503
+    return jsonify({'status': 'ok'})
+
+@bp.route('/readyz')
+def readyz():
+    # Not ready until the schema is migrated to the version this code expects
+    try:
+        with db.engine.connect() as conn:
+            version = conn.execute(text('SELECT max(version) FROM schema_version')).scalar() or 0
+    except SQLAlchemyError as e:
+        return jsonify({'status': 'unavailable', 'error': type(e).__name__}), 503
+    expected = latest_version()
+    if version < expected:
+        return jsonify({'status': 'migrating', 'schema_version': version, 'expected': expected}), 503
+    return jsonify({'status': 'ready', 'schema_version': version})
+
+def __getattr__(name):
+    # `from app import app` gives scripts a default app, built on first use rather than at import
+    if name == 'app':
+        default = globals()['app'] = create_app()
+        return default
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 if __name__ == '__main__':
+    app = create_app()
+    prepare_database(app)
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        job_queue.start(app) # Only in the reloader's child, which is the process that serves
+    # Development server with the debugger and reloader; serve.py is the production entry point.
     # Using host 0.0.0.0 to allow access from other devices on the same network
     app.run(host='0.0.0.0', port=5050, debug=True)
@@ -0,0 +1,288 @@
+"""Seed a throwaway database with synthetic data and time the hot routes.
+
+    python benchmark.py --scale small
+    python benchmark.py --scale large --output results.json --compare previous.json
+    python benchmark.py --mentors 10000 --moments 100000 --messages 1000000
+
+Each route is called through the Flask test client; the results file holds
+per-route timings and SQL query counts plus the commit they were taken at.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+SCALES = {
+    'small': dict(mentors=200, students=1000, moments=2000, replies=3, chats=500, messages=20000),
+    'medium': dict(mentors=2000, students=10000, moments=20000, replies=3, chats=5000, messages=200000),
+    'large': dict(mentors=10000, students=50000, moments=100000, replies=3, chats=20000, messages=1000000),
+}
+BATCH_SIZE = 5000
+PASSWORD = 'benchmark'
+
+SKILLS = ['Python', 'SQL', 'Machine Learning', 'Data Science', 'Statistics', 'Java', 'JavaScript', 'React',
+          'Product Management', 'UX Design', 'Marketing', 'Finance', 'Accounting', 'Law', 'Medicine',
+          'Nursing', 'Civil Engineering', 'Mechanical Engineering', 'Cloud', 'DevOps', 'Security',
+          'Public Speaking', 'Writing', 'Research', 'Teaching', 'Consulting', 'Sales', 'Go', 'Rust', 'C++']
+TOPICS = ['data science', 'a masters abroad', 'my first internship', 'a startup offer', 'law school',
+          'switching careers', 'a PhD', 'product management', 'freelancing', 'a gap year', 'medical school',
+          'civil services', 'an MBA', 'UX design', 'teaching', 'cloud engineering', 'research jobs']
+OPENERS = ['Should I go for', 'Is it worth pursuing', 'How do I prepare for', 'Confused about',
+           'Need advice on', 'What to expect from', 'Parents against']
+FIRST_NAMES = ['Asha', 'Ravi', 'Maya', 'Arjun', 'Lena', 'Omar', 'Sara', 'Kiran', 'Noah', 'Priya', 'Dev', 'Ana']
+LAST_NAMES = ['Sharma', 'Khan', 'Patel', 'Garcia', 'Lee', 'Nair', 'Singh', 'Brown', 'Iyer', 'Das', 'Rao']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    for name in SCALES['small']:
+        parser.add_argument(f'--{name}', type=int, help=f'override the scale\'s {name} count')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=20, help='timed calls per route')
+    parser.add_argument('--db', help='SQLite file to seed (default: a temporary file)')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    return parser.parse_args()
+
+
+def current_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except Exception:
+        return None
+
+
+def insert_rows(db, target, rows):
+    for i in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(db.insert(target), rows[i:i + BATCH_SIZE])
+    db.session.commit()
+
+
+def seed(db, counts, rng):
+    """Bulk-insert a consistent dataset, including the derived tables the app keeps in step."""
+    from werkzeug.security import generate_password_hash
+    from models import (User, Skill, mentor_skill, CareerMoment, ExperienceReply, MentorRating, Chat,
+                        Message, ChatReadState)
+
+    password = generate_password_hash(PASSWORD)
+    now = datetime.utcnow()
+    mentors = list(range(1, counts['mentors'] + 1))
+    students = list(range(counts['mentors'] + 1, counts['mentors'] + counts['students'] + 1))
+
+    skill_ids = {name.lower(): i for i, name in enumerate(SKILLS, 1)}
+    insert_rows(db, Skill, [{'id': i, 'name': name} for name, i in skill_ids.items()])
+    users, tags = [], []
+    for user_id in mentors:
+        skills = rng.sample(SKILLS, rng.randint(2, 4))
+        users.append(dict(id=user_id, name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {user_id}',
+                          email=f'mentor{user_id}@bench.test', password=password, role='mentor',
+                          credit_points=0, skills=', '.join(skills), bio=f'I work in {skills[0]}.',
+                          education='Graduate', is_verified=True, rating_count=0, rating_sum=0))
+        tags.extend({'user_id': user_id, 'skill_id': skill_ids[s.lower()]} for s in skills)
+    for user_id in students:
+        users.append(dict(id=user_id, name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {user_id}',
+                          email=f'student{user_id}@bench.test', password=password, role='student',
+                          credit_points=0, education='Undergraduate', is_verified=True, rating_count=0, rating_sum=0))
+    insert_rows(db, User, users)
+    insert_rows(db, mentor_skill, tags)
+
+    moments, replies, ratings = [], [], []
+    points = {}
+    for moment_id in range(1, counts['moments'] + 1):
+        author = rng.choice(students)
+        resolved = rng.random() < 0.4
+        moments.append(dict(id=moment_id, author_id=author, title=f'{rng.choice(OPENERS)} {rng.choice(TOPICS)}?',
+                            description='Looking for people who have been through this decision.',
+                            urgency='Urgent' if rng.random() < 0.1 else 'Normal',
+                            status='Resolved' if resolved else 'Open',
+                            created_at=now - timedelta(minutes=rng.randint(0, 525600))))
+        for mentor in rng.sample(mentors, min(len(mentors), rng.randint(0, counts['replies'] * 2))):
+            reply_id = len(replies) + 1
+            replies.append(dict(id=reply_id, moment_id=moment_id, mentor_id=mentor, decision_made='I did it',
+                                content='Here is how it went for me.', mistake_warning='Plan your finances.',
+                                created_at=now))
+            if resolved and rng.random() < 0.5:
+                rating = rng.randint(1, 5)
+                ratings.append(dict(student_id=author, mentor_id=mentor, reply_id=reply_id, rating=rating,
+                                    applied=True, created_at=now))
+                count, total = points.get(mentor, (0, 0))
+                points[mentor] = (count + 1, total + rating)
+    insert_rows(db, CareerMoment, moments)
+    insert_rows(db, ExperienceReply, replies)
+    insert_rows(db, MentorRating, ratings)
+    for mentor, (count, total) in points.items():
+        db.session.execute(db.update(User).where(User.id == mentor).values(
+            credit_points=total, rating_count=count, rating_sum=total))
+    db.session.commit()
+
+    pairs = set()
+    while len(pairs) < min(counts['chats'], len(mentors) * len(students)):
+        pairs.add((rng.choice(students), rng.choice(mentors)))
+    chats = [dict(id=i, student_id=s, mentor_id=m, created_at=now) for i, (s, m) in enumerate(sorted(pairs), 1)]
+    insert_rows(db, Chat, chats)
+
+    per_chat = [0] * len(chats)
+    for _ in range(counts['messages'] if chats else 0):
+        per_chat[rng.randrange(len(chats))] += 1
+    messages, states, message_id = [], [], 0
+    for chat, total in zip(chats, per_chat):
+        unread = {chat['student_id']: 0, chat['mentor_id']: 0}
+        last_read = {chat['student_id']: 0, chat['mentor_id']: 0}
+        unread_tail = rng.randint(0, min(3, total))
+        for n in range(total):
+            message_id += 1
+            sender = chat['student_id'] if n % 2 == 0 else chat['mentor_id']
+            recipient = chat['mentor_id'] if sender == chat['student_id'] else chat['student_id']
+            is_read = n < total - unread_tail
+            messages.append(dict(id=message_id, chat_id=chat['id'], sender_id=sender, content=f'Message {n}',
+                                 is_read=is_read, created_at=now - timedelta(seconds=total - n)))
+            if is_read:
+                last_read[recipient] = message_id
+            else:
+                unread[recipient] += 1
+        for user_id in (chat['student_id'], chat['mentor_id']):
+            states.append(dict(chat_id=chat['id'], user_id=user_id, last_read_message_id=last_read[user_id],
+                               unread_count=unread[user_id]))
+        if len(messages) >= BATCH_SIZE:
+            insert_rows(db, Message, messages)
+            messages = []
+    insert_rows(db, Message, messages)
+    insert_rows(db, ChatReadState, states)
+    return {'student': chats[0]['student_id'] if chats else students[0],
+            'mentor': chats[0]['mentor_id'] if chats else mentors[0],
+            'chat': chats[0]['id'] if chats else None}
+
+
+def time_route(client, engine, method, url, repeat, data=None):
+    """Warm-up call, then `repeat` timed calls. Returns the route's result record."""
+    from query_budget import count_queries
+    call = client.post if method == 'POST' else client.get
+    try:
+        started = time.perf_counter()
+        response = call(url, data=data)
+        first_ms = (time.perf_counter() - started) * 1000
+        status = response.status_code
+        timings, queries = [], []
+        for _ in range(repeat):
+            with count_queries(engine) as counted:
+                started = time.perf_counter()
+                call(url, data=data)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(counted.count)
+    except Exception as e: # e.g. a template missing from this checkout
+        return {'url': url, 'error': f'{type(e).__name__}: {e}'}
+    timings.sort()
+    return {
+        'url': url,
+        'status': status,
+        'first_ms': round(first_ms, 2),
+        'median_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+        'max_ms': round(timings[-1], 2),
+        'queries': max(queries),
+    }
+
+
+def run(args):
+    counts = dict(SCALES[args.scale])
+    for name in counts:
+        if getattr(args, name) is not None:
+            counts[name] = getattr(args, name)
+
+    db_file = args.db or os.path.join(tempfile.mkdtemp(prefix='pathseeker-bench-'), 'bench.db')
+    if os.path.exists(db_file):
+        sys.exit(f"{db_file} already exists; pass a new path so real data is never overwritten.")
+    from app import create_app, db, prepare_database
+    app = create_app({'TESTING': True, 'RATE_LIMIT_ENABLED': False, 'JOBS_SYNC': True,
+                      'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.abspath(db_file)}'})
+    prepare_database(app)
+
+    with app.app_context():
+        started = time.perf_counter()
+        ids = seed(db, counts, random.Random(args.seed))
+        seed_seconds = time.perf_counter() - started
+        engine = db.engine
+        print(f"Seeded {counts} in {seed_seconds:.1f}s")
+
+    student, mentor = app.test_client(), app.test_client()
+    student.post('/login', data={'email': f"student{ids['student']}@bench.test", 'password': PASSWORD})
+    mentor.post('/login', data={'email': f"mentor{ids['mentor']}@bench.test", 'password': PASSWORD})
+    moment_id = random.Random(args.seed).randint(1, max(counts['moments'], 1))
+    chat = ids['chat']
+    routes = [
+        ('index (student)', student, 'GET', '/'),
+        ('index (mentor)', mentor, 'GET', '/'),
+        ('feed', mentor, 'GET', '/feed'),
+        ('view_moment', mentor, 'GET', f'/post/{moment_id}'),
+        ('student_dashboard', student, 'GET', '/student/dashboard'),
+        ('mentor_dashboard', mentor, 'GET', '/mentor/dashboard'),
+        ('search (domain)', student, 'GET', '/search?domain_q=python'),
+        ('search (name)', student, 'GET', '/search?name_q=asha'),
+        ('search (text)', student, 'GET', '/search?q=data+science'),
+        ('mentor_profile', student, 'GET', f"/mentor/{ids['mentor']}"),
+        ('my_chats', student, 'GET', '/my-chats'),
+        ('check_notifications', student, 'GET', '/notifications/check'),
+    ]
+    if chat:
+        routes += [
+            ('view_chat', student, 'GET', f'/chat/{chat}'),
+            ('get_messages', student, 'GET', f'/chat/{chat}/messages'),
+            ('get_messages (older page)', student, 'GET', f'/chat/{chat}/messages?before_id=100'),
+        ]
+
+    results = {}
+    for name, client, method, url in routes:
+        results[name] = time_route(client, engine, method, url, args.repeat)
+        record = results[name]
+        if 'error' in record:
+            print(f"{name:28} ERROR {record['error']}")
+        else:
+            print(f"{name:28} {record['status']}  median {record['median_ms']:8.2f} ms  "
+                  f"p95 {record['p95_ms']:8.2f} ms  {record['queries']:3} queries")
+
+    report = {
+        'commit': current_commit(),
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'python': sys.version.split()[0],
+        'scale': args.scale,
+        'counts': counts,
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'seed_seconds': round(seed_seconds, 2),
+        'startup': app.extensions['startup'],
+        'routes': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        compare(args.compare, report)
+
+
+def compare(previous_file, report):
+    with open(previous_file) as f:
+        previous = json.load(f)
+    print(f"\nAgainst {previous_file} (commit {previous.get('commit')}):")
+    before = previous.get('startup', {}).get('import_to_ready_seconds')
+    if before:
+        print(f"{'startup (import to ready)':28} {before * 1000:8.2f} -> "
+              f"{report['startup']['import_to_ready_seconds'] * 1000:8.2f} ms")
+    for name, record in report['routes'].items():
+        before = previous.get('routes', {}).get(name)
+        if not before or 'median_ms' not in before or 'median_ms' not in record:
+            continue
+        ratio = record['median_ms'] / before['median_ms'] if before['median_ms'] else float('inf')
+        print(f"{name:28} {before['median_ms']:8.2f} -> {record['median_ms']:8.2f} ms ({ratio:5.2f}x)  "
+              f"queries {before['queries']} -> {record['queries']}")
+
+
+if __name__ == '__main__':
+    run(parse_args())
@@ -0,0 +1,128 @@
+import json
+import os
+import queue
+import threading
+from collections import defaultdict
+
+from flask import current_app
+
+HEARTBEAT_SECONDS = 15
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+def message_payload(message, sender_name):
+    return {
+        'id': message.id,
+        'chat_id': message.chat_id,
+        'sender_id': message.sender_id,
+        'sender_name': sender_name,
+        'content': message.content,
+        'created_at': message.created_at.strftime('%I:%M %p')
+    }
+
+
+class _QueueSubscription:
+    def __init__(self, broker, channel):
+        self._broker = broker
+        self.channel = channel
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._broker._unsubscribe(self)
+
+
+class InProcessBroker:
+    """Fan-out of chat events to the streams open in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(event)
+            except queue.Full:
+                pass # Events only wake streams, which read the database, so a stalled client loses nothing
+
+    def subscribe(self, channel):
+        subscription = _QueueSubscription(self, channel)
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+
+class _RedisSubscription:
+    def __init__(self, pubsub):
+        self._pubsub = pubsub
+
+    def get(self, timeout):
+        message = self._pubsub.get_message(timeout=timeout)
+        if message is None:
+            return None
+        return json.loads(message['data'])
+
+    def close(self):
+        self._pubsub.close()
+
+
+class RedisBroker:
+    """Pub/sub through a local Redis so every worker process sees every message."""
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CHAT_BROKER_URL is set but the 'redis' package is not installed.")
+        self._redis = redis.Redis.from_url(url)
+
+    def publish(self, channel, event):
+        self._redis.publish(f'pathseeker:{channel}', json.dumps(event))
+
+    def subscribe(self, channel):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(f'pathseeker:{channel}')
+        return _RedisSubscription(pubsub)
+
+
+class ChatEvents:
+    """Flask extension for the per-app broker that send_message publishes to."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CHAT_BROKER_URL', os.environ.get('CHAT_BROKER_URL'))
+        app.config.setdefault('CHAT_HEARTBEAT_SECONDS', HEARTBEAT_SECONDS)
+        url = app.config['CHAT_BROKER_URL']
+        app.extensions['chat_events'] = RedisBroker(url) if url else InProcessBroker()
+
+    @property
+    def broker(self):
+        return current_app.extensions['chat_events']
+
+    def publish_message(self, message, sender_name):
+        self.broker.publish(f'chat:{message.chat_id}', message_payload(message, sender_name))
+
+    def subscribe(self, chat_id):
+        return self.broker.subscribe(f'chat:{chat_id}')
+
+
+chat_events = ChatEvents()
@@ -0,0 +1,95 @@
+from models import db, Message, ChatReadState
+
+CHAT_PAGE_SIZE = 50
+MAX_CHAT_PAGE_SIZE = 200
+
+
+def load_messages(chat_id, since_id=None, before_id=None, limit=CHAT_PAGE_SIZE):
+    """Return (messages, has_more) in ascending id order, walking the (chat_id, id) index.
+
+    With since_id: the oldest `limit` messages newer than it, has_more meaning
+    more new ones are waiting. Otherwise: the newest `limit` messages (older
+    than before_id if given), has_more meaning older history exists.
+    """
+    limit = max(1, min(limit or CHAT_PAGE_SIZE, MAX_CHAT_PAGE_SIZE))
+    query = Message.query.options(db.joinedload(Message.sender)).filter(Message.chat_id == chat_id)
+    if since_id is not None:
+        messages = query.filter(Message.id > since_id).order_by(Message.id.asc()).limit(limit + 1).all()
+        return messages[:limit], len(messages) > limit
+    if before_id is not None:
+        query = query.filter(Message.id < before_id)
+    messages = query.order_by(Message.id.desc()).limit(limit + 1).all()
+    has_more = len(messages) > limit
+    return list(reversed(messages[:limit])), has_more
+
+
+def ensure_read_states(chat):
+    """Create the read-state rows for both participants of a new chat."""
+    existing = {state.user_id for state in chat.read_states}
+    for user_id in (chat.student_id, chat.mentor_id):
+        if user_id not in existing:
+            chat.read_states.append(ChatReadState(chat_id=chat.id, user_id=user_id))
+
+
+def record_new_message(message, recipient_id):
+    """Bump the recipient's unread counter in the same transaction as the message."""
+    result = db.session.execute(
+        db.update(ChatReadState)
+        .where(ChatReadState.chat_id == message.chat_id, ChatReadState.user_id == recipient_id)
+        .values(unread_count=ChatReadState.unread_count + 1)
+    )
+    if result.rowcount == 0:
+        db.session.add(ChatReadState(chat_id=message.chat_id, user_id=recipient_id, unread_count=1))
+
+
+def mark_chat_read(chat_id, user_id):
+    """Mark everything the other participant sent as read and commit.
+
+    Idle polls cost one primary-key lookup: when the counter is already zero
+    nothing is written. Otherwise a single UPDATE flips the is_read flags and
+    the counter drops by exactly the rows flipped, so a message arriving
+    concurrently stays counted. Returns True if anything was written.
+    """
+    state = db.session.get(ChatReadState, (chat_id, user_id))
+    if state is not None and state.unread_count == 0:
+        return False
+    latest_id = db.session.query(db.func.max(Message.id)).filter(Message.chat_id == chat_id).scalar() or 0
+    marked = db.session.execute(
+        db.update(Message)
+        .where(
+            Message.chat_id == chat_id,
+            Message.sender_id != user_id,
+            Message.is_read == False,
+            Message.id <= latest_id
+        )
+        .values(is_read=True)
+    ).rowcount
+    if state is None:
+        db.session.add(ChatReadState(chat_id=chat_id, user_id=user_id, last_read_message_id=latest_id))
+    else:
+        remaining = ChatReadState.unread_count - marked
+        state.unread_count = db.case((remaining > 0, remaining), else_=0)
+        state.last_read_message_id = db.case(
+            (ChatReadState.last_read_message_id > latest_id, ChatReadState.last_read_message_id), else_=latest_id
+        )
+    db.session.commit()
+    return True
+
+
+def unread_summary(user_id, preview_limit=5):
+    """Total unread count and the newest unread messages across the user's chats."""
+    total = db.session.query(db.func.coalesce(db.func.sum(ChatReadState.unread_count), 0)).filter(
+        ChatReadState.user_id == user_id, ChatReadState.unread_count > 0
+    ).scalar()
+    if not total:
+        return 0, []
+    previews = Message.query.options(db.joinedload(Message.sender)).join(
+        ChatReadState,
+        (ChatReadState.chat_id == Message.chat_id) & (ChatReadState.user_id == user_id)
+    ).filter(
+        ChatReadState.unread_count > 0,
+        Message.id > ChatReadState.last_read_message_id,
+        Message.sender_id != user_id
+    ).order_by(Message.id.desc()).limit(preview_limit).all()
+    return total, previews
+
@@ -0,0 +1,76 @@
+import os
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+JOURNAL_MODES = {'WAL', 'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'OFF'}
+SYNCHRONOUS_MODES = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+
+# (config key, environment variable, default, cast)
+SQLITE_SETTINGS = [
+    ('SQLITE_JOURNAL_MODE', 'SQLITE_JOURNAL_MODE', 'WAL', str),
+    ('SQLITE_SYNCHRONOUS', 'SQLITE_SYNCHRONOUS', 'NORMAL', str), # Safe with WAL, far fewer fsyncs than FULL
+    ('SQLITE_CACHE_SIZE', 'SQLITE_CACHE_SIZE', -64000, int), # Negative means KiB, i.e. ~64 MB per connection
+    ('SQLITE_MMAP_SIZE', 'SQLITE_MMAP_SIZE', 256 * 1024 * 1024, int),
+    ('SQLITE_BUSY_TIMEOUT', 'SQLITE_BUSY_TIMEOUT', 5000, int), # ms a writer waits for the lock before "database is locked"
+]
+
+# Only passed to create_engine when set, so each dialect keeps its own pool defaults
+POOL_SETTINGS = [
+    ('pool_size', 'DB_POOL_SIZE', int),
+    ('max_overflow', 'DB_MAX_OVERFLOW', int),
+    ('pool_timeout', 'DB_POOL_TIMEOUT', float),
+    ('pool_recycle', 'DB_POOL_RECYCLE', int),
+]
+
+
+def configure_database(app, default_uri):
+    """Fill the SQLAlchemy settings from the environment. Call before db.init_app(app).
+
+    DATABASE_URL overrides the bundled SQLite file, e.g. a Postgres URI
+    (needs a driver such as psycopg2 installed).
+    """
+    uri = os.environ.get('DATABASE_URL') or default_uri
+    if uri.startswith('postgres://'):
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    app.config.setdefault('SQLALCHEMY_DATABASE_URI', uri)
+    for key, env_var, default, cast in SQLITE_SETTINGS:
+        app.config.setdefault(key, cast(os.environ.get(env_var, default)))
+
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    for option, env_var, cast in POOL_SETTINGS:
+        if os.environ.get(env_var):
+            options.setdefault(option, cast(os.environ[env_var]))
+    if url.get_backend_name() == 'sqlite':
+        if url.database and url.database != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(url.database)), exist_ok=True)
+        # The driver-level busy handler covers connections made before the pragmas run
+        options.setdefault('connect_args', {}).setdefault('timeout', app.config['SQLITE_BUSY_TIMEOUT'] / 1000)
+    else:
+        options.setdefault('pool_pre_ping', True)
+
+
+def install_sqlite_pragmas(engine, config):
+    """Apply journal mode, synchronous, cache, mmap and busy timeout on every new connection."""
+    if engine.dialect.name != 'sqlite':
+        return
+    journal_mode = config['SQLITE_JOURNAL_MODE'].upper()
+    synchronous = config['SQLITE_SYNCHRONOUS'].upper()
+    if journal_mode not in JOURNAL_MODES:
+        raise ValueError(f"Unsupported SQLITE_JOURNAL_MODE: {journal_mode}")
+    if synchronous not in SYNCHRONOUS_MODES:
+        raise ValueError(f"Unsupported SQLITE_SYNCHRONOUS: {synchronous}")
+    pragmas = [
+        f"PRAGMA busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT'])}",
+        f"PRAGMA journal_mode = {journal_mode}",
+        f"PRAGMA synchronous = {synchronous}",
+        f"PRAGMA cache_size = {int(config['SQLITE_CACHE_SIZE'])}",
+        f"PRAGMA mmap_size = {int(config['SQLITE_MMAP_SIZE'])}",
+    ]
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
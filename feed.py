@@ -0,0 +1,56 @@
+import base64
+import json
+from datetime import datetime
+
+from models import db, CareerMoment, ExperienceReply
+
+FEED_PAGE_SIZE = 20
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(moment):
+    key = [moment.urgency, moment.created_at.isoformat(), moment.id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        urgency, created_at, moment_id = json.loads(base64.urlsafe_b64decode(padded))
+        return urgency, datetime.fromisoformat(created_at), int(moment_id)
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+
+
+def feed_page(viewer=None, cursor=None, limit=FEED_PAGE_SIZE, with_replies=False):
+    """One page of the open-moments feed, newest urgent first.
+
+    Returns (moments, next_cursor). Pages continue from the last row's
+    (urgency, created_at, id) key instead of an OFFSET, so every page is a
+    short walk of ix_career_moment_feed. Authors are joined in and
+    reply_count comes from a correlated COUNT, so rendering a page issues no
+    per-moment queries; with_replies also preloads the reply rows.
+    """
+    options = [db.joinedload(CareerMoment.author), db.undefer(CareerMoment.reply_count)]
+    if with_replies:
+        options.append(db.selectinload(CareerMoment.replies))
+    query = CareerMoment.query.options(*options).filter(CareerMoment.status != 'Resolved')
+
+    # If the user is a mentor, hide moments they've already replied to (NOT EXISTS anti-join)
+    if viewer is not None and viewer.is_authenticated and viewer.role == 'mentor':
+        query = query.filter(~CareerMoment.replies.any(ExperienceReply.mentor_id == viewer.id))
+
+    if cursor:
+        query = query.filter(
+            db.tuple_(CareerMoment.urgency, CareerMoment.created_at, CareerMoment.id) < decode_cursor(cursor)
+        )
+    moments = query.order_by(
+        CareerMoment.urgency.desc(),
+        CareerMoment.created_at.desc(),
+        CareerMoment.id.desc()
+    ).limit(limit + 1).all()
+    next_cursor = encode_cursor(moments[limit - 1]) if len(moments) > limit else None
+    return moments[:limit], next_cursor
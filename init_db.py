@@ -1,5 +1,4 @@
-from app import app, db
+from app import app, prepare_database
 
-with app.app_context():
-    db.create_all()
-    print("Database schema created successfully!")
+prepare_database(app)
+print("Database schema created successfully!")
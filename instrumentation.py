@@ -0,0 +1,236 @@
+import hmac
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict, deque
+
+from flask import Response, abort, current_app, g, has_app_context, has_request_context, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+DEFAULT_SLOW_QUERY_MS = 100
+DEFAULT_SLOW_QUERY_LOG_SIZE = 200
+
+slow_query_log = logging.getLogger('pathseeker.slow_query')
+
+
+class Histogram:
+    """Cumulative Prometheus-style histogram, one series per label tuple."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self._series = {} # labels -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self, name, label_names):
+        lines = [f'# TYPE {name} histogram']
+        for labels, series in sorted(self._series.items()):
+            base = _labels(label_names, labels)
+            running = 0
+            for bound, count in zip(self.buckets, series):
+                running += count
+                lines.append(f'{name}_bucket{{{base},le="{bound}"}} {running}')
+            running += series[len(self.buckets)]
+            lines.append(f'{name}_bucket{{{base},le="+Inf"}} {running}')
+            lines.append(f'{name}_sum{{{base}}} {series[-1]:.6f}')
+            lines.append(f'{name}_count{{{base}}} {running}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+class _Metrics:
+    """One app's histograms, counters and slow-query buffer."""
+
+    def __init__(self, config):
+        self.enabled = config['METRICS_ENABLED']
+        self.slow_query_seconds = config['SLOW_QUERY_MS'] / 1000
+        self.slow_query_log_size = config['SLOW_QUERY_LOG_SIZE']
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.latency = Histogram(LATENCY_BUCKETS)
+            self.query_counts = Histogram(QUERY_COUNT_BUCKETS)
+            self.requests = defaultdict(int) # (endpoint, method, status) -> count
+            self.sql_seconds = defaultdict(float) # endpoint -> seconds spent in SQL
+            self.slow_query_totals = defaultdict(int) # endpoint -> count
+            self.slow_queries = deque(maxlen=self.slow_query_log_size)
+
+    def render(self):
+        with self.lock:
+            lines = self.latency.render('pathseeker_request_duration_seconds', ('endpoint', 'method'))
+            lines += self.query_counts.render('pathseeker_request_queries', ('endpoint',))
+            lines.append('# TYPE pathseeker_requests_total counter')
+            for labels, count in sorted(self.requests.items()):
+                lines.append(f'pathseeker_requests_total{{{_labels(("endpoint", "method", "status"), labels)}}} {count}')
+            lines.append('# TYPE pathseeker_sql_duration_seconds_total counter')
+            for endpoint, seconds in sorted(self.sql_seconds.items()):
+                lines.append(f'pathseeker_sql_duration_seconds_total{{{_labels(("endpoint",), (endpoint,))}}} {seconds:.6f}')
+            lines.append('# TYPE pathseeker_slow_queries_total counter')
+            for endpoint, count in sorted(self.slow_query_totals.items()):
+                lines.append(f'pathseeker_slow_queries_total{{{_labels(("endpoint",), (endpoint,))}}} {count}')
+        for name, stats in self.stats.items():
+            try:
+                values = stats()
+            except Exception as e:
+                lines.append(f'# {name} stats unavailable: {type(e).__name__}')
+                continue
+            for key, value in sorted(values.items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f'# TYPE pathseeker_{name}_{key} gauge')
+                    lines.append(f'pathseeker_{name}_{key} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+class Instrumentation:
+    """Request latency, SQL query counts and a slow-query log, served at /metrics.
+
+    Flask before/after-request hooks time each request; SQLAlchemy engine
+    events count and time its statements. Statements slower than
+    SLOW_QUERY_MS are logged to the 'pathseeker.slow_query' logger with the
+    endpoint that ran them (or 'background' outside a request) and kept in
+    a ring buffer served at /metrics/slow-queries. Other components add
+    their stats() to the output with add_stats(). METRICS_ENABLED=0 turns
+    all of it off, including the routes. The routes show SQL text, so they
+    need an `Authorization: Bearer <METRICS_TOKEN>` header; with no
+    METRICS_TOKEN set they're only served in debug mode. Each app keeps its own numbers in
+    app.extensions['instrumentation']; statements run outside an app
+    context aren't counted.
+    """
+
+    def __init__(self, app=None):
+        self._engine_hooked = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_ENABLED', os.environ.get('METRICS_ENABLED', '1') not in ('0', 'false', 'False'))
+        app.config.setdefault('SLOW_QUERY_MS', float(os.environ.get('SLOW_QUERY_MS', DEFAULT_SLOW_QUERY_MS)))
+        app.config.setdefault('METRICS_TOKEN', os.environ.get('METRICS_TOKEN'))
+        app.config.setdefault('SLOW_QUERY_LOG_SIZE', int(os.environ.get('SLOW_QUERY_LOG_SIZE', DEFAULT_SLOW_QUERY_LOG_SIZE)))
+        metrics = app.extensions['instrumentation'] = _Metrics(app.config)
+        if not metrics.enabled:
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+        app.add_url_rule('/metrics/slow-queries', 'slow_queries', self.slow_queries_view)
+        if not self._engine_hooked:
+            # Registered on the Engine class so it covers engines created after init_app
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+            self._engine_hooked = True
+
+    @staticmethod
+    def metrics(app=None):
+        return (app or current_app).extensions['instrumentation']
+
+    @staticmethod
+    def _active():
+        # The current app's metrics, or None outside an app context or with metrics off
+        if not has_app_context():
+            return None
+        metrics = current_app.extensions.get('instrumentation')
+        return metrics if metrics is not None and metrics.enabled else None
+
+    def reset(self, app=None):
+        self.metrics(app).reset()
+
+    def add_stats(self, app, name, stats):
+        """Publish a component's stats() dict as pathseeker_<name>_<key> gauges on app's /metrics."""
+        self.metrics(app).stats[name] = stats
+
+    def render(self, app=None):
+        return self.metrics(app).render()
+
+    def _before_request(self):
+        g._metrics_started = time.perf_counter()
+        g._metrics_queries = 0
+        g._metrics_sql_seconds = 0.0
+
+    def _after_request(self, response):
+        started = g.pop('_metrics_started', None)
+        if started is None:
+            return response
+        # For streamed responses this is the time to the first byte, not the whole stream
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint or 'not_found'
+        metrics = self.metrics()
+        with metrics.lock:
+            metrics.latency.observe((endpoint, request.method), elapsed)
+            metrics.query_counts.observe((endpoint,), g.get('_metrics_queries', 0))
+            metrics.requests[(endpoint, request.method, response.status_code)] += 1
+            metrics.sql_seconds[endpoint] += g.get('_metrics_sql_seconds', 0.0)
+        return response
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self._active() is not None:
+            conn.info.setdefault('_metrics_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get('_metrics_started')
+        metrics = self._active()
+        if metrics is None or not stack:
+            return
+        elapsed = time.perf_counter() - stack.pop()
+        endpoint = 'background'
+        if has_request_context():
+            endpoint = request.endpoint or 'not_found'
+            if '_metrics_started' in g:
+                g._metrics_queries = g.get('_metrics_queries', 0) + 1
+                g._metrics_sql_seconds = g.get('_metrics_sql_seconds', 0.0) + elapsed
+        if elapsed >= metrics.slow_query_seconds:
+            entry = {
+                'endpoint': endpoint,
+                'ms': round(elapsed * 1000, 2),
+                'statement': ' '.join(statement.split())[:500], # Parameters left out on purpose
+                'at': time.time()
+            }
+            with metrics.lock:
+                metrics.slow_queries.append(entry)
+                metrics.slow_query_totals[endpoint] += 1
+            slow_query_log.warning("Slow query (%.1f ms) in %s: %s", entry['ms'], endpoint, entry['statement'])
+
+    @staticmethod
+    def _check_access():
+        token = current_app.config['METRICS_TOKEN']
+        if not token:
+            if not current_app.debug:
+                abort(404)
+            return
+        scheme, _, given = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(given.encode(), token.encode()):
+            abort(401)
+
+    def metrics_view(self):
+        self._check_access()
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+    def slow_queries_view(self):
+        self._check_access()
+        metrics = self.metrics()
+        with metrics.lock:
+            entries = list(metrics.slow_queries)
+        return jsonify({'threshold_ms': metrics.slow_query_seconds * 1000, 'queries': entries[::-1]})
+
+
+instrumentation = Instrumentation()
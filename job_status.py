@@ -0,0 +1,21 @@
+import sys
+from app import app, db
+from models import Job
+from jobs import job_queue
+
+def status():
+    with app.app_context():
+        db.create_all()
+        if '--retry-failed' in sys.argv:
+            print(f"{job_queue.retry_failed()} failed job(s) re-queued.")
+        if '--purge' in sys.argv:
+            print(f"{job_queue.purge_done()} done job(s) older than {app.config['JOBS_RETENTION_DAYS']:g} day(s) deleted.")
+        if '--run' in sys.argv:
+            print(f"{job_queue.run_pending()} job(s) run.")
+        for state, count in job_queue.stats().items():
+            print(f"{state:>8}: {count}")
+        for failed in Job.query.filter_by(status='failed').order_by(Job.id.desc()).limit(10):
+            print(f"  #{failed.id} {failed.name} after {failed.attempts} attempt(s): {failed.last_error}")
+
+if __name__ == "__main__":
+    status()
@@ -0,0 +1,281 @@
+import atexit
+import datetime
+import json
+import os
+import threading
+import time
+import traceback
+import weakref
+
+from flask import current_app, has_app_context
+
+from models import db, Job
+
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_RETRY_DELAY = 5 # Seconds before the first retry, doubled for each one after
+DEFAULT_POLL_SECONDS = 2
+DEFAULT_STALE_SECONDS = 600 # A job 'running' this long belonged to a worker that died
+DEFAULT_RETENTION_DAYS = 7 # Done jobs older than this are deleted; 0 keeps them
+PURGE_INTERVAL_SECONDS = 3600 # How often idle workers sweep out old done jobs
+HANDLERS = {}
+
+
+def job(name):
+    """Register a handler; it is called with the job's payload as keyword arguments."""
+    def register(fn):
+        HANDLERS[name] = fn
+        return fn
+    return register
+
+
+class _Workers:
+    """One app's worker threads and the events that wake and stop them."""
+
+    def __init__(self, app):
+        self.app = app
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.threads = []
+        self.purged_at = None # time.monotonic() of the last retention sweep
+
+
+class JobQueue:
+    """Post-commit work run by worker threads, persisted in the job table.
+
+    enqueue() records a job and commits it, so call it after the request's
+    own commit. Workers claim due jobs with a conditional UPDATE (safe with
+    several processes), run them in a fresh app context, and retry failures
+    with exponential backoff up to JOBS_MAX_ATTEMPTS before marking them
+    failed. Idle workers delete done jobs older than JOBS_RETENTION_DAYS
+    about once an hour; failed ones are kept for job_status.py. Servers
+    call start() once per process (serve.py does it after forking), and
+    enqueue() starts the workers if nobody did. With JOBS_SYNC set,
+    enqueue() runs due jobs inline instead, which is what tests and
+    scripts want. Each app gets
+    its own workers in app.extensions['job_queue']; methods use the current
+    app unless one is passed.
+    """
+
+    def __init__(self, app=None):
+        self._running = weakref.WeakSet() # _Workers with live threads, for shutdown at exit
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('JOBS_SYNC', os.environ.get('JOBS_SYNC') == '1')
+        app.config.setdefault('JOBS_WORKERS', int(os.environ.get('JOBS_WORKERS', DEFAULT_WORKERS)))
+        app.config.setdefault('JOBS_MAX_ATTEMPTS', int(os.environ.get('JOBS_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)))
+        app.config.setdefault('JOBS_RETRY_DELAY', float(os.environ.get('JOBS_RETRY_DELAY', DEFAULT_RETRY_DELAY)))
+        app.config.setdefault('JOBS_POLL_SECONDS', float(os.environ.get('JOBS_POLL_SECONDS', DEFAULT_POLL_SECONDS)))
+        app.config.setdefault('JOBS_STALE_SECONDS', int(os.environ.get('JOBS_STALE_SECONDS', DEFAULT_STALE_SECONDS)))
+        app.config.setdefault('JOBS_RETENTION_DAYS', float(os.environ.get('JOBS_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)))
+        app.extensions['job_queue'] = _Workers(app)
+
+    @staticmethod
+    def _workers(app=None):
+        if app is None:
+            app = current_app._get_current_object()
+        return app.extensions['job_queue']
+
+    def enqueue(self, name, **payload):
+        """Persist a job and hand it to the current app's workers. Returns the job id."""
+        if name not in HANDLERS:
+            raise ValueError(f"Unknown job: {name}")
+        return self._enqueue(name, json.dumps(payload, sort_keys=True))
+
+    def enqueue_once(self, name, **payload):
+        """Like enqueue(), unless the same job is already queued; then that job's id is returned.
+
+        For refreshes that page views may ask for repeatedly: only the first
+        view writes a job row.
+        """
+        if name not in HANDLERS:
+            raise ValueError(f"Unknown job: {name}")
+        encoded = json.dumps(payload, sort_keys=True)
+        queued = (db.session.query(Job.id)
+                  .filter(Job.status == 'queued', Job.name == name, Job.payload == encoded)
+                  .first())
+        if queued is not None:
+            return queued.id
+        return self._enqueue(name, encoded)
+
+    def _enqueue(self, name, encoded):
+        config = current_app.config
+        new_job = Job(name=name, payload=encoded, max_attempts=config['JOBS_MAX_ATTEMPTS'])
+        db.session.add(new_job)
+        db.session.flush()
+        job_id = new_job.id
+        db.session.commit()
+        if config['JOBS_SYNC']:
+            self.run_pending()
+        else:
+            self.start()
+            self._workers().wake.set()
+        return job_id
+
+    def start(self, app=None):
+        """Start the app's worker threads if they aren't running yet (never with JOBS_SYNC)."""
+        workers = self._workers(app)
+        if workers.app.config['JOBS_SYNC']:
+            return
+        with workers.lock:
+            if workers.threads:
+                return
+            workers.stopping.clear()
+            self._requeue_stale(workers.app)
+            for i in range(workers.app.config['JOBS_WORKERS']):
+                thread = threading.Thread(target=self._work, args=(workers,), name=f'job-worker-{i}', daemon=True)
+                thread.start()
+                workers.threads.append(thread)
+            self._running.add(workers)
+
+    def shutdown(self, app=None, timeout=10):
+        """Let running jobs finish, then stop the workers. Queued jobs stay in the table for next time.
+
+        Without an app (or app context) every app's workers are stopped, as at interpreter exit.
+        """
+        if app is None and not has_app_context():
+            targets = list(self._running)
+        else:
+            targets = [self._workers(app)]
+        for workers in targets:
+            with workers.lock:
+                threads, workers.threads = workers.threads, []
+            self._running.discard(workers)
+            if not threads:
+                continue
+            workers.stopping.set()
+            workers.wake.set()
+            for thread in threads:
+                thread.join(timeout)
+
+    def _requeue_stale(self, app):
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=app.config['JOBS_STALE_SECONDS'])
+        with app.app_context():
+            Job.query.filter(Job.status == 'running', Job.started_at < cutoff).update(
+                {Job.status: 'queued'}, synchronize_session=False)
+            db.session.commit()
+            db.session.remove()
+
+    def _work(self, workers):
+        while not workers.stopping.is_set():
+            try:
+                ran = self.run_next(workers.app)
+            except Exception:
+                traceback.print_exc()
+                ran = False
+            if not ran:
+                self._sweep(workers)
+                workers.wake.wait(workers.app.config['JOBS_POLL_SECONDS'])
+                workers.wake.clear()
+
+    def _sweep(self, workers):
+        now = time.monotonic()
+        with workers.lock:
+            if workers.purged_at is not None and now - workers.purged_at < PURGE_INTERVAL_SECONDS:
+                return
+            workers.purged_at = now
+        try:
+            self.purge_done(workers.app)
+        except Exception:
+            traceback.print_exc()
+
+    def purge_done(self, app=None):
+        """Delete done jobs that finished more than JOBS_RETENTION_DAYS ago. Returns how many went."""
+        app = self._workers(app).app
+        days = app.config['JOBS_RETENTION_DAYS']
+        if not days:
+            return 0
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+        with app.app_context():
+            count = Job.query.filter(Job.status == 'done', Job.finished_at < cutoff).delete(synchronize_session=False)
+            db.session.commit()
+            db.session.remove()
+        return count
+
+    def _claim(self):
+        now = datetime.datetime.utcnow()
+        candidates = (db.session.query(Job.id)
+                      .filter(Job.status == 'queued', Job.run_at <= now)
+                      .order_by(Job.run_at, Job.id)
+                      .limit(5)
+                      .all())
+        for (job_id,) in candidates:
+            claimed = Job.query.filter(Job.id == job_id, Job.status == 'queued').update({
+                Job.status: 'running',
+                Job.attempts: Job.attempts + 1,
+                Job.started_at: now
+            }, synchronize_session=False)
+            db.session.commit()
+            if claimed:
+                return db.session.get(Job, job_id)
+        return None
+
+    def run_next(self, app=None):
+        """Claim and run one due job. Returns False when there was nothing to do."""
+        app = self._workers(app).app
+        with app.app_context():
+            try:
+                claimed = self._claim()
+                if claimed is None:
+                    return False
+                job_id = claimed.id
+                try:
+                    HANDLERS[claimed.name](**json.loads(claimed.payload))
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    self._failed(claimed, e)
+                    return True
+                # A plain UPDATE, since the commit above expired `claimed` and touching it would reload the row
+                Job.query.filter_by(id=job_id).update({
+                    Job.status: 'done',
+                    Job.last_error: None,
+                    Job.finished_at: datetime.datetime.utcnow()
+                }, synchronize_session=False)
+                db.session.commit()
+                return True
+            finally:
+                db.session.remove()
+
+    def _failed(self, failed_job, error):
+        print(f"Job {failed_job.id} ({failed_job.name}) failed on attempt {failed_job.attempts}: {error}")
+        failed_job.last_error = ''.join(traceback.format_exception_only(type(error), error)).strip()[:2000]
+        if failed_job.attempts < failed_job.max_attempts:
+            delay = current_app.config['JOBS_RETRY_DELAY'] * 2 ** (failed_job.attempts - 1)
+            failed_job.status = 'queued'
+            failed_job.run_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=delay)
+        else:
+            failed_job.status = 'failed'
+            failed_job.finished_at = datetime.datetime.utcnow()
+        db.session.commit()
+
+    def run_pending(self, app=None):
+        """Run every job that is due now. Returns how many ran."""
+        app = self._workers(app).app
+        count = 0
+        while self.run_next(app):
+            count += 1
+        return count
+
+    def retry_failed(self, app=None):
+        """Put failed jobs back in the queue with a fresh set of attempts."""
+        with self._workers(app).app.app_context():
+            count = Job.query.filter_by(status='failed').update({
+                Job.status: 'queued',
+                Job.attempts: 0,
+                Job.run_at: datetime.datetime.utcnow()
+            }, synchronize_session=False)
+            db.session.commit()
+            return count
+
+    def stats(self, app=None):
+        with self._workers(app).app.app_context():
+            counts = dict(db.session.query(Job.status, db.func.count(Job.id)).group_by(Job.status).all())
+        return {status: counts.get(status, 0) for status in ('queued', 'running', 'done', 'failed')}
+
+
+job_queue = JobQueue()
+atexit.register(job_queue.shutdown)
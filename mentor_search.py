@@ -0,0 +1,203 @@
+import re
+from flask import current_app
+from sqlalchemy import Integer, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import GenericFunction
+
+from models import db, User, Skill, mentor_skill, normalize_skills
+
+SEARCH_PAGE_SIZE = 20
+# bm25 column weights for (name, skills, bio)
+RANK_WEIGHTS = (10.0, 5.0, 1.0)
+
+_SETUP_STATEMENTS = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS mentor_fts USING fts5(name, skills, bio, tokenize='unicode61')",
+    """CREATE TRIGGER IF NOT EXISTS mentor_fts_ai AFTER INSERT ON user WHEN new.role = 'mentor' BEGIN
+        INSERT INTO mentor_fts(rowid, name, skills, bio) VALUES (new.id, new.name, coalesce(new.skills, ''), coalesce(new.bio, ''));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS mentor_fts_au AFTER UPDATE OF name, skills, bio, role ON user BEGIN
+        DELETE FROM mentor_fts WHERE rowid = old.id;
+        INSERT INTO mentor_fts(rowid, name, skills, bio)
+            SELECT new.id, new.name, coalesce(new.skills, ''), coalesce(new.bio, '') WHERE new.role = 'mentor';
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS mentor_fts_ad AFTER DELETE ON user BEGIN
+        DELETE FROM mentor_fts WHERE rowid = old.id;
+    END""",
+]
+
+_REBUILD_STATEMENTS = [
+    "DELETE FROM mentor_fts",
+    """INSERT INTO mentor_fts(rowid, name, skills, bio)
+        SELECT id, name, coalesce(skills, ''), coalesce(bio, '') FROM user WHERE role = 'mentor'""",
+]
+
+class substring_position(GenericFunction):
+    """1-based position of a substring, 0 when absent; case sensitive, unlike LIKE in SQLite."""
+    type = Integer()
+    inherit_cache = True
+
+
+@compiles(substring_position)
+def _instr(element, compiler, **kw):
+    return f"instr({compiler.process(element.clauses, **kw)})"
+
+
+@compiles(substring_position, 'postgresql')
+def _strpos(element, compiler, **kw):
+    return f"strpos({compiler.process(element.clauses, **kw)})"
+
+
+_fts_table = db.table('mentor_fts', db.column('rowid'))
+
+
+class _SearchState:
+    """One app's answer to whether its database has the FTS5 index; None until checked."""
+
+    def __init__(self):
+        self.fts_available = None
+
+
+class MentorSearch:
+    """Flask extension keeping each app's FTS5 availability in app.extensions['mentor_search']."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['mentor_search'] = _SearchState()
+
+
+def _state():
+    return current_app.extensions['mentor_search']
+
+
+def init_mentor_search():
+    """Create the FTS5 table and sync triggers if missing. Returns False when FTS5 can't be used.
+
+    The index is rebuilt from the user table whenever the triggers had to be
+    (re)created, since any writes made without them were never indexed.
+    """
+    engine = db.engine
+    state = _state()
+    if engine.dialect.name != 'sqlite':
+        state.fts_available = False
+        return False
+    try:
+        with engine.begin() as conn:
+            existing = conn.execute(text(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'mentor_fts_%'"
+            )).scalar()
+            for statement in _SETUP_STATEMENTS:
+                conn.execute(text(statement))
+            if existing < 3:
+                for statement in _REBUILD_STATEMENTS:
+                    conn.execute(text(statement))
+    except OperationalError as e:
+        print(f"Mentor full-text search unavailable, falling back to substring search: {e}")
+        state.fts_available = False
+        return False
+    state.fts_available = True
+    return True
+
+
+def fts_enabled():
+    engine = db.engine
+    state = _state()
+    available = state.fts_available
+    if available is None:
+        # Processes that didn't run init_mentor_search() (forked workers, scripts) use the index if its triggers exist
+        available = False
+        if engine.dialect.name == 'sqlite':
+            with engine.connect() as conn:
+                available = conn.execute(text(
+                    "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'mentor_fts_%'"
+                )).scalar() >= 3
+        state.fts_available = available
+    return available
+
+
+def _match_terms(query):
+    """Quote every token and make it a prefix match, so user input can't inject FTS syntax."""
+    tokens = re.findall(r'\w+', query or '', re.UNICODE)
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def build_match_expression(name_query='', text_query=''):
+    clauses = []
+    name_terms = _match_terms(name_query)
+    if name_terms:
+        clauses.append(f'name : ({name_terms})')
+    all_terms = _match_terms(text_query)
+    if all_terms:
+        clauses.append(f'({all_terms})')
+    return ' AND '.join(clauses)
+
+
+def _skill_prefix(term):
+    # Range scan on the unique skill.name index; equivalent to LIKE 'term%'
+    return (Skill.name >= term) & (Skill.name < term + '\uffff')
+
+
+def _mentors_with_skill(terms):
+    return db.select(mentor_skill.c.user_id).join(Skill, Skill.id == mentor_skill.c.skill_id).where(
+        db.or_(*[_skill_prefix(term) for term in terms])
+    )
+
+
+def filter_by_skills(query, domain_query, skill_match='any'):
+    """Restrict a User query to mentors tagged with the comma-separated skills (prefix match)."""
+    terms = normalize_skills(domain_query)
+    if not terms:
+        return query
+    if skill_match == 'all':
+        for term in terms:
+            query = query.filter(User.id.in_(_mentors_with_skill([term])))
+        return query
+    return query.filter(User.id.in_(_mentors_with_skill(terms)))
+
+
+def _page(query, page, per_page):
+    rows = query.limit(per_page + 1).offset((page - 1) * per_page).all()
+    return rows[:per_page], len(rows) > per_page
+
+
+def search_mentors(name_query='', domain_query='', text_query='', mode='fts', skill_match='any',
+                   page=1, per_page=SEARCH_PAGE_SIZE):
+    """Return (mentors, has_next) for one page of results.
+
+    mode='fts' ranks name/free-text token and prefix matches with bm25 and
+    filters domains through the skill tag index. mode='substring' keeps the
+    original semantics: case-sensitive name and case-insensitive skills
+    substrings, evaluated in SQL instead of Python.
+    """
+    page = max(page, 1)
+    query = User.query.filter_by(role='mentor')
+
+    if mode == 'fts' and fts_enabled():
+        match = build_match_expression(name_query, text_query)
+        if match:
+            query = query.join(_fts_table, _fts_table.c.rowid == User.id).filter(
+                text('mentor_fts MATCH :match')
+            ).params(match=match).order_by(
+                text(f"bm25(mentor_fts, {', '.join(str(w) for w in RANK_WEIGHTS)})")
+            )
+        query = filter_by_skills(query, domain_query, skill_match)
+        return _page(query.order_by(User.id), page, per_page)
+
+    if name_query:
+        query = query.filter(substring_position(User.name, name_query) > 0)
+    if domain_query:
+        query = query.filter(db.func.lower(User.skills).contains(domain_query.lower(), autoescape=True))
+    if text_query:
+        pattern = text_query.lower()
+        query = query.filter(
+            db.func.lower(User.name).contains(pattern, autoescape=True) |
+            db.func.lower(User.skills).contains(pattern, autoescape=True) |
+            db.func.lower(User.bio).contains(pattern, autoescape=True)
+        )
+    return _page(query.order_by(User.id), page, per_page)
+
+
+mentor_search = MentorSearch()
@@ -0,0 +1,17 @@
+import sys
+from app import app, db
+from migrations import MIGRATIONS, applied_versions, run_migrations
+
+def migrate():
+    with app.app_context():
+        db.create_all()
+        if '--status' in sys.argv:
+            done = applied_versions(db.engine)
+            for version, description, _ in MIGRATIONS:
+                print(f"[{'x' if version in done else ' '}] {version}: {description}")
+            return
+        applied = run_migrations(db.engine, verbose=True)
+        print(f"{len(applied)} migration(s) applied." if applied else "Database is up to date.")
+
+if __name__ == "__main__":
+    migrate()
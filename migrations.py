@@ -0,0 +1,195 @@
+import datetime
+from sqlalchemy import text, inspect, bindparam
+from sqlalchemy.exc import IntegrityError
+
+from models import db, normalize_skills
+
+BATCH_SIZE = 1000
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Register a schema migration. Each one must be safe to re-run."""
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+def latest_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def _columns(conn, table):
+    return {c['name'] for c in inspect(conn).get_columns(table)}
+
+
+def _add_column(conn, table, column, ddl):
+    if column not in _columns(conn, table):
+        print(f"Adding '{column}' column to '{table}' table...")
+        conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {ddl}'))
+
+
+def _in_batches(engine, table, statement, batch_size=BATCH_SIZE):
+    """Run `statement` over id ranges (:low, :high] in separate short transactions.
+
+    Keeps each write lock brief on large tables instead of one long rewrite.
+    """
+    with engine.connect() as conn:
+        max_id = conn.execute(text(f'SELECT max(id) FROM "{table}"')).scalar() or 0
+    for low in range(0, max_id, batch_size):
+        with engine.begin() as conn:
+            conn.execute(text(statement), {'low': low, 'high': low + batch_size})
+
+
+def _create_declared_indexes(engine):
+    # create_all() skips indexes on tables that already exist
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+
+@migration(1, 'Legacy columns from fix_db.py, add_is_read.py and add_education_field.py')
+def _legacy_columns(engine):
+    with engine.begin() as conn:
+        _add_column(conn, 'user', 'skills', 'TEXT')
+        _add_column(conn, 'user', 'bio', 'TEXT')
+        _add_column(conn, 'user', 'education', 'VARCHAR(100)')
+        _add_column(conn, 'message', 'is_read', 'BOOLEAN DEFAULT 0')
+
+
+@migration(2, "Rename 'mentee' role to 'student' (migrate_roles.py)")
+def _mentee_roles(engine):
+    with engine.begin() as conn:
+        conn.execute(text('UPDATE "user" SET role = \'student\' WHERE role = \'mentee\''))
+
+
+@migration(3, 'Secondary indexes for foreign-key filters, feed order and chat cursors')
+def _indexes(engine):
+    _create_declared_indexes(engine)
+
+
+@migration(4, 'Denormalized mentor rating aggregates')
+def _rating_aggregates(engine):
+    with engine.begin() as conn:
+        _add_column(conn, 'user', 'rating_count', 'INTEGER NOT NULL DEFAULT 0')
+        _add_column(conn, 'user', 'rating_sum', 'INTEGER NOT NULL DEFAULT 0')
+    _in_batches(engine, 'user', """
+        UPDATE "user" SET
+            rating_count = (SELECT count(*) FROM mentor_rating r WHERE r.mentor_id = "user".id),
+            rating_sum = (SELECT coalesce(sum(r.rating), 0) FROM mentor_rating r WHERE r.mentor_id = "user".id)
+        WHERE id > :low AND id <= :high
+    """)
+
+
+@migration(5, 'Split mentor skill strings into skill / mentor_skill tags')
+def _skill_tags(engine):
+    select_ids = text("SELECT name, id FROM skill WHERE name IN :names").bindparams(bindparam('names', expanding=True))
+    with engine.connect() as conn:
+        max_id = conn.execute(text('SELECT max(id) FROM "user"')).scalar() or 0
+    for low in range(0, max_id, BATCH_SIZE):
+        with engine.begin() as conn:
+            mentors = conn.execute(text(
+                'SELECT id, skills FROM "user" WHERE role = \'mentor\' AND skills IS NOT NULL AND id > :low AND id <= :high'
+            ), {'low': low, 'high': low + BATCH_SIZE}).all()
+            tags = [(user_id, name) for user_id, skills in mentors for name in normalize_skills(skills)]
+            if not tags:
+                continue
+            names = sorted({name for _, name in tags})
+            conn.execute(text("INSERT OR IGNORE INTO skill (name) VALUES (:name)"), [{'name': n} for n in names])
+            ids = {}
+            for i in range(0, len(names), 500):
+                ids.update(conn.execute(select_ids, {'names': names[i:i + 500]}).all())
+            conn.execute(text(
+                "INSERT OR IGNORE INTO mentor_skill (user_id, skill_id) VALUES (:user_id, :skill_id)"
+            ), [{'user_id': user_id, 'skill_id': ids[name]} for user_id, name in tags])
+
+
+_BACKFILL_READ_STATES = """
+    INSERT INTO chat_read_state (chat_id, user_id, last_read_message_id, unread_count)
+    SELECT c.id, c.{participant},
+        coalesce(
+            (SELECT min(m.id) - 1 FROM message m
+             WHERE m.chat_id = c.id AND m.sender_id != c.{participant} AND m.is_read = 0),
+            (SELECT max(m.id) FROM message m WHERE m.chat_id = c.id),
+            0),
+        (SELECT count(*) FROM message m
+         WHERE m.chat_id = c.id AND m.sender_id != c.{participant} AND m.is_read = 0)
+    FROM chat c
+    WHERE c.id > :low AND c.id <= :high AND NOT EXISTS (
+        SELECT 1 FROM chat_read_state s WHERE s.chat_id = c.id AND s.user_id = c.{participant}
+    )
+"""
+
+
+@migration(6, 'Seed chat read cursors and unread counters from message.is_read')
+def _chat_read_states(engine):
+    for participant in ('student_id', 'mentor_id'):
+        _in_batches(engine, 'chat', _BACKFILL_READ_STATES.format(participant=participant))
+
+
+@migration(7, "Default missing career_moment.urgency to 'Normal' for feed cursors")
+def _feed_urgency(engine):
+    _in_batches(engine, 'career_moment', """
+        UPDATE career_moment SET urgency = 'Normal' WHERE urgency IS NULL AND id > :low AND id <= :high
+    """)
+
+
+@migration(8, 'Staleness marker for materialized similar moments')
+def _similar_refreshed_at(engine):
+    with engine.begin() as conn:
+        _add_column(conn, 'career_moment', 'similar_refreshed_at', 'DATETIME')
+    _create_declared_indexes(engine)
+
+
+@migration(9, 'Mark existing mentor ratings as applied now that a job applies new ones')
+def _rating_applied(engine):
+    with engine.begin() as conn:
+        if 'applied' not in _columns(conn, 'mentor_rating'):
+            _add_column(conn, 'mentor_rating', 'applied', 'BOOLEAN NOT NULL DEFAULT 0')
+            # Migration 4 already counted every existing rating in the aggregates
+            conn.execute(text('UPDATE mentor_rating SET applied = 1'))
+
+
+def _ensure_version_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description VARCHAR(200) NOT NULL,
+                applied_at DATETIME NOT NULL
+            )
+        """))
+
+
+def applied_versions(engine):
+    _ensure_version_table(engine)
+    with engine.connect() as conn:
+        return set(conn.execute(text("SELECT version FROM schema_version")).scalars())
+
+
+def run_migrations(engine, verbose=False):
+    """Apply pending migrations in order and record each one. Returns the versions applied.
+
+    Expects the tables themselves to exist already (db.create_all()); the
+    migrations bring older databases' columns, indexes and derived data up to
+    date. Safe to call on every startup.
+    """
+    done = applied_versions(engine)
+    applied = []
+    for version, description, fn in MIGRATIONS:
+        if version in done:
+            continue
+        if verbose:
+            print(f"Applying migration {version}: {description}")
+        fn(engine)
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(
+                    "INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)"
+                ), {'v': version, 'd': description, 't': datetime.datetime.utcnow()})
+        except IntegrityError:
+            pass # Another worker recorded it first; the migration itself is idempotent
+        applied.append(version)
+    return applied
@@ -1,6 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from datetime import datetime
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
 
 db = SQLAlchemy()
 
@@ -15,30 +17,75 @@ class User(UserMixin, db.Model):
     bio = db.Column(db.Text, nullable=True)  # Mentor bio/description
     education = db.Column(db.String(100), nullable=True) # Undergraduate, Graduate, etc.
     is_verified = db.Column(db.Boolean, default=False)
+    # Denormalized rating aggregates, kept in step with MentorRating by rate_mentor
+    rating_count = db.Column(db.Integer, default=0, nullable=False)
+    rating_sum = db.Column(db.Integer, default=0, nullable=False)
 
     @property
     def average_rating(self):
-        ratings = MentorRating.query.filter_by(mentor_id=self.id).all()
-        if not ratings:
+        if not self.rating_count:
             return 0
-        return round(sum(r.rating for r in ratings) / len(ratings), 1)
+        return round(self.rating_sum / self.rating_count, 1)
+
+# Mentor <-> skill association; the primary key serves user lookups, the index skill lookups
+mentor_skill = db.Table(
+    'mentor_skill',
+    db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
+    db.Column('skill_id', db.Integer, db.ForeignKey('skill.id'), primary_key=True),
+    db.Index('ix_mentor_skill_skill_id_user_id', 'skill_id', 'user_id')
+)
+
+class Skill(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False) # Normalized: stripped, lower-case
+
+    mentors = db.relationship('User', secondary=mentor_skill, backref=db.backref('skill_tags', lazy=True), lazy=True)
+
+def normalize_skills(skills):
+    """Split a comma-separated skills string into unique, lower-cased skill names."""
+    names = []
+    for part in (skills or '').split(','):
+        name = ' '.join(part.split()).lower()[:100]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+def set_mentor_skills(user, skills):
+    """Point user.skill_tags at the Skill rows for `skills`, creating any that are new."""
+    names = normalize_skills(skills)
+    existing = {}
+    if names:
+        with db.session.no_autoflush:
+            existing = {s.name: s for s in Skill.query.filter(Skill.name.in_(names)).all()}
+    tags = []
+    for name in names:
+        skill = existing.get(name)
+        if skill is None:
+            skill = Skill(name=name)
+            db.session.add(skill)
+        tags.append(skill)
+    user.skill_tags = tags
 
 class CareerMoment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    author_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    author_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=False)
     background = db.Column(db.Text, nullable=True)
     urgency = db.Column(db.String(20), default='Normal') # 'Normal' or 'Urgent'
-    status = db.Column(db.String(20), default='Open') # 'Open', 'Resolved'
+    status = db.Column(db.String(20), default='Open', index=True) # 'Open', 'Resolved'
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    similar_refreshed_at = db.Column(db.DateTime, nullable=True) # NULL until similar_moment rows are computed
     
     author = db.relationship('User', backref='moments')
     replies = db.relationship('ExperienceReply', backref='moment', lazy=True, cascade='all, delete-orphan')
 
+    # Feed order (urgency, created_at, id) doubles as the keyset pagination cursor
+    __table_args__ = (db.Index('ix_career_moment_feed', 'urgency', 'created_at', 'id'),)
+
 class ExperienceReply(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    moment_id = db.Column(db.Integer, db.ForeignKey('career_moment.id'), nullable=False)
+    moment_id = db.Column(db.Integer, db.ForeignKey('career_moment.id'), nullable=False, index=True)
     mentor_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     decision_made = db.Column(db.Text, nullable=False) # "What decision I made"
     content = db.Column(db.Text, nullable=False) # "The Story/Outcome"
@@ -48,24 +95,32 @@ class ExperienceReply(db.Model):
     mentor = db.relationship('User', backref='replies')
     ratings = db.relationship('MentorRating', backref='reply', lazy=True, cascade='all, delete-orphan')
 
+    # Serves the "moments this mentor replied to" EXISTS / NOT EXISTS checks
+    __table_args__ = (db.Index('ix_experience_reply_mentor_id_moment_id', 'mentor_id', 'moment_id'),)
+
 class MentorRating(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    mentor_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    mentor_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     reply_id = db.Column(db.Integer, db.ForeignKey('experience_reply.id'), nullable=False)
     rating = db.Column(db.Integer, nullable=False) # 1-5
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    applied = db.Column(db.Boolean, default=False, nullable=False) # Counted in the mentor's points and aggregates
+
+    # "Already rated?" checks and the rated-replies list on view_moment
+    __table_args__ = (db.Index('ix_mentor_rating_student_id_reply_id', 'student_id', 'reply_id'),)
 
 class Chat(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    mentor_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    mentor_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships with explicit foreign_keys to avoid ambiguity
     student = db.relationship('User', foreign_keys=[student_id], backref='student_chats')
     mentor = db.relationship('User', foreign_keys=[mentor_id], backref='mentor_chats')
     messages = db.relationship('Message', backref='chat', lazy=True, cascade='all, delete-orphan')
+    read_states = db.relationship('ChatReadState', lazy=True, cascade='all, delete-orphan')
     
     # Ensure unique chat per student-mentor pair
     __table_args__ = (db.UniqueConstraint('student_id', 'mentor_id', name='unique_student_mentor_chat'),)
@@ -80,8 +135,100 @@ class Message(db.Model):
     
     sender = db.relationship('User', backref='sent_messages')
 
+    # Cursor pagination (since_id / before_id) walks the first index, the
+    # set-based mark-read UPDATE the second
+    __table_args__ = (
+        db.Index('ix_message_chat_id_id', 'chat_id', 'id'),
+        db.Index('ix_message_chat_id_is_read', 'chat_id', 'is_read'),
+    )
+
+class ChatReadState(db.Model):
+    # One row per chat participant: read cursor plus a running unread counter
+    chat_id = db.Column(db.Integer, db.ForeignKey('chat.id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    last_read_message_id = db.Column(db.Integer, default=0, nullable=False)
+    unread_count = db.Column(db.Integer, default=0, nullable=False)
+
+    # Notification totals only touch this user's rows that have something unread
+    __table_args__ = (db.Index('ix_chat_read_state_user_id_unread_count', 'user_id', 'unread_count'),)
+
+class SimilarMoment(db.Model):
+    # Materialized similar-moment suggestions, read by view_moment in rank order
+    moment_id = db.Column(db.Integer, db.ForeignKey('career_moment.id'), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    similar_id = db.Column(db.Integer, db.ForeignKey('career_moment.id'), nullable=False, index=True)
+    score = db.Column(db.Float, nullable=False)
+
+class MomentChange(db.Model):
+    # Append-only log of moment writes the similarity index cares about; each process's
+    # index replays the rows past its watermark instead of rescanning career_moment
+    id = db.Column(db.Integer, primary_key=True)
+    moment_id = db.Column(db.Integer, nullable=False) # No foreign key: deletions are logged too
+
+    __table_args__ = ({'sqlite_autoincrement': True},) # Ids must never be reused
+
+class Job(db.Model):
+    # Background work queued by jobs.JobQueue
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}') # JSON keyword arguments
+    status = db.Column(db.String(20), nullable=False, default='queued') # 'queued', 'running', 'done', 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    last_error = db.Column(db.Text, nullable=True)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    # Workers look for the oldest due queued job
+    __table_args__ = (db.Index('ix_job_status_run_at', 'status', 'run_at'),)
+
+# Deferred so it's only computed where the feed asks for it with undefer()
+CareerMoment.reply_count = db.column_property(
+    db.select(db.func.count(ExperienceReply.id))
+    .where(ExperienceReply.moment_id == CareerMoment.id)
+    .correlate_except(ExperienceReply)
+    .scalar_subquery(),
+    deferred=True
+)
+
 # Add helper method to Chat after Message is defined
 def get_chat_unread_count(chat, user_id):
-    return Message.query.filter_by(chat_id=chat.id, is_read=False).filter(Message.sender_id != user_id).count()
+    # Reads the counter row; my_chats preloads read_states so this issues no query
+    for state in chat.read_states:
+        if state.user_id == user_id:
+            return state.unread_count
+    return 0
 
 Chat.get_unread_count = get_chat_unread_count
+
+# Fields the similarity index is built from; other updates (similar_refreshed_at, say) aren't logged
+INDEXED_MOMENT_FIELDS = ('title', 'description', 'status')
+
+def _log_moment_change(mapper, connection, target):
+    change_id = connection.execute(
+        MomentChange.__table__.insert().values(moment_id=target.id)).inserted_primary_key[0]
+    # Noted on the session so this process's index can skip replaying its own changes once committed
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('moment_changes_pending', []).append((change_id, target.id))
+
+def _log_moment_update(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in INDEXED_MOMENT_FIELDS):
+        _log_moment_change(mapper, connection, target)
+
+event.listen(CareerMoment, 'after_insert', _log_moment_change)
+event.listen(CareerMoment, 'after_update', _log_moment_update)
+event.listen(CareerMoment, 'after_delete', _log_moment_change)
+
+@event.listens_for(Session, 'after_commit')
+def _commit_moment_changes(session):
+    pending = session.info.pop('moment_changes_pending', None)
+    if pending:
+        session.info.setdefault('moment_changes', []).extend(pending)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _drop_moment_changes(session, previous_transaction):
+    session.info.pop('moment_changes_pending', None)
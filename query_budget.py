@@ -0,0 +1,146 @@
+import logging
+import os
+import re
+import threading
+import warnings
+from collections import Counter
+from contextlib import ContextDecorator
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_REPEAT_THRESHOLD = 5
+
+repeat_log = logging.getLogger('pathseeker.query_repeat')
+
+_IN_LIST = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+_NUMBER = re.compile(r'\b\d+\b')
+
+
+def statement_shape(statement):
+    """Statement text with whitespace, IN-lists and literal numbers collapsed, for spotting repeats."""
+    shape = ' '.join(statement.split())
+    shape = _IN_LIST.sub('(?)', shape)
+    return _NUMBER.sub('N', shape)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class RepeatedQueryWarning(UserWarning):
+    """One request ran the same statement shape many times, usually a lazy load in a loop."""
+
+
+class count_queries(ContextDecorator):
+    """Count the SQL statements this thread runs on `engine` inside the block.
+
+        with count_queries() as queries:
+            client.get('/')
+        assert queries.count <= 3, queries.statements
+
+    Defaults to db.engine, so needs an app context unless an engine is given.
+    """
+
+    def __init__(self, engine=None):
+        self.engine = engine
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def shapes(self):
+        return Counter(statement_shape(s) for s in self.statements)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == self._thread:
+            self.statements.append(statement)
+
+    def __enter__(self):
+        if self.engine is None:
+            from models import db
+            self.engine = db.engine
+        self.statements = []
+        self._thread = threading.get_ident()
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+        return False
+
+
+class query_budget(count_queries):
+    """Fail with QueryBudgetExceeded if the block (or decorated function) runs more than `limit` statements."""
+
+    def __init__(self, limit, engine=None):
+        super().__init__(engine)
+        self.limit = limit
+
+    def __exit__(self, exc_type, exc, tb):
+        super().__exit__(exc_type, exc, tb)
+        if exc_type is None and self.count > self.limit:
+            listing = '\n'.join(f'  {n}x {shape}' for shape, n in self.shapes().most_common())
+            raise QueryBudgetExceeded(f"{self.count} queries run, budget was {self.limit}:\n{listing}")
+        return False
+
+
+class RepeatedQueryGuard:
+    """Warn when a request runs one statement shape more than QUERY_REPEAT_THRESHOLD times.
+
+    On by default when the app runs in debug mode (threshold 5); set
+    QUERY_REPEAT_THRESHOLD to 0 to turn it off, or to a number to turn it on
+    anywhere. Issues a RepeatedQueryWarning and logs to 'pathseeker.query_repeat'.
+    """
+
+    def __init__(self, app=None):
+        self._engine_hooked = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        threshold = os.environ.get('QUERY_REPEAT_THRESHOLD')
+        app.config.setdefault('QUERY_REPEAT_THRESHOLD', int(threshold) if threshold else None)
+        app.extensions['query_repeat_guard'] = self
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        if not self._engine_hooked:
+            event.listen(Engine, 'before_cursor_execute', self._record)
+            self._engine_hooked = True
+
+    @staticmethod
+    def _threshold():
+        # Resolved per request since app.run(debug=True) turns debug on after init_app
+        threshold = current_app.config['QUERY_REPEAT_THRESHOLD']
+        if threshold is None:
+            return DEFAULT_REPEAT_THRESHOLD if current_app.debug else 0
+        return threshold
+
+    def _before_request(self):
+        threshold = self._threshold()
+        if threshold:
+            g._query_shapes = Counter()
+            g._query_repeat_threshold = threshold
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            shapes = g.get('_query_shapes')
+            if shapes is not None:
+                shapes[statement_shape(statement)] += 1
+
+    def _after_request(self, response):
+        shapes = g.pop('_query_shapes', None)
+        if shapes:
+            threshold = g.pop('_query_repeat_threshold')
+            for shape, n in shapes.most_common():
+                if n <= threshold:
+                    break
+                message = f"{request.endpoint} ran the same query {n} times (likely N+1): {shape[:300]}"
+                repeat_log.warning(message)
+                warnings.warn(message, RepeatedQueryWarning)
+        return response
+
+
+query_repeat_guard = RepeatedQueryGuard()
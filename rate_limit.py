@@ -0,0 +1,142 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, jsonify
+from flask_login import current_user
+
+# bucket name -> (burst capacity, tokens refilled per second)
+DEFAULT_LIMITS = {
+    'ai': (5, 0.1), # 5 at once, then one every 10s
+    'chat_poll': (30, 1.0),
+    'notifications': (10, 0.5),
+}
+DEFAULT_MAX_KEYS = 10000
+
+
+class LocalBucketBackend:
+    """Token buckets for this process, least recently used evicted past max_keys."""
+
+    def __init__(self, max_keys=DEFAULT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict() # key -> (tokens, updated_at)
+
+    def take(self, key, capacity, rate, now):
+        """Spend one token. Returns (allowed, seconds until a token is available)."""
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + max(0.0, now - updated_at) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0.0
+            else:
+                retry_after = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return retry_after == 0.0, retry_after
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(retry_after)
+"""
+
+
+class RedisBucketBackend:
+    """Buckets shared by every worker process; the check-and-spend runs atomically in Redis."""
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_URL is set but the 'redis' package is not installed.")
+        self._redis = redis.Redis.from_url(url)
+        self._take = self._redis.register_script(_TAKE_SCRIPT)
+
+    def take(self, key, capacity, rate, now):
+        retry_after = float(self._take(keys=[f'pathseeker:{key}'], args=[capacity, rate, now]))
+        return retry_after == 0.0, retry_after
+
+    def clear(self):
+        for key in self._redis.scan_iter('pathseeker:rate:*'):
+            self._redis.delete(key)
+
+
+class RateLimiter:
+    """Per-user token-bucket limits for the chatty endpoints.
+
+    RATE_LIMITS maps a bucket name to (burst, refill per second); each view
+    decorated with limit(name) spends one token from the current user's
+    bucket and gets a 429 with Retry-After when it is empty. Set
+    RATE_LIMIT_URL to a Redis URL to share buckets between worker processes,
+    or RATE_LIMIT_ENABLED=0 to switch limiting off.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RATE_LIMIT_ENABLED', os.environ.get('RATE_LIMIT_ENABLED', '1') not in ('0', 'false', 'False'))
+        app.config.setdefault('RATE_LIMIT_URL', os.environ.get('RATE_LIMIT_URL'))
+        app.config.setdefault('RATE_LIMITS', {})
+        url = app.config['RATE_LIMIT_URL']
+        app.extensions['rate_limiter'] = RedisBucketBackend(url) if url else LocalBucketBackend()
+
+    @property
+    def backend(self):
+        return current_app.extensions['rate_limiter']
+
+    def take(self, bucket, identity):
+        capacity, rate = current_app.config['RATE_LIMITS'].get(bucket) or DEFAULT_LIMITS[bucket]
+        return self.backend.take(f'rate:{bucket}:{identity}', capacity, rate, time.time())
+
+    def limit(self, bucket):
+        """View decorator; goes below @login_required so the user is known."""
+        def decorator(view):
+            @wraps(view)
+            def wrapped(*args, **kwargs):
+                if current_app.config['RATE_LIMIT_ENABLED']:
+                    allowed, retry_after = self.take(bucket, current_user.get_id())
+                    if not allowed:
+                        return too_many_requests(retry_after)
+                return view(*args, **kwargs)
+            return wrapped
+        return decorator
+
+    def clear(self):
+        self.backend.clear()
+
+
+def too_many_requests(retry_after):
+    response = jsonify({'error': 'Too many requests. Please slow down.', 'retry_after': math.ceil(retry_after)})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+rate_limiter = RateLimiter()
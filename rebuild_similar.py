@@ -0,0 +1,12 @@
+import sys
+from app import app
+from similar_cache import similar_cache
+
+def rebuild():
+    with app.app_context():
+        stale_only = '--stale' in sys.argv
+        count = similar_cache.rebuild(stale_only=stale_only)
+        print(f"Refreshed similar moments for {count} {'stale ' if stale_only else ''}moment(s).")
+
+if __name__ == "__main__":
+    rebuild()
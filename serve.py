@@ -0,0 +1,222 @@
+"""Production entry point: python serve.py [--workers N] [--threads N] [--port N]
+
+Prefers gunicorn, which runs several processes that each handle several
+threads. The app is loaded once in the master before forking, and on
+SIGTERM each worker stops accepting new connections and lets in-flight
+requests finish for up to the graceful timeout. gunicorn doesn't run on
+Windows, so there it falls back to waitress (one process, many threads),
+then to Werkzeug's threaded server if neither is installed. The schema is
+created and migrated once, before any worker starts. Chat streams still
+open at the graceful timeout are cut; browsers reconnect with
+Last-Event-ID and pick up where they left off.
+
+Sizing: every open chat or AI stream, and every AI call running or waiting
+for the model, holds one of a process's threads, so the default is a lot of
+(mostly idle) threads, split three ways. A quarter (at least 4) is kept for
+pages. AI calls are admitted to another quarter (AI_MAX_WORKERS running,
+AI_MAX_QUEUE waiting) and further ones get AIBusy. Streams get what's left
+(STREAM_MAX_CONNECTIONS) and past that a 503 with Retry-After. Set any of
+those yourself and the streams are sized around it; the caps together
+must stay below --threads. Raise --threads, or add workers, for more open
+chats; memory per thread is small next to a process.
+
+Settings come from the command line or SERVE_* environment variables.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+
+DEFAULT_HOST = '0.0.0.0'
+DEFAULT_PORT = 5050
+DEFAULT_THREADS = 32 # Chat and AI streams hold a thread each for as long as they're open
+MIN_PAGE_THREADS = 4 # Threads streams and AI calls can never take
+MIN_THREADS = MIN_PAGE_THREADS + 2 # Room for one stream and one AI call as well
+DEFAULT_TIMEOUT = 60 # Seconds a gunicorn worker may go silent before it's restarted
+DEFAULT_GRACEFUL_TIMEOUT = 30 # Seconds in-flight requests get to finish on shutdown
+DEFAULT_KEEPALIVE = 5
+SERVERS = ('gunicorn', 'waitress', 'werkzeug')
+
+
+def default_workers():
+    return min(multiprocessing.cpu_count() * 2 + 1, 8)
+
+
+def parse_args(argv=None):
+    env = os.environ.get
+    parser = argparse.ArgumentParser(description="Run Pathseeker with a production WSGI server.")
+    parser.add_argument('--server', choices=('auto',) + SERVERS, default=env('SERVE_SERVER', 'auto'))
+    parser.add_argument('--host', default=env('SERVE_HOST', DEFAULT_HOST))
+    parser.add_argument('--port', type=int, default=int(env('SERVE_PORT', DEFAULT_PORT)))
+    parser.add_argument('--workers', type=int, default=int(env('SERVE_WORKERS', 0)) or default_workers(),
+                        help="Processes (gunicorn only)")
+    parser.add_argument('--threads', type=int, default=int(env('SERVE_THREADS', DEFAULT_THREADS)),
+                        help="Threads per process")
+    parser.add_argument('--timeout', type=int, default=int(env('SERVE_TIMEOUT', DEFAULT_TIMEOUT)))
+    parser.add_argument('--graceful-timeout', type=int,
+                        default=int(env('SERVE_GRACEFUL_TIMEOUT', DEFAULT_GRACEFUL_TIMEOUT)))
+    parser.add_argument('--keepalive', type=int, default=int(env('SERVE_KEEPALIVE', DEFAULT_KEEPALIVE)))
+    parser.add_argument('--skip-migrations', action='store_true', default=env('SERVE_SKIP_MIGRATIONS') == '1',
+                        help="Don't create or migrate the schema first (run migrate.py separately)")
+    args = parser.parse_args(argv)
+    if args.threads < MIN_THREADS:
+        parser.error(f"--threads must be at least {MIN_THREADS}")
+    return args
+
+
+def ai_caps(threads):
+    """(AI_MAX_WORKERS, AI_MAX_QUEUE) admitting AI calls to at most a quarter of the threads."""
+    admitted = max(1, threads // 4)
+    workers = max(1, admitted // 2)
+    return workers, admitted - workers
+
+
+def stream_cap(threads, ai_admitted):
+    """Streams one process may hold open: the threads left after the page reserve and the AI calls."""
+    return max(1, threads - max(MIN_PAGE_THREADS, threads // 4) - ai_admitted)
+
+
+def long_lived_limit(config):
+    """Threads that streams and AI calls together may hold, or None when streams aren't capped."""
+    if not config['STREAM_MAX_CONNECTIONS']:
+        return None
+    return config['STREAM_MAX_CONNECTIONS'] + config['AI_MAX_WORKERS'] + config['AI_MAX_QUEUE']
+
+
+def app_config(args):
+    """App settings sized from the thread count; anything set in the environment wins."""
+    env = os.environ
+    workers, queued = ai_caps(args.threads)
+    workers = int(env.get('AI_MAX_WORKERS', workers))
+    queued = int(env.get('AI_MAX_QUEUE', queued))
+    derived = {'AI_MAX_WORKERS': workers, 'AI_MAX_QUEUE': queued,
+               'STREAM_MAX_CONNECTIONS': stream_cap(args.threads, workers + queued)}
+    return {key: value for key, value in derived.items() if key not in env}
+
+
+def shared_state_note(app, workers):
+    """What stays per process when gunicorn runs several workers."""
+    unset = [key for key in ('RATE_LIMIT_URL', 'USER_CACHE_URL', 'AI_SESSION_URL', 'CHAT_BROKER_URL')
+             if not app.config[key]]
+    note = (f"Note: with {workers} workers each process keeps its own similarity index, "
+            f"synced from the database on each search.")
+    if unset:
+        note += (f" Rate limits, caches, AI sessions and chat events are also per process until you set "
+                 f"{', '.join(unset)} (Redis URLs); without CHAT_BROKER_URL a chat stream hears about "
+                 f"messages sent through other workers only at its next heartbeat.")
+    return note
+
+
+def choose_server(requested):
+    if requested != 'auto':
+        return requested
+    candidates = SERVERS if os.name != 'nt' else SERVERS[1:]
+    for name in candidates[:-1]:
+        try:
+            __import__(name)
+            return name
+        except ImportError:
+            continue
+    return 'werkzeug'
+
+
+def post_fork(server, worker):
+    # Pooled connections and background threads don't survive fork: drop the
+    # master's copies without closing them and let this worker start its own
+    from models import db
+    from jobs import job_queue
+    app = server.app.wsgi() # The app preloaded in the master
+    with app.app_context():
+        db.engine.dispose(close=False)
+    job_queue.shutdown(app, timeout=0)
+    job_queue.start(app) # Start this worker's job threads now rather than on its first enqueue
+
+
+def worker_exit(server, worker):
+    # Runs after gunicorn has drained the worker's requests; let running jobs finish too
+    from ai_service import ai_service
+    from jobs import job_queue
+    app = worker.wsgi
+    job_queue.shutdown(app)
+    ai_service.shutdown(app)
+
+
+def gunicorn_options(args):
+    return {
+        'bind': f'{args.host}:{args.port}',
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': 'gthread',
+        'preload_app': True,
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'keepalive': args.keepalive,
+        'accesslog': '-',
+        'post_fork': post_fork,
+        'worker_exit': worker_exit,
+    }
+
+
+def serve_gunicorn(app, args):
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise RuntimeError("--server gunicorn needs the gunicorn package (pip install gunicorn)")
+
+    class Server(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app # Already imported in the master, which is what preload_app means here
+
+    Server(gunicorn_options(args)).run()
+
+
+def serve_waitress(app, args):
+    try:
+        import waitress
+    except ImportError:
+        raise RuntimeError("--server waitress needs the waitress package (pip install waitress)")
+    # waitress finishes the requests in flight when it's stopped with Ctrl+C
+    waitress.serve(app, host=args.host, port=args.port, threads=args.threads)
+
+
+def serve_werkzeug(app, args):
+    print("Using Werkzeug's threaded server, which is not meant for production; install gunicorn "
+          "(or waitress on Windows).", file=sys.stderr)
+    app.run(host=args.host, port=args.port, threaded=True, debug=False, use_reloader=False)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    server = choose_server(args.server)
+    from app import create_app, db, prepare_database
+    app = create_app(app_config(args))
+    if not args.skip_migrations:
+        prepare_database(app)
+    with app.app_context():
+        db.engine.dispose() # Workers open their own connections
+    held = long_lived_limit(app.config)
+    if held is None or held >= args.threads:
+        print(f"Warning: STREAM_MAX_CONNECTIONS + AI_MAX_WORKERS + AI_MAX_QUEUE ({held or 'no cap'}) is not "
+              f"below --threads ({args.threads}); streams and AI calls can take every thread.", file=sys.stderr)
+    if server == 'gunicorn' and args.workers > 1:
+        print(shared_state_note(app, args.workers), file=sys.stderr)
+    if server != 'gunicorn':
+        # One process, so the job threads start here; gunicorn starts them per worker in post_fork
+        from jobs import job_queue
+        job_queue.start(app)
+    startup = app.extensions['startup']
+    print(f"Serving on {args.host}:{args.port} with {server} (app ready in "
+          f"{startup['import_to_ready_seconds']:.2f}s)", file=sys.stderr)
+    {'gunicorn': serve_gunicorn, 'waitress': serve_waitress, 'werkzeug': serve_werkzeug}[server](app, args)
+
+
+if __name__ == '__main__':
+    main()
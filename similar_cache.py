@@ -0,0 +1,114 @@
+import datetime
+import os
+
+from flask import current_app
+
+from jobs import job, job_queue
+from models import db, CareerMoment, SimilarMoment
+from similarity import similarity_index
+
+SIMILAR_LIMIT = 3
+NEIGHBOUR_LIMIT = 20 # How many nearby moments a create/resolve can reorder
+DEFAULT_MAX_AGE = 6 * 3600
+REBUILD_BATCH_SIZE = 500
+
+
+class SimilarMomentsCache:
+    """Materialized "similar moments" for each moment, kept in similar_moment.
+
+    view_moment reads a moment's rows with one indexed query. When a moment
+    is created or resolved, a background job finds the moments around it and
+    recomputes their rows and its own. Views never search: a moment whose
+    rows were never computed (similar_refreshed_at is NULL) or are older
+    than SIMILAR_MAX_AGE gets a refresh job, queued at most once, and the
+    view serves whatever rows exist meanwhile.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SIMILAR_MAX_AGE', int(os.environ.get('SIMILAR_MAX_AGE', DEFAULT_MAX_AGE)))
+        app.extensions['similar_cache'] = self
+
+    def refresh(self, moment, sync=True):
+        """Recompute and stage `moment`'s rows; the caller commits. Returns the (score, id) pairs."""
+        scored = similarity_index.search(moment.title, limit=SIMILAR_LIMIT, sync=sync)
+        SimilarMoment.query.filter_by(moment_id=moment.id).delete(synchronize_session=False)
+        db.session.add_all([
+            SimilarMoment(moment_id=moment.id, rank=rank, similar_id=similar_id, score=score)
+            for rank, (score, similar_id) in enumerate(scored)
+        ])
+        moment.similar_refreshed_at = datetime.datetime.utcnow()
+        return scored
+
+    def refresh_ids(self, moment_ids, sync=True):
+        moment_ids = list(moment_ids)
+        for i in range(0, len(moment_ids), REBUILD_BATCH_SIZE):
+            # This process's index may predate moments written by other workers; sync it once per batch
+            if sync or i:
+                similarity_index.sync()
+            for moment in CareerMoment.query.filter(CareerMoment.id.in_(moment_ids[i:i + REBUILD_BATCH_SIZE])).all():
+                self.refresh(moment, sync=False)
+            db.session.commit()
+
+    def schedule(self, moment_id):
+        """Refresh this moment's rows in a background job, unless one is already queued."""
+        job_queue.enqueue_once('refresh_similar', moment_ids=[moment_id])
+
+    def neighbour_ids(self, moment):
+        """Moments that `moment` may now be suggested for, after it is created or resolved."""
+        return [moment_id for _, moment_id in similarity_index.search(moment.title, limit=NEIGHBOUR_LIMIT, any_status=True)]
+
+    def moment_changed(self, moment):
+        """Queue a refresh of `moment` and its neighbours; the neighbour search runs in the job."""
+        job_queue.enqueue_once('refresh_similar_neighbours', moment_id=moment.id)
+
+    def moment_deleted(self, moment_id):
+        """Stage removal of rows for or pointing at moment_id; the moments that pointed at it go stale."""
+        affected = [m for (m,) in db.session.query(SimilarMoment.moment_id).filter_by(similar_id=moment_id).distinct()]
+        SimilarMoment.query.filter(db.or_(
+            SimilarMoment.moment_id == moment_id,
+            SimilarMoment.similar_id == moment_id
+        )).delete(synchronize_session=False)
+        if affected:
+            CareerMoment.query.filter(CareerMoment.id.in_(affected)).update(
+                {CareerMoment.similar_refreshed_at: None}, synchronize_session=False)
+
+    def get(self, moment):
+        """Suggested moments for `moment`, best first."""
+        max_age = datetime.timedelta(seconds=current_app.config['SIMILAR_MAX_AGE'])
+        if moment.similar_refreshed_at is None or moment.similar_refreshed_at < datetime.datetime.utcnow() - max_age:
+            self.schedule(moment.id)
+        return (CareerMoment.query
+                .join(SimilarMoment, SimilarMoment.similar_id == CareerMoment.id)
+                .filter(SimilarMoment.moment_id == moment.id)
+                .order_by(SimilarMoment.rank)
+                .all())
+
+    def rebuild(self, stale_only=False):
+        """Recompute every moment's rows (or only never-computed ones) in batches. Returns the count."""
+        query = db.session.query(CareerMoment.id).order_by(CareerMoment.id)
+        if stale_only:
+            query = query.filter(CareerMoment.similar_refreshed_at.is_(None))
+        moment_ids = [moment_id for (moment_id,) in query]
+        self.refresh_ids(moment_ids)
+        return len(moment_ids)
+
+
+similar_cache = SimilarMomentsCache()
+
+
+@job('refresh_similar')
+def refresh_similar(moment_ids):
+    similar_cache.refresh_ids(moment_ids)
+
+
+@job('refresh_similar_neighbours')
+def refresh_similar_neighbours(moment_id):
+    moment = db.session.get(CareerMoment, moment_id)
+    if moment is None:
+        return # Deleted before the job ran
+    # The neighbour search has just synced the index
+    similar_cache.refresh_ids([moment_id] + similar_cache.neighbour_ids(moment), sync=False)
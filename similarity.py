@@ -0,0 +1,268 @@
+import math
+import threading
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+from flask import current_app
+
+from models import db, CareerMoment, MomentChange
+
+NGRAM_SIZE = 3
+SCORE_THRESHOLD = 0.3 # Same cut-off the old SequenceMatcher scan used
+DESCRIPTION_WEIGHT = 0.3 # Description words only nudge candidate ranking
+CANDIDATE_FACTOR = 10 # How many index hits we re-score per requested result
+COMMON_TERM_FRACTION = 0.05 # Terms in more of the corpus than this are skipped at query time...
+MIN_COMMON_DF = 50 # ...once they're in more moments than this, so small corpora keep every term
+MIN_QUERY_TERMS = 3 # Rarest terms kept when a query has fewer uncommon ones than this
+CHANGE_OVERLAP = 32 # moment_change ids below the watermark re-checked for late commits
+
+
+def char_ngrams(text, n=NGRAM_SIZE):
+    """Character n-grams of the padded, lower-cased text."""
+    text = ' '.join((text or '').lower().split())
+    if not text:
+        return []
+    padded = f' {text} '
+    if len(padded) <= n:
+        return [padded]
+    return [padded[i:i + n] for i in range(len(padded) - n + 1)]
+
+
+def word_tokens(text):
+    return [w for w in ''.join(c if c.isalnum() else ' ' for c in (text or '').lower()).split() if len(w) > 2]
+
+
+def _term_counts(title, description):
+    counts = defaultdict(float)
+    for gram in char_ngrams(title):
+        counts['t:' + gram] += 1.0
+    for word in word_tokens(description):
+        counts['d:' + word] += DESCRIPTION_WEIGHT
+    return counts
+
+
+class _MomentIndex:
+    """One app's TF-IDF index over moment titles (char n-grams) and descriptions.
+
+    Built lazily from the database on first use. Every insert, delete and
+    title, description or status update of a moment appends a moment_change
+    row (see models.py), whichever process makes it, so each search replays
+    the rows past the index's watermark and re-reads just those moments.
+    Changes this process made and already applied through add(),
+    update_status() or remove() are marked seen and not replayed. Lookups
+    only touch the postings of the query's own terms, and skip terms so
+    common they'd cost the most to walk while barely moving the ranking.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._watermark = 0 # Highest moment_change id replayed
+        self._seen = set() # Replayed or locally applied change ids within CHANGE_OVERLAP of the watermark
+        self._docs = {} # moment_id -> (title, is_open, {term: weight})
+        self._norms = {}
+        self._postings = defaultdict(dict) # term -> {moment_id: weight}
+        self._open_count = 0
+
+    def reset(self):
+        with self._lock:
+            self._built = False
+            self._watermark = 0
+            self._seen.clear()
+            self._docs.clear()
+            self._norms.clear()
+            self._postings.clear()
+            self._open_count = 0
+
+    def sync(self):
+        """Replay moment changes made since the last sync (see the class docstring)."""
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    # Changes logged from here on are replayed, so nothing committed during the load is missed
+                    recent = [change_id for (change_id,) in db.session.query(MomentChange.id).order_by(
+                        MomentChange.id.desc()).limit(CHANGE_OVERLAP)]
+                    self._load(db.session.query(
+                        CareerMoment.id, CareerMoment.title, CareerMoment.description, CareerMoment.status))
+                    self._watermark = recent[0] if recent else 0
+                    self._seen = set(recent)
+                    self._built = True
+            return
+        # Postgres ids can commit out of order, so look a little below the watermark as well
+        rows = db.session.query(MomentChange.id, MomentChange.moment_id).filter(
+            MomentChange.id > self._watermark - CHANGE_OVERLAP).all()
+        with self._lock:
+            fresh = {moment_id for change_id, moment_id in rows if change_id not in self._seen}
+            if fresh:
+                self._reload(fresh)
+            if rows:
+                self._seen.update(change_id for change_id, _ in rows)
+                self._watermark = max(self._watermark, max(change_id for change_id, _ in rows))
+                self._seen = {change_id for change_id in self._seen if change_id > self._watermark - CHANGE_OVERLAP}
+
+    def _load(self, rows):
+        for moment_id, title, description, status in rows:
+            self._add(moment_id, title, description, status)
+
+    def _reload(self, moment_ids):
+        # Moments that were created, edited, resolved or deleted since the last sync
+        moment_ids = list(moment_ids)
+        for start in range(0, len(moment_ids), 500):
+            batch = moment_ids[start:start + 500]
+            rows = db.session.query(
+                CareerMoment.id, CareerMoment.title, CareerMoment.description, CareerMoment.status
+            ).filter(CareerMoment.id.in_(batch)).all()
+            self._load(rows)
+            found = {row[0] for row in rows}
+            for moment_id in batch:
+                if moment_id not in found:
+                    self._remove(moment_id)
+
+    def _mark_applied(self, moment_id):
+        # This process's own committed changes to moment_id are already in the index
+        changes = db.session.info.get('moment_changes')
+        if not changes:
+            return
+        self._seen.update(change_id for change_id, changed_id in changes if changed_id == moment_id)
+        changes[:] = [change for change in changes if change[1] != moment_id]
+
+    def _add(self, moment_id, title, description, status):
+        if moment_id in self._docs:
+            self._remove(moment_id)
+        counts = _term_counts(title, description)
+        # Sub-linear tf; idf is applied at query time so inserts stay O(terms)
+        weights = {term: 1.0 + math.log(tf) if tf >= 1 else tf for term, tf in counts.items()}
+        is_open = status == 'Open'
+        self._docs[moment_id] = (title, is_open, weights)
+        self._norms[moment_id] = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        for term, weight in weights.items():
+            self._postings[term][moment_id] = weight
+        if is_open:
+            self._open_count += 1
+
+    def _remove(self, moment_id):
+        doc = self._docs.pop(moment_id, None)
+        if doc is None:
+            return
+        _, is_open, weights = doc
+        self._norms.pop(moment_id, None)
+        for term in weights:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(moment_id, None)
+                if not posting:
+                    del self._postings[term]
+        if is_open:
+            self._open_count -= 1
+
+    def add(self, moment):
+        """Index a new (or edited) moment."""
+        with self._lock:
+            if self._built:
+                self._add(moment.id, moment.title, moment.description, moment.status)
+                self._mark_applied(moment.id)
+
+    def update_status(self, moment):
+        with self._lock:
+            doc = self._docs.get(moment.id) if self._built else None
+            if doc is None:
+                return self.add(moment)
+            is_open = moment.status == 'Open'
+            if doc[1] != is_open:
+                self._docs[moment.id] = (doc[0], is_open, doc[2])
+                self._open_count += 1 if is_open else -1
+            self._mark_applied(moment.id)
+
+    def remove(self, moment_id):
+        with self._lock:
+            if self._built:
+                self._remove(moment_id)
+                self._mark_applied(moment_id)
+
+    def search(self, title, limit=3, description=None, threshold=SCORE_THRESHOLD, any_status=False, sync=True):
+        """Return up to `limit` (score, moment_id) pairs most similar to `title`.
+
+        Like the old scan, resolved moments are preferred and only when none
+        exist does the whole corpus count; any_status=True always searches
+        the whole corpus. The index is synced with the table first unless
+        sync=False (for callers that just did it for a batch). Candidates
+        come from the inverted index; the final score is still the SequenceMatcher title ratio so the
+        threshold means the same thing as before.
+        """
+        if sync or not self._built:
+            self.sync()
+        query = _term_counts(title, description)
+        if not query:
+            return []
+        with self._lock:
+            total = len(self._docs)
+            if not total:
+                return []
+            resolved_only = not any_status and total > self._open_count
+            lowered = title.lower()
+            terms = [(term, q_weight, self._postings[term]) for term, q_weight in query.items()
+                     if term in self._postings]
+            common = max(MIN_COMMON_DF, total * COMMON_TERM_FRACTION)
+            rare = [t for t in terms if len(t[2]) <= common]
+            if len(rare) < MIN_QUERY_TERMS:
+                # A query of nothing but common terms still needs candidates: take its rarest ones
+                rare = sorted(terms, key=lambda t: len(t[2]))[:MIN_QUERY_TERMS]
+            scores = defaultdict(float)
+            for term, q_weight, posting in rare:
+                idf = math.log(1 + total / len(posting))
+                for moment_id, d_weight in posting.items():
+                    scores[moment_id] += q_weight * d_weight * idf * idf
+            candidates = []
+            for moment_id, score in scores.items():
+                doc_title, is_open, _ = self._docs[moment_id]
+                if resolved_only and is_open:
+                    continue
+                if doc_title == title:
+                    continue # Skip self
+                candidates.append((score / self._norms[moment_id], moment_id, doc_title))
+        candidates.sort(reverse=True)
+
+        results = []
+        for _, moment_id, doc_title in candidates[:max(limit, 1) * CANDIDATE_FACTOR]:
+            ratio = SequenceMatcher(None, lowered, doc_title.lower()).ratio()
+            if ratio > threshold:
+                results.append((ratio, moment_id))
+        results.sort(key=lambda x: x[0], reverse=True)
+        return results[:limit]
+
+
+class SimilarityIndex:
+    """Flask extension giving each app its own in-process index in app.extensions['similarity_index']."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['similarity_index'] = _MomentIndex()
+
+    @staticmethod
+    def _index():
+        return current_app.extensions['similarity_index']
+
+    def reset(self):
+        self._index().reset()
+
+    def sync(self):
+        self._index().sync()
+
+    def add(self, moment):
+        """Index a new (or edited) moment."""
+        self._index().add(moment)
+
+    def update_status(self, moment):
+        self._index().update_status(moment)
+
+    def remove(self, moment_id):
+        self._index().remove(moment_id)
+
+    def search(self, title, limit=3, description=None, threshold=SCORE_THRESHOLD, any_status=False, sync=True):
+        return self._index().search(title, limit, description, threshold, any_status, sync)
+
+
+similarity_index = SimilarityIndex()
@@ -0,0 +1,82 @@
+import os
+import threading
+from functools import wraps
+
+from flask import current_app, jsonify
+
+DEFAULT_MAX_CONNECTIONS = 0 # No cap; serve.py sizes one from its thread count
+DEFAULT_BUSY_RETRY_AFTER = 5
+
+
+class _Slots:
+    """Streams one app has open right now."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.open = 0
+        self.rejected = 0
+
+    def acquire(self, limit):
+        with self.lock:
+            if limit and self.open >= limit:
+                self.rejected += 1
+                return False
+            self.open += 1
+            return True
+
+    def release(self):
+        with self.lock:
+            self.open -= 1
+
+
+class StreamLimiter:
+    """Caps the long-lived streaming responses a process holds open.
+
+    A chat or AI stream keeps a server thread for as long as it is open, so
+    without a cap enough open tabs leave no thread for ordinary pages. Views
+    decorated with limit() take a slot for the life of the response and get
+    a 503 with Retry-After once STREAM_MAX_CONNECTIONS are open (0 = no cap).
+    The count is per process, like the server's threads.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('STREAM_MAX_CONNECTIONS',
+                              int(os.environ.get('STREAM_MAX_CONNECTIONS', DEFAULT_MAX_CONNECTIONS)))
+        app.config.setdefault('STREAM_BUSY_RETRY_AFTER',
+                              int(os.environ.get('STREAM_BUSY_RETRY_AFTER', DEFAULT_BUSY_RETRY_AFTER)))
+        app.extensions['stream_limiter'] = _Slots()
+
+    def limit(self, view):
+        """View decorator; the slot is given back when the server closes the response."""
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            slots = current_app.extensions['stream_limiter']
+            if not slots.acquire(current_app.config['STREAM_MAX_CONNECTIONS']):
+                return streams_busy(current_app.config['STREAM_BUSY_RETRY_AFTER'])
+            try:
+                response = current_app.make_response(view(*args, **kwargs))
+            except BaseException:
+                slots.release()
+                raise
+            response.call_on_close(slots.release)
+            return response
+        return wrapped
+
+    def stats(self, app=None):
+        app = app or current_app
+        slots = app.extensions['stream_limiter']
+        return {'open': slots.open, 'limit': app.config['STREAM_MAX_CONNECTIONS'], 'rejected': slots.rejected}
+
+
+def streams_busy(retry_after):
+    response = jsonify({'error': 'Too many open streams right now. Please try again in a moment.'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+stream_limiter = StreamLimiter()
@@ -0,0 +1,163 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from sqlalchemy.orm import make_transient_to_detached
+
+from models import db, User
+
+DEFAULT_TTL = 30
+DEFAULT_SIZE = 2048
+# Never copied into the cache (or Redis); loaded from the database on access instead
+UNCACHED_COLUMNS = ('password',)
+CACHED_COLUMNS = tuple(c.key for c in User.__table__.columns if c.key not in UNCACHED_COLUMNS)
+
+
+class LocalCacheBackend:
+    """Per-process TTL + LRU map."""
+
+    def __init__(self, max_size=DEFAULT_SIZE):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._items = OrderedDict() # key -> (expires_at, value)
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item[0] < time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._items[key] = (time.monotonic() + ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class RedisCacheBackend:
+    """Shared across worker processes, so an invalidation in one is seen by all."""
+
+    def __init__(self, url, namespace='user', setting='USER_CACHE_URL'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError(f"{setting} is set but the 'redis' package is not installed.")
+        self._redis = redis.Redis.from_url(url)
+        self.namespace = namespace
+
+    def get(self, key):
+        value = self._redis.get(f'pathseeker:{key}')
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl):
+        self._redis.setex(f'pathseeker:{key}', max(int(ttl), 1), json.dumps(value))
+
+    def delete(self, key):
+        self._redis.delete(f'pathseeker:{key}')
+
+    def clear(self):
+        for key in self._redis.scan_iter(f'pathseeker:{self.namespace}:*'):
+            self._redis.delete(key)
+
+    def __len__(self):
+        return sum(1 for _ in self._redis.scan_iter(f'pathseeker:{self.namespace}:*'))
+
+
+class _UserCacheState:
+    def __init__(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+
+class UserCache:
+    """Read-through cache of user rows for the flask-login user_loader.
+
+    Only column values are cached, and not the password hash, which a cached
+    user loads with one SELECT if it's read. A hit is rebuilt into a User and merged
+    into the session without a SELECT, so it behaves like a normally loaded
+    instance (lazy relationships, updates and commits all work). Each app
+    gets its own backend and counters in app.extensions['user_cache'].
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('USER_CACHE_TTL', int(os.environ.get('USER_CACHE_TTL', DEFAULT_TTL)))
+        app.config.setdefault('USER_CACHE_SIZE', int(os.environ.get('USER_CACHE_SIZE', DEFAULT_SIZE)))
+        app.config.setdefault('USER_CACHE_URL', os.environ.get('USER_CACHE_URL'))
+        url = app.config['USER_CACHE_URL']
+        backend = RedisCacheBackend(url) if url else LocalCacheBackend(app.config['USER_CACHE_SIZE'])
+        app.extensions['user_cache'] = _UserCacheState(backend, app.config['USER_CACHE_TTL'])
+
+    @staticmethod
+    def _state():
+        return current_app.extensions['user_cache']
+
+    @property
+    def backend(self):
+        return self._state().backend
+
+    def get(self, user_id):
+        state = self._state()
+        if state.ttl <= 0:
+            return db.session.get(User, user_id)
+        row = state.backend.get(f'user:{user_id}')
+        with state.lock:
+            if row is not None:
+                state.hits += 1
+            else:
+                state.misses += 1
+        if row is not None:
+            user = User(**row)
+            make_transient_to_detached(user)
+            return db.session.merge(user, load=False)
+        user = db.session.get(User, user_id)
+        if user is not None:
+            state.backend.set(f'user:{user_id}', {key: getattr(user, key) for key in CACHED_COLUMNS}, state.ttl)
+        return user
+
+    def invalidate(self, user_id):
+        self._state().backend.delete(f'user:{user_id}')
+
+    def clear(self):
+        self._state().backend.clear()
+
+    def stats(self):
+        state = self._state()
+        with state.lock:
+            hits, misses = state.hits, state.misses
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 4) if total else 0.0,
+            'size': len(state.backend)
+        }
+
+
+user_cache = UserCache()
@@ -0,0 +1,194 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from app import create_app, db
+from ai_service import ai_service, SYSTEM_INSTRUCTION, CONFIG_ERROR_MISSING_KEY, CONFIG_ERROR_INVALID_KEY, FALLBACK_RESPONSE
+from ai_cache import ai_cache
+
+class FakeModel:
+    """Stands in for Gemini: echoes the question, or misbehaves on request."""
+    instances = []
+
+    def __init__(self, api_key, model_name, system_instruction):
+        self.api_key = api_key
+        self.system_instruction = system_instruction
+        self.prompts = []
+        FakeModel.instances.append(self)
+
+    def generate(self, contents, timeout):
+        self.prompts.append(contents)
+        question = contents[-1]['parts'][0]
+        if question == 'slow':
+            time.sleep(0.5)
+        if question == 'bad key':
+            raise RuntimeError('400 API_KEY_INVALID')
+        if question == 'boom':
+            raise RuntimeError('connection reset')
+        return f'Answer to: {question}'
+
+    def stream(self, contents, timeout):
+        if contents[-1]['parts'][0] == 'boom':
+            yield 'Partial '
+            raise RuntimeError('connection reset')
+        for word in self.generate(contents, timeout).split(' '):
+            yield word + ' '
+
+class AIServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.key_dir = tempfile.TemporaryDirectory()
+        self.key_file = os.path.join(self.key_dir.name, 'api_key.txt')
+        self.write_key('test-key-1')
+        self.saved_env_key = os.environ.pop('GOOGLE_API_KEY', None)
+        self.flask_app = create_app({
+            'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'RATE_LIMIT_ENABLED': False,
+            'AI_MODEL_FACTORY': FakeModel, 'AI_KEY_FILE': self.key_file, 'AI_TIMEOUT': 0.2,
+            'AI_MAX_WORKERS': 1, 'AI_MAX_QUEUE': 0, 'AI_CACHE_PATH': os.path.join(self.key_dir.name, 'ai_cache.db'),
+            'AI_CACHE_SIMILARITY': 0.8})
+        FakeModel.instances = []
+        with self.flask_app.app_context():
+            db.create_all()
+        self.app = self.flask_app.test_client()
+        self.app.post('/register', data=dict(name='Student', email='ai@example.com', password='password'))
+
+    def tearDown(self):
+        ai_service.shutdown(self.flask_app)
+        if self.saved_env_key is not None:
+            os.environ['GOOGLE_API_KEY'] = self.saved_env_key
+        self.key_dir.cleanup()
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def write_key(self, key):
+        with open(self.key_file, 'w') as f:
+            f.write(key)
+        # Make sure the modification is visible even on coarse mtime clocks
+        stamp = time.time_ns() + len(key)
+        os.utime(self.key_file, ns=(stamp, stamp))
+
+    def ask(self, message):
+        return self.app.post('/ai/chat', json={'message': message})
+
+    def test_reuses_model_and_reloads_on_key_change(self):
+        self.assertEqual(self.ask('resume tips').get_json()['response'], 'Answer to: resume tips')
+        self.ask('interview tips')
+        self.assertEqual(len(FakeModel.instances), 1)
+        self.assertEqual(FakeModel.instances[0].system_instruction, SYSTEM_INSTRUCTION)
+        self.assertEqual(FakeModel.instances[0].prompts[0], [{'role': 'user', 'parts': ['resume tips']}])
+
+        self.write_key('test-key-2')
+        self.ask('college search')
+        self.assertEqual([m.api_key for m in FakeModel.instances], ['test-key-1', 'test-key-2'])
+
+        os.remove(self.key_file)
+        self.assertEqual(self.ask('anything').get_json()['response'], CONFIG_ERROR_MISSING_KEY)
+
+    def test_error_mapping_timeout_and_admission(self):
+        self.assertEqual(self.ask('bad key').get_json()['response'], CONFIG_ERROR_INVALID_KEY)
+        self.assertEqual(self.ask('boom').get_json()['response'], FALLBACK_RESPONSE)
+        self.assertEqual(self.ask('slow').get_json()['response'], FALLBACK_RESPONSE)
+
+        # The timed-out call still holds the only worker slot, so the next one is turned away
+        response = self.ask('resume tips')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], str(self.flask_app.config['AI_BUSY_RETRY_AFTER']))
+        time.sleep(0.4)
+        self.assertEqual(self.ask('resume tips').status_code, 200)
+
+    def test_session_history_stays_within_budget(self):
+        self.flask_app.config.update(AI_HISTORY_TOKENS=40, AI_SUMMARY_TOKENS=20)
+        self.ask('What should I study for data science')
+        self.assertEqual(len(FakeModel.instances[0].prompts[-1]), 1)
+        self.ask('Which statistics courses')
+        self.assertEqual([turn['parts'][0] for turn in FakeModel.instances[0].prompts[-1]], [
+            'What should I study for data science', 'Answer to: What should I study for data science',
+            'Which statistics courses'])
+
+        for i in range(10):
+            self.ask(f'Follow-up question number {i}')
+        prompt = FakeModel.instances[0].prompts[-1]
+        texts = [turn['parts'][0] for turn in prompt]
+        # Older exchanges are summarised by their questions; only the latest ones are sent whole
+        self.assertTrue(texts[0].startswith('Earlier in this conversation I asked about: '))
+        self.assertIn('Follow-up question number 6', texts[0])
+        self.assertNotIn('data science', texts[0])
+        self.assertEqual(texts[-3:], ['Follow-up question number 8', 'Answer to: Follow-up question number 8',
+                                      'Follow-up question number 9'])
+        self.assertEqual([turn['role'] for turn in prompt], ['user', 'model'] * (len(prompt) // 2) + ['user'])
+        self.assertLess(sum(len(text) for text in texts), 4 * (40 + 20 + 30))
+
+        self.assertEqual(self.app.post('/ai/chat/reset').status_code, 200)
+        self.ask('Fresh start')
+        self.assertEqual(len(FakeModel.instances[0].prompts[-1]), 1)
+
+    def opening(self, message):
+        self.app.post('/ai/chat/reset')
+        return self.ask(message)
+
+    def test_cache_serves_repeats_without_the_model(self):
+        self.assertEqual(self.opening('How do I write a resume?').get_json()['response'], 'Answer to: How do I write a resume?')
+        self.assertEqual(self.opening('  how do I write a RESUME ').get_json()['response'], 'Answer to: How do I write a resume?')
+        self.assertEqual(self.opening('how do i write a resume??').get_json()['response'], 'Answer to: How do I write a resume?')
+        self.assertEqual(len(FakeModel.instances[0].prompts), 1)
+
+        # Near-duplicate wording reuses the answer; a different question does not
+        self.opening('Tips for a software engineering interview')
+        self.assertEqual(self.opening('tips for software engineering interviews').get_json()['response'],
+                         'Answer to: Tips for a software engineering interview')
+        self.assertEqual(self.opening('how do I write a cover letter').get_json()['response'], 'Answer to: how do I write a cover letter')
+        self.assertEqual(len(FakeModel.instances[0].prompts), 3)
+
+        # Failures are never cached
+        self.assertEqual(self.opening('boom').get_json()['response'], FALLBACK_RESPONSE)
+        self.assertEqual(self.opening('boom').get_json()['response'], FALLBACK_RESPONSE)
+        self.assertEqual(len(FakeModel.instances[0].prompts), 5)
+
+        # Follow-ups depend on the conversation, so they bypass the cache
+        self.opening('how do I write a resume')
+        self.ask('how do I write a cover letter')
+        self.assertEqual(len(FakeModel.instances[0].prompts), 6)
+
+        # Streamed answers are stored and replayed too
+        self.app.post('/ai/chat/reset')
+        self.stream('interview tips')
+        self.app.post('/ai/chat/reset')
+        self.assertEqual(self.stream('Interview tips.'), ['data: {"text": "Answer to: interview tips "}', 'event: done\ndata: {}'])
+
+        stats = self.app.get('/ai/cache/stats').get_json()
+        self.assertEqual((stats['hits'], stats['near_hits'], stats['misses'], stats['size']), (4, 1, 6, 4))
+
+        # Survives a restart of the extension since it lives on disk
+        ai_cache.init_app(self.flask_app)
+        self.opening('how do I write a cover letter')
+        self.assertEqual(len(FakeModel.instances[0].prompts), 7)
+
+        # Close wording with different numbers is a different question
+        self.opening('MBA in 2024')
+        self.assertEqual(self.opening('MBA in 2025').get_json()['response'], 'Answer to: MBA in 2025')
+
+    def test_near_duplicate_matching_is_off_by_default(self):
+        default = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+        self.assertEqual(default.config['AI_CACHE_SIMILARITY'], 0)
+
+    def stream(self, message):
+        response = self.app.post('/ai/chat/stream', json={'message': message})
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        return [block for block in response.get_data(as_text=True).split('\n\n') if block]
+
+    def test_streaming_forwards_chunks_and_maps_errors(self):
+        events = self.stream('resume tips')
+        self.assertEqual(events, ['data: {"text": "Answer "}', 'data: {"text": "to: "}',
+                                  'data: {"text": "resume "}', 'data: {"text": "tips "}', 'event: done\ndata: {}'])
+
+        events = self.stream('boom')
+        self.assertEqual(events[0], 'data: {"text": "Partial "}')
+        self.assertEqual(events[1], 'event: error\ndata: ' + json.dumps({'response': FALLBACK_RESPONSE}))
+
+        os.remove(self.key_file)
+        self.assertEqual(self.stream('resume tips'),
+                         ['event: error\ndata: ' + json.dumps({'response': CONFIG_ERROR_MISSING_KEY})])
+
+if __name__ == '__main__':
+    unittest.main()
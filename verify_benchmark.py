@@ -0,0 +1,40 @@
+import random
+import unittest
+from app import create_app, db, User, MentorRating
+from models import ChatReadState, Message
+from benchmark import seed
+
+class BenchmarkSeedTest(unittest.TestCase):
+    def setUp(self):
+        self.flask_app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+        self.ctx = self.flask_app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_seeded_data_is_consistent(self):
+        counts = dict(mentors=5, students=10, moments=30, replies=2, chats=8, messages=100)
+        ids = seed(db, counts, random.Random(3))
+        self.assertEqual(User.query.count(), 15)
+        self.assertEqual(Message.query.count(), 100)
+
+        # Derived rows match what the app would have maintained
+        for mentor in User.query.filter_by(role='mentor'):
+            ratings = [r.rating for r in MentorRating.query.filter_by(mentor_id=mentor.id)]
+            self.assertEqual((mentor.rating_count, mentor.rating_sum), (len(ratings), sum(ratings)))
+            self.assertTrue(mentor.skill_tags)
+        for state in ChatReadState.query:
+            unread = Message.query.filter(Message.chat_id == state.chat_id, Message.sender_id != state.user_id,
+                                          Message.is_read == False).count()
+            self.assertEqual(state.unread_count, unread)
+
+        client = self.flask_app.test_client()
+        client.post('/login', data={'email': f"student{ids['student']}@bench.test", 'password': 'benchmark'})
+        self.assertEqual(client.get(f"/chat/{ids['chat']}/messages").status_code, 200)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+import json
+import threading
+import time
+import unittest
+from sqlalchemy import event
+from app import create_app, db, Chat, Message
+
+class ChatDeliveryTest(unittest.TestCase):
+    def setUp(self):
+        self.flask_app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+                                     'CHAT_HEARTBEAT_SECONDS': 0.05})
+        self.student = self.flask_app.test_client()
+        self.mentor = self.flask_app.test_client()
+        with self.flask_app.app_context():
+            db.create_all()
+        self.register(self.student, 'Student One', 'student@example.com', 'student')
+        self.register(self.mentor, 'Mentor One', 'mentor@example.com', 'mentor')
+        self.student.post('/chat/start/2')
+        with self.flask_app.app_context():
+            self.chat_id = Chat.query.first().id
+
+    def tearDown(self):
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def register(self, client, name, email, role):
+        return client.post('/register', data=dict(name=name, email=email, password='password', role=role))
+
+    def send(self, client, content):
+        return client.post(f'/chat/{self.chat_id}/send', data=dict(content=content)).get_json()
+
+    def read_events(self, response, count, timeout=None):
+        events = []
+        deadline = time.monotonic() + timeout if timeout else None
+        for chunk in response.response:
+            if deadline and time.monotonic() > deadline:
+                break
+            chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+            if chunk.startswith('id:'):
+                events.append(json.loads(chunk.split('data: ', 1)[1]))
+                if len(events) == count:
+                    break
+        response.close()
+        return events
+
+    def test_stream_replays_backlog_and_pushes_new_messages(self):
+        first = self.send(self.student, 'Hello mentor')['message']['id']
+        self.send(self.mentor, 'Hi there')
+
+        stream = self.mentor.get(f'/chat/{self.chat_id}/stream?since_id={first}', buffered=False)
+        self.assertEqual(stream.mimetype, 'text/event-stream')
+        backlog = self.read_events(stream, 1)
+        self.assertEqual([(e['content'], e['is_mine']) for e in backlog], [('Hi there', True)])
+
+        stream = self.mentor.get(f'/chat/{self.chat_id}/stream', buffered=False)
+        # Send from another thread, as another server thread would; the open
+        # stream keeps its own app context pushed in this one
+        sender = threading.Thread(target=self.send, args=(self.student, 'Are you free tomorrow?'))
+        sender.start()
+        sender.join()
+        pushed = self.read_events(stream, 1)
+        self.assertEqual(pushed[0]['content'], 'Are you free tomorrow?')
+        self.assertEqual(pushed[0]['sender_name'], 'Student One')
+        self.assertFalse(pushed[0]['is_mine'])
+
+    def test_stream_reads_messages_it_was_not_told_about(self):
+        # A long heartbeat, so only the event for the second message can wake the stream
+        self.flask_app.config['CHAT_HEARTBEAT_SECONDS'] = 0.5
+        stream = self.mentor.get(f'/chat/{self.chat_id}/stream', buffered=False)
+
+        def send_both():
+            time.sleep(0.1) # Let the stream block waiting for an event
+            with self.flask_app.app_context():
+                # Committed by another worker process, which publishes to its own broker
+                db.session.add(Message(chat_id=self.chat_id, sender_id=1, content='From another worker'))
+                db.session.commit()
+            self.send(self.student, 'From this worker')
+        sender = threading.Thread(target=send_both)
+        sender.start()
+        events = self.read_events(stream, 2, timeout=3)
+        sender.join()
+        self.assertEqual([e['content'] for e in events], ['From another worker', 'From this worker'])
+
+    def test_message_cursors(self):
+        ids = [self.send(self.student, f'Message {i}')['message']['id'] for i in range(5)]
+        url = f'/chat/{self.chat_id}/messages'
+
+        latest = self.mentor.get(url + '?limit=2').get_json()
+        self.assertEqual([m['id'] for m in latest['messages']], ids[3:])
+        self.assertTrue(latest['has_more'])
+
+        older = self.mentor.get(url + f"?limit=2&before_id={latest['oldest_id']}").get_json()
+        self.assertEqual([m['id'] for m in older['messages']], ids[1:3])
+
+        delta = self.student.get(url + f'?since_id={ids[2]}').get_json()
+        self.assertEqual([m['content'] for m in delta['messages']], ['Message 3', 'Message 4'])
+        self.assertFalse(delta['has_more'])
+        self.assertEqual(self.student.get(url + f'?since_id={ids[4]}').get_json()['messages'], [])
+
+    def test_unread_counters_and_notifications(self):
+        for i in range(7):
+            self.send(self.student, f'Question {i}')
+        self.send(self.mentor, 'Answer')
+
+        notifications = self.mentor.get('/notifications/check').get_json()
+        self.assertEqual(notifications['unread_count'], 7)
+        self.assertEqual([n['content'] for n in notifications['notifications']],
+                         [f'Question {i}' for i in range(6, 1, -1)])
+        self.assertEqual(self.student.get('/notifications/check').get_json()['unread_count'], 1)
+
+        with self.flask_app.app_context():
+            self.assertEqual(Chat.query.first().get_unread_count(2), 7)
+
+        self.mentor.get(f'/chat/{self.chat_id}/messages?since_id=0')
+        notifications = self.mentor.get('/notifications/check').get_json()
+        self.assertEqual(notifications, {'unread_count': 0, 'notifications': []})
+        with self.flask_app.app_context():
+            self.assertEqual(Message.query.filter_by(is_read=False).count(), 1)
+
+    def test_idle_polling_does_not_write(self):
+        self.send(self.student, 'Ping')
+        url = f'/chat/{self.chat_id}/messages'
+        statements = []
+        def record(conn, cursor, statement, *args):
+            statements.append(statement.split()[0].upper())
+        with self.flask_app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', record)
+            try:
+                self.mentor.get(url)
+                self.assertEqual(statements.count('UPDATE'), 2) # message flags + read state
+                del statements[:]
+                self.mentor.get(url)
+                self.mentor.post(f'/chat/{self.chat_id}/read')
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertNotIn('UPDATE', statements)
+        self.assertNotIn('INSERT', statements)
+
+    def test_stream_rejects_outsiders(self):
+        outsider = self.flask_app.test_client()
+        self.register(outsider, 'Other', 'other@example.com', 'student')
+        response = outsider.get(f'/chat/{self.chat_id}/stream')
+        self.assertEqual(response.status_code, 403)
+
+    def test_open_streams_are_capped(self):
+        self.flask_app.config.update(STREAM_MAX_CONNECTIONS=1, STREAM_BUSY_RETRY_AFTER=7)
+        first = self.mentor.get(f'/chat/{self.chat_id}/stream', buffered=False)
+        self.assertEqual(first.status_code, 200)
+
+        busy = self.student.get(f'/chat/{self.chat_id}/stream', buffered=False)
+        self.assertEqual(busy.status_code, 503)
+        self.assertEqual(busy.headers['Retry-After'], '7')
+        busy.close()
+
+        first.close() # The server closing the stream gives its slot back
+        again = self.student.get(f'/chat/{self.chat_id}/stream', buffered=False)
+        self.assertEqual(again.status_code, 200)
+        again.close()
+        with self.flask_app.app_context():
+            stats = self.flask_app.extensions['stream_limiter']
+            self.assertEqual((stats.open, stats.rejected), (0, 1))
+
+if __name__ == '__main__':
+    unittest.main()
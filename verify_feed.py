@@ -0,0 +1,82 @@
+import unittest
+from datetime import datetime, timedelta
+from app import create_app, db, User, CareerMoment, ExperienceReply
+
+class FeedPaginationTest(unittest.TestCase):
+    def setUp(self):
+        self.flask_app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+        self.app = self.flask_app.test_client()
+        with self.flask_app.app_context():
+            db.create_all()
+            author = User(name='Student', email='feed@example.com', password='x')
+            db.session.add(author)
+            db.session.flush()
+            start = datetime(2024, 1, 1)
+            for i in range(25):
+                db.session.add(CareerMoment(
+                    author_id=author.id,
+                    title=f'Moment {i}',
+                    description='details',
+                    urgency='Urgent' if i % 3 == 0 else 'Normal',
+                    status='Resolved' if i % 5 == 4 else 'Open',
+                    # Pairs share a timestamp so the id tiebreaker matters
+                    created_at=start + timedelta(hours=i // 2)
+                ))
+            db.session.commit()
+            first = CareerMoment.query.filter_by(title='Moment 0').first()
+            db.session.add(ExperienceReply(moment_id=first.id, mentor_id=author.id, decision_made='a', content='b'))
+            db.session.commit()
+            self.expected = [m.title for m in CareerMoment.query.filter(CareerMoment.status != 'Resolved').order_by(
+                CareerMoment.urgency.desc(), CareerMoment.created_at.desc(), CareerMoment.id.desc()).all()]
+
+    def tearDown(self):
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_cursor_walks_whole_feed_once(self):
+        seen = []
+        cursor = ''
+        pages = 0
+        while True:
+            data = self.app.get(f'/feed?cursor={cursor}').get_json()
+            seen.extend(m['title'] for m in data['moments'])
+            pages += 1
+            if not data['next_cursor']:
+                break
+            cursor = data['next_cursor']
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(pages, 1)
+
+        with self.flask_app.app_context():
+            from feed import feed_page
+            seen, cursor = [], None
+            while True:
+                moments, cursor = feed_page(cursor=cursor, limit=4)
+                seen.extend(m.title for m in moments)
+                if not cursor:
+                    break
+        self.assertEqual(seen, self.expected)
+
+    def test_reply_counts_and_bad_cursor(self):
+        data = self.app.get('/feed').get_json()
+        counts = {m['title']: m['reply_count'] for m in data['moments']}
+        self.assertEqual(counts['Moment 0'], 1)
+        self.assertEqual(counts['Moment 3'], 0)
+        self.assertEqual(self.app.get('/feed?cursor=not-a-cursor').status_code, 400)
+
+    def test_mentor_feed_hides_replied_moments(self):
+        with self.flask_app.app_context():
+            from feed import feed_page
+            mentor = User(name='Mentor', email='feed-mentor@example.com', password='x', role='mentor')
+            db.session.add(mentor)
+            db.session.flush()
+            for title in ('Moment 0', 'Moment 1'):
+                moment = CareerMoment.query.filter_by(title=title).first()
+                db.session.add(ExperienceReply(moment_id=moment.id, mentor_id=mentor.id, decision_made='a', content='b'))
+            db.session.commit()
+            moments, _ = feed_page(mentor, limit=50)
+            self.assertEqual([m.title for m in moments], [t for t in self.expected if t not in ('Moment 0', 'Moment 1')])
+
+if __name__ == '__main__':
+    unittest.main()
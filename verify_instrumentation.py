@@ -0,0 +1,54 @@
+import unittest
+from app import create_app, db
+from instrumentation import instrumentation
+
+AUTH = {'Authorization': 'Bearer scrape-token'}
+
+class InstrumentationTest(unittest.TestCase):
+    def setUp(self):
+        self.flask_app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+                                     'METRICS_TOKEN': 'scrape-token'})
+        with self.flask_app.app_context():
+            db.create_all()
+        self.app = self.flask_app.test_client()
+        self.app.post('/register', data=dict(name='Student', email='metrics@example.com', password='password'))
+        instrumentation.reset(self.flask_app)
+
+    def tearDown(self):
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_metrics_report_latency_queries_and_stats(self):
+        self.app.get('/notifications/check')
+        self.app.get('/notifications/check')
+        text = self.app.get('/metrics', headers=AUTH).get_data(as_text=True)
+        self.assertIn('pathseeker_request_duration_seconds_count{endpoint="main.check_notifications",method="GET"} 2', text)
+        self.assertIn('pathseeker_requests_total{endpoint="main.check_notifications",method="GET",status="200"} 2', text)
+        # User row plus unread summary, then only the summary once the user is cached
+        self.assertIn('pathseeker_request_queries_sum{endpoint="main.check_notifications"} 3.000000', text)
+        self.assertIn('pathseeker_request_queries_bucket{endpoint="main.check_notifications",le="1"} 1', text)
+        self.assertIn('pathseeker_user_cache_hits ', text)
+        self.assertIn('pathseeker_jobs_failed 0', text)
+
+    def test_slow_queries_are_logged_with_their_route(self):
+        instrumentation.metrics(self.flask_app).slow_query_seconds = 0
+        with self.assertLogs('pathseeker.slow_query', level='WARNING'):
+            self.app.get('/notifications/check')
+        entries = self.app.get('/metrics/slow-queries', headers=AUTH).get_json()['queries']
+        self.assertTrue(entries)
+        self.assertEqual({e['endpoint'] for e in entries}, {'main.check_notifications'})
+        self.assertTrue(all(e['statement'].startswith('SELECT') for e in entries))
+
+    def test_metrics_routes_need_the_token(self):
+        for path in ('/metrics', '/metrics/slow-queries'):
+            self.assertEqual(self.app.get(path).status_code, 401)
+            self.assertEqual(self.app.get(path, headers={'Authorization': 'Bearer wrong'}).status_code, 401)
+        # Without a token they're only served in debug mode
+        self.flask_app.config['METRICS_TOKEN'] = None
+        self.assertEqual(self.app.get('/metrics/slow-queries').status_code, 404)
+        self.flask_app.debug = True
+        self.assertEqual(self.app.get('/metrics/slow-queries').status_code, 200)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import datetime
+import time
+import unittest
+from app import create_app, db, User, MentorRating, apply_rating
+from models import Job
+from jobs import job, job_queue
+
+calls = []
+
+@job('test_flaky')
+def flaky(fail_times):
+    calls.append(fail_times)
+    if len(calls) <= fail_times:
+        raise RuntimeError('temporary outage')
+
+class JobQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.flask_app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+                                     'JOBS_SYNC': True, 'JOBS_RETRY_DELAY': 0, 'JOBS_POLL_SECONDS': 0.05})
+        calls.clear()
+        self.ctx = self.flask_app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+    def tearDown(self):
+        job_queue.shutdown()
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_retries_then_gives_up(self):
+        # The first attempt fails; with no backoff the retry is due straight away
+        job_id = job_queue.enqueue('test_flaky', fail_times=1)
+        done = db.session.get(Job, job_id)
+        self.assertEqual((done.status, done.attempts, done.last_error), ('done', 2, None))
+
+        calls.clear()
+        job_id = job_queue.enqueue('test_flaky', fail_times=10)
+        failed = db.session.get(Job, job_id)
+        self.assertEqual((failed.status, failed.attempts), ('failed', 3))
+        self.assertIn('temporary outage', failed.last_error)
+        self.assertEqual(job_queue.stats(), {'queued': 0, 'running': 0, 'done': 1, 'failed': 1})
+
+        self.assertEqual(job_queue.retry_failed(), 1)
+        db.session.expire_all()
+        self.assertEqual(db.session.get(Job, job_id).status, 'queued')
+
+    def test_apply_rating_counts_once(self):
+        mentor = User(name='Mentor', email='jobs@example.com', password='x', role='mentor')
+        db.session.add(mentor)
+        db.session.commit()
+        rating = MentorRating(student_id=mentor.id, mentor_id=mentor.id, reply_id=1, rating=4)
+        db.session.add(rating)
+        db.session.commit()
+        apply_rating(rating.id)
+        apply_rating(rating.id)
+        db.session.expire_all()
+        self.assertEqual((mentor.credit_points, mentor.rating_count, mentor.rating_sum), (4, 1, 4))
+
+    def test_worker_threads_run_jobs_and_stop(self):
+        self.flask_app.config['JOBS_SYNC'] = False
+        job_id = job_queue.enqueue('test_flaky', fail_times=0)
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            db.session.expire_all()
+            if db.session.get(Job, job_id).status == 'done':
+                break
+            time.sleep(0.05)
+        self.assertEqual(db.session.get(Job, job_id).status, 'done')
+        job_queue.shutdown()
+        self.assertEqual(self.flask_app.extensions['job_queue'].threads, [])
+
+    def test_purge_done_keeps_recent_and_failed_jobs(self):
+        old = datetime.datetime.utcnow() - datetime.timedelta(days=8)
+        db.session.add_all([
+            Job(name='test_flaky', status='done', finished_at=old),
+            Job(name='test_flaky', status='done', finished_at=datetime.datetime.utcnow()),
+            Job(name='test_flaky', status='failed', finished_at=old),
+        ])
+        db.session.commit()
+        self.assertEqual(job_queue.purge_done(), 1)
+        self.assertEqual(job_queue.stats(), {'queued': 0, 'running': 0, 'done': 1, 'failed': 1})
+        self.flask_app.config['JOBS_RETENTION_DAYS'] = 0
+        self.assertEqual(job_queue.purge_done(), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import warnings
+from app import create_app, db, User, CareerMoment
+from query_budget import count_queries, query_budget, QueryBudgetExceeded, RepeatedQueryWarning, statement_shape
+
+class QueryBudgetTest(unittest.TestCase):
+    def setUp(self):
+        self.flask_app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+        self.ctx = self.flask_app.app_context()
+        self.ctx.push()
+        db.create_all()
+        for i in range(8):
+            author = User(name=f'Student {i}', email=f'budget{i}@example.com', password='x')
+            db.session.add(CareerMoment(author=author, title=f'Moment {i}', description='d'))
+        db.session.commit()
+        db.session.expunge_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def lazy_authors(self):
+        return [m.author.name for m in CareerMoment.query.all()]
+
+    def test_budget_catches_lazy_loads(self):
+        with count_queries() as queries:
+            self.lazy_authors()
+        self.assertEqual(queries.count, 9)
+        self.assertEqual(max(queries.shapes().values()), 8)
+
+        with self.assertRaises(QueryBudgetExceeded) as raised:
+            with query_budget(2):
+                db.session.expunge_all()
+                self.lazy_authors()
+        self.assertIn('8x SELECT', str(raised.exception))
+
+        @query_budget(1)
+        def eager():
+            db.session.expunge_all()
+            return [m.author.name for m in CareerMoment.query.options(db.joinedload(CareerMoment.author))]
+        self.assertEqual(len(eager()), 8)
+
+    def test_shapes_ignore_in_list_length(self):
+        self.assertEqual(statement_shape('SELECT * FROM t WHERE id IN (?, ?,\n ?) LIMIT 10'),
+                         statement_shape('SELECT * FROM t WHERE id IN (?) LIMIT 20'))
+
+    def test_request_guard_warns_on_repeated_statements(self):
+        self.flask_app.config['QUERY_REPEAT_THRESHOLD'] = 5
+        with self.flask_app.test_request_context('/'):
+            self.flask_app.preprocess_request()
+            db.session.expunge_all()
+            self.lazy_authors()
+            with self.assertWarns(RepeatedQueryWarning):
+                self.flask_app.process_response(self.flask_app.response_class())
+
+        self.flask_app.config['QUERY_REPEAT_THRESHOLD'] = 0
+        with self.flask_app.test_request_context('/'), warnings.catch_warnings():
+            warnings.simplefilter('error', RepeatedQueryWarning)
+            self.flask_app.preprocess_request()
+            db.session.expunge_all()
+            self.lazy_authors()
+            self.flask_app.process_response(self.flask_app.response_class())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+from app import create_app, db
+from rate_limit import LocalBucketBackend
+
+class RateLimitTest(unittest.TestCase):
+    def setUp(self):
+        self.flask_app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+                                     'RATE_LIMITS': {'notifications': (3, 0.01), 'ai': (2, 0.01)}})
+        with self.flask_app.app_context():
+            db.create_all()
+        self.app = self.flask_app.test_client()
+        self.other = self.flask_app.test_client()
+        self.app.post('/register', data=dict(name='Student One', email='one@example.com', password='password'))
+        self.other.post('/register', data=dict(name='Student Two', email='two@example.com', password='password'))
+
+    def tearDown(self):
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_buckets_are_per_user_and_per_endpoint(self):
+        for _ in range(3):
+            self.assertEqual(self.app.get('/notifications/check').status_code, 200)
+        response = self.app.get('/notifications/check')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response.headers['Retry-After']), 1)
+
+        # Another user, and another endpoint for the same user, have their own buckets
+        self.assertEqual(self.other.get('/notifications/check').status_code, 200)
+        self.assertEqual(self.app.post('/ai/chat', json={}).status_code, 400)
+        self.assertEqual(self.app.post('/ai/chat/stream', json={}).status_code, 400)
+        self.assertEqual(self.app.post('/ai/chat', json={}).status_code, 429)
+
+        self.flask_app.config['RATE_LIMIT_ENABLED'] = False
+        self.assertEqual(self.app.get('/notifications/check').status_code, 200)
+
+    def test_bucket_refills_over_time(self):
+        backend = LocalBucketBackend()
+        self.assertEqual(backend.take('k', 2, 0.5, 100.0), (True, 0.0))
+        self.assertEqual(backend.take('k', 2, 0.5, 100.0), (True, 0.0))
+        self.assertEqual(backend.take('k', 2, 0.5, 100.0), (False, 2.0))
+        self.assertEqual(backend.take('k', 2, 0.5, 101.0), (False, 1.0))
+        self.assertEqual(backend.take('k', 2, 0.5, 102.0), (True, 0.0))
+        # Never banks more than the burst size
+        self.assertEqual(backend.take('k', 2, 0.5, 1000.0), (True, 0.0))
+        self.assertEqual(backend.take('k', 2, 0.5, 1000.0), (True, 0.0))
+        self.assertFalse(backend.take('k', 2, 0.5, 1000.0)[0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,17 +1,32 @@
 import unittest
-from app import app, db, User, CareerMoment, ExperienceReply, MentorRating
+from jinja2 import ChoiceLoader, DictLoader
+from app import create_app, db, User, CareerMoment, ExperienceReply, MentorRating
+from query_budget import query_budget
+
+FLASHES = '{% for m in get_flashed_messages() %}{{ m }}{% endfor %}'
+# Stand-ins for the real pages that read what they show, so budgets include the queries rendering causes
+PAGES = {
+    'post_detail.html': FLASHES + """{{ moment.title }} {{ moment.status }} {{ moment.author.name }}
+        {% for reply in moment.replies %}{{ reply.mentor.name }} {{ reply.mentor.average_rating }}
+        {{ reply.decision_made }} {{ reply.content }}{% if reply.id in rated_reply_ids %} rated{% endif %}{% endfor %}
+        {% for similar in similar_moments %}{{ similar.title }}{% endfor %}""",
+    'student_dashboard.html': FLASHES + """{% for moment in my_moments %}{{ moment.title }} {{ moment.status }}
+        {{ moment.replies|length }}{% endfor %}""",
+    'mentor_dashboard.html': FLASHES + """{% for moment in past_contributions %}{{ moment.title }}
+        {{ moment.author.name }} {{ moment.replies|length }}{% endfor %}""",
+}
 
 class MentorRatingtest(unittest.TestCase):
     def setUp(self):
-        app.config['TESTING'] = True
-        app.config['WTF_CSRF_ENABLED'] = False
-        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///test_pathseeker.db'
-        self.app = app.test_client()
-        with app.app_context():
+        self.flask_app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+                                     'WTF_CSRF_ENABLED': False, 'JOBS_SYNC': True})
+        self.flask_app.jinja_env.loader = ChoiceLoader([DictLoader(PAGES), self.flask_app.jinja_env.loader])
+        self.app = self.flask_app.test_client()
+        with self.flask_app.app_context():
             db.create_all()
 
     def tearDown(self):
-        with app.app_context():
+        with self.flask_app.app_context():
             db.session.remove()
             db.drop_all()
 
@@ -38,17 +53,21 @@ class MentorRatingtest(unittest.TestCase):
 
         # 2. Student posts moment
         self.login('student@example.com', 'password')
-        with app.app_context():
+        with self.flask_app.app_context():
             student = User.query.filter_by(email='student@example.com').first()
             self.assertIsNotNone(student)
         
-        self.app.post('/post/new', data=dict(
-            title='Help me',
-            description='I need advice',
-            urgency='Normal'
-        ), follow_redirects=True)
+        # Query budgets cover the handler, its jobs (run inline with JOBS_SYNC) and the rendered page it redirects to
+        # (Creating a moment also logs a moment_change row for the similarity indexes and searches
+        # them once, for the "similar moments" flash)
+        with self.flask_app.app_context(), query_budget(22):
+            self.app.post('/post/new', data=dict(
+                title='Help me',
+                description='I need advice',
+                urgency='Normal'
+            ), follow_redirects=True)
         
-        with app.app_context():
+        with self.flask_app.app_context():
             moment = CareerMoment.query.filter_by(title='Help me').first()
             self.assertIsNotNone(moment)
             moment_id = moment.id
@@ -57,13 +76,14 @@ class MentorRatingtest(unittest.TestCase):
 
         # 3. Mentor replies
         self.login('mentor@example.com', 'password')
-        self.app.post(f'/reply/{moment_id}', data=dict(
-            content='My advice',
-            decision='Do this',
-            mistake='None'
-        ), follow_redirects=True)
+        with self.flask_app.app_context(), query_budget(4):
+            self.app.post(f'/reply/{moment_id}', data=dict(
+                content='My advice',
+                decision='Do this',
+                mistake='None'
+            ), follow_redirects=True)
         
-        with app.app_context():
+        with self.flask_app.app_context():
             reply = ExperienceReply.query.filter_by(moment_id=moment_id).first()
             self.assertIsNotNone(reply)
             reply_id = reply.id
@@ -72,16 +92,18 @@ class MentorRatingtest(unittest.TestCase):
 
         # 4. Student rates reply
         self.login('student@example.com', 'password')
-        response = self.app.post(f'/rate_mentor/{reply_id}', data=dict(
-            rating='5'
-        ), follow_redirects=True)
-        
+        with self.flask_app.app_context(), query_budget(17):
+            response = self.app.post(f'/rate_mentor/{reply_id}', data=dict(
+                rating='5'
+            ), follow_redirects=True)
         self.assertIn(b'Thank you for rating the mentor!', response.data)
 
         # 5. Check Mentor Points
-        with app.app_context():
+        with self.flask_app.app_context():
             mentor = User.query.filter_by(email='mentor@example.com').first()
             self.assertEqual(mentor.credit_points, 5)
+            self.assertEqual(mentor.rating_count, 1)
+            self.assertEqual(mentor.average_rating, 5)
             
             # Check Rating Record
             rating = MentorRating.query.filter_by(reply_id=reply_id).first()
@@ -89,15 +111,43 @@ class MentorRatingtest(unittest.TestCase):
             self.assertEqual(rating.rating, 5)
 
         # 6. Try to rate again (should fail)
-        response = self.app.post(f'/rate_mentor/{reply_id}', data=dict(
-            rating='1'
-        ), follow_redirects=True)
+        with self.flask_app.app_context(), query_budget(7):
+            response = self.app.post(f'/rate_mentor/{reply_id}', data=dict(
+                rating='1'
+            ), follow_redirects=True)
         self.assertIn(b'You have already rated this mentor.', response.data)
 
         # 7. Check points didn't change
-        with app.app_context():
+        with self.flask_app.app_context():
             mentor = User.query.filter_by(email='mentor@example.com').first()
             self.assertEqual(mentor.credit_points, 5)
 
+        # 8. Deleting the moment removes its ratings from the aggregates; earned points stay
+        self.app.post(f'/moment/{moment_id}/delete')
+        with self.flask_app.app_context():
+            mentor = User.query.filter_by(email='mentor@example.com').first()
+            self.assertEqual((mentor.rating_count, mentor.rating_sum, mentor.credit_points), (0, 0, 5))
+            self.assertEqual(MentorRating.query.count(), 0)
+
+    def test_rendered_pages_do_not_grow_with_replies(self):
+        self.register('Student One', 'student@example.com', 'password')
+        self.app.post('/post/new', data=dict(title='Help me', description='I need advice'))
+        self.app.get('/logout')
+        for i in range(3):
+            self.register(f'Mentor {i}', f'mentor{i}@example.com', 'password', 'mentor')
+            self.app.post('/reply/1', data=dict(content='My advice', decision='Do this'))
+            self.app.get('/logout')
+
+        # Same budgets with one reply or many: the moment, its replies and their mentors load in fixed queries
+        self.login('mentor0@example.com', 'password')
+        for url, budget in (('/post/1', 3), ('/mentor/dashboard', 2)):
+            with self.flask_app.app_context(), query_budget(budget):
+                self.assertEqual(self.app.get(url).status_code, 200)
+        self.app.get('/logout')
+        self.login('student@example.com', 'password')
+        for url, budget in (('/post/1', 4), ('/student/dashboard', 2)):
+            with self.flask_app.app_context(), query_budget(budget):
+                self.assertEqual(self.app.get(url).status_code, 200)
+
 if __name__ == '__main__':
     unittest.main()
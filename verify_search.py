@@ -0,0 +1,80 @@
+import unittest
+from sqlalchemy.dialects import postgresql, sqlite
+from app import create_app, db, User
+from models import set_mentor_skills
+from mentor_search import fts_enabled, init_mentor_search, search_mentors, substring_position
+
+class MentorSearchTest(unittest.TestCase):
+    def setUp(self):
+        self.flask_app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+        self.ctx = self.flask_app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.assertTrue(init_mentor_search())
+        mentors = [
+            User(name='Asha Rao', email='asha@example.com', password='x', role='mentor',
+                 skills='Data Science, Python', bio='Moved from finance into analytics'),
+            User(name='Ravi Kumar', email='ravi@example.com', password='x', role='mentor',
+                 skills='Product Management', bio='Ex-engineer, loves data'),
+        ]
+        for mentor in mentors:
+            set_mentor_skills(mentor, mentor.skills)
+        db.session.add_all(mentors + [User(name='Asha Student', email='student@example.com', password='x')])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def names(self, **kwargs):
+        mentors, _ = search_mentors(**kwargs)
+        return [m.name for m in mentors]
+
+    def test_fts_prefix_and_ranking(self):
+        self.assertEqual(self.names(name_query='ash'), ['Asha Rao'])
+        # Name matches outrank bio matches
+        self.assertEqual(self.names(text_query='ravi data'), ['Ravi Kumar'])
+        self.assertEqual(self.names(text_query='data'), ['Asha Rao', 'Ravi Kumar'])
+
+    def test_skill_tags_any_and_all(self):
+        self.assertEqual(self.names(domain_query='data'), ['Asha Rao'])
+        self.assertEqual(self.names(domain_query='python, product'), ['Asha Rao', 'Ravi Kumar'])
+        self.assertEqual(self.names(domain_query='python, product', skill_match='all'), [])
+        self.assertEqual(self.names(domain_query='Python, data sci', skill_match='all'), ['Asha Rao'])
+        self.assertEqual(self.names(name_query='ravi', domain_query='product'), ['Ravi Kumar'])
+
+    def test_substring_mode_keeps_case_rules(self):
+        self.assertEqual(self.names(name_query='Asha', mode='substring'), ['Asha Rao'])
+        self.assertEqual(self.names(name_query='asha', mode='substring'), [])
+        self.assertEqual(self.names(domain_query='MANAGE', mode='substring'), ['Ravi Kumar'])
+
+    def test_fts_availability_is_per_app(self):
+        other = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+        with other.app_context():
+            db.create_all()
+            self.assertFalse(fts_enabled()) # No triggers in this app's database
+            db.drop_all()
+        self.assertTrue(fts_enabled())
+
+    def test_substring_position_compiles_for_each_dialect(self):
+        # Postgres, where there's no FTS5 and every name search takes this path, has no instr()
+        position = substring_position(User.name, 'Asha')
+        self.assertIn('strpos(', str(position.compile(dialect=postgresql.dialect())))
+        self.assertIn('instr(', str(position.compile(dialect=sqlite.dialect())))
+
+    def test_triggers_follow_profile_changes_and_paging(self):
+        ravi = User.query.filter_by(email='ravi@example.com').first()
+        ravi.skills = 'Design'
+        set_mentor_skills(ravi, ravi.skills)
+        db.session.commit()
+        self.assertEqual(self.names(domain_query='product'), [])
+        self.assertEqual(self.names(domain_query='design'), ['Ravi Kumar'])
+        self.assertEqual(self.names(text_query='design'), ['Ravi Kumar'])
+
+        mentors, has_next = search_mentors(text_query='data', per_page=1)
+        self.assertEqual(len(mentors), 1)
+        self.assertTrue(has_next)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from app import create_app, db, prepare_database
+from jobs import job_queue
+from migrations import run_migrations
+from query_budget import count_queries
+import serve
+
+class HealthCheckTest(unittest.TestCase):
+    def setUp(self):
+        self.flask_app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+        self.app = self.flask_app.test_client()
+        with self.flask_app.app_context():
+            db.create_all()
+            run_migrations(db.engine)
+
+    def tearDown(self):
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_healthz_runs_one_plain_query(self):
+        with self.flask_app.app_context(), count_queries() as queries:
+            response = self.app.get('/healthz')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {'status': 'ok'})
+        self.assertEqual(queries.statements, ['SELECT 1'])
+
+    def test_readyz_checks_schema_version(self):
+        response = self.app.get('/readyz')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['status'], 'ready')
+
+        with mock.patch('app.latest_version', return_value=10 ** 6):
+            response = self.app.get('/readyz')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.get_json()['status'], 'migrating')
+
+class ServeOptionsTest(unittest.TestCase):
+    def test_gunicorn_options(self):
+        args = serve.parse_args(['--workers', '3', '--threads', '8', '--port', '8000', '--graceful-timeout', '20'])
+        options = serve.gunicorn_options(args)
+        self.assertEqual(options['bind'], '0.0.0.0:8000')
+        self.assertEqual((options['workers'], options['threads']), (3, 8))
+        self.assertEqual(options['worker_class'], 'gthread')
+        self.assertTrue(options['preload_app'])
+        self.assertEqual(options['graceful_timeout'], 20)
+        self.assertIs(options['post_fork'], serve.post_fork)
+
+    def test_post_fork_starts_job_workers(self):
+        # A file, since post_fork replaces the engine's pool and an in-memory database would go with it
+        db_file = os.path.join(tempfile.mkdtemp(prefix='pathseeker-serve-'), 'serve.db')
+        worker_app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_file}', 'JOBS_WORKERS': 1})
+        prepare_database(worker_app)
+        server = mock.Mock()
+        server.app.wsgi.return_value = worker_app
+        serve.post_fork(server, mock.Mock())
+        try:
+            self.assertEqual(len(worker_app.extensions['job_queue'].threads), 1)
+        finally:
+            job_queue.shutdown(worker_app)
+
+    def test_streams_and_ai_calls_leave_threads_for_pages(self):
+        with mock.patch.dict(os.environ):
+            for key in ('STREAM_MAX_CONNECTIONS', 'AI_MAX_WORKERS', 'AI_MAX_QUEUE'):
+                os.environ.pop(key, None)
+            for threads in (serve.MIN_THREADS, 8, 16, serve.DEFAULT_THREADS, 64):
+                config = serve.app_config(serve.parse_args(['--threads', str(threads)]))
+                self.assertGreaterEqual(config['AI_MAX_WORKERS'], 1)
+                self.assertGreaterEqual(config['STREAM_MAX_CONNECTIONS'], 1)
+                self.assertLess(serve.long_lived_limit(config), threads)
+            config = serve.app_config(serve.parse_args([]))
+            self.assertEqual((config['STREAM_MAX_CONNECTIONS'], config['AI_MAX_WORKERS'], config['AI_MAX_QUEUE']),
+                             (16, 4, 4))
+
+            # Caps set in the environment are kept and the streams sized around them
+            os.environ['AI_MAX_QUEUE'] = '0'
+            config = serve.app_config(serve.parse_args(['--threads', '16']))
+            self.assertNotIn('AI_MAX_QUEUE', config)
+            self.assertEqual((config['AI_MAX_WORKERS'], config['STREAM_MAX_CONNECTIONS']), (2, 10))
+            os.environ['STREAM_MAX_CONNECTIONS'] = '40'
+            self.assertNotIn('STREAM_MAX_CONNECTIONS', serve.app_config(serve.parse_args([])))
+
+        self.assertIsNone(serve.long_lived_limit({'STREAM_MAX_CONNECTIONS': 0, 'AI_MAX_WORKERS': 4, 'AI_MAX_QUEUE': 4}))
+        with self.assertRaises(SystemExit), mock.patch('sys.stderr'):
+            serve.parse_args(['--threads', '4'])
+
+    def test_shared_state_note(self):
+        # Only the settings are read, so no Redis client is needed
+        app = mock.Mock(config={'RATE_LIMIT_URL': 'redis://localhost', 'USER_CACHE_URL': None,
+                                'AI_SESSION_URL': None, 'CHAT_BROKER_URL': None})
+        note = serve.shared_state_note(app, 3)
+        self.assertIn('similarity index', note)
+        self.assertIn('CHAT_BROKER_URL', note)
+        self.assertNotIn('RATE_LIMIT_URL', note)
+
+    def test_explicit_server_is_kept(self):
+        self.assertEqual(serve.choose_server('werkzeug'), 'werkzeug')
+        self.assertIn(serve.choose_server('auto'), serve.SERVERS)
+
+if __name__ == '__main__':
+    unittest.main()
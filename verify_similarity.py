@@ -0,0 +1,201 @@
+import json
+import unittest
+from app import create_app, db, User, CareerMoment
+from models import Job, MomentChange, SimilarMoment
+from jobs import job_queue
+from similarity import similarity_index
+from similar_cache import similar_cache
+from query_budget import count_queries
+
+class SimilarityIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.flask_app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'JOBS_SYNC': True})
+        self.ctx = self.flask_app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.author = User(name='Student', email='similar@example.com', password='x')
+        db.session.add(self.author)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def add_moment(self, title, status='Resolved'):
+        moment = CareerMoment(author_id=self.author.id, title=title, description='details', status=status)
+        db.session.add(moment)
+        db.session.commit()
+        similarity_index.add(moment)
+        return moment
+
+    def similar(self, title, limit=3):
+        return [db.session.get(CareerMoment, moment_id) for _, moment_id in similarity_index.search(title, limit=limit)]
+
+    def test_prefers_resolved_and_ranks_by_title(self):
+        self.add_moment('Should I switch to data science?')
+        self.add_moment('Switching into data science after engineering')
+        self.add_moment('Best way to learn cooking')
+        self.add_moment('Should I switch to data science now?', status='Open')
+
+        titles = [m.title for m in self.similar('Should I switch to data science?')]
+        # Same ordering the old SequenceMatcher scan produced; the open near-duplicate is skipped
+        self.assertEqual(titles, ['Switching into data science after engineering', 'Best way to learn cooking'])
+
+    def test_falls_back_to_open_moments_and_tracks_changes(self):
+        first = self.add_moment('Masters abroad or job offer', status='Open')
+        self.assertEqual(self.similar('Masters abroad or a job offer'), [first])
+
+        second = self.add_moment('Masters abroad vs job offer', status='Open')
+        second.status = 'Resolved'
+        db.session.commit()
+        similarity_index.update_status(second)
+        # Once a resolved moment exists, open ones are no longer suggested
+        self.assertEqual(self.similar('Masters abroad or a job offer'), [second])
+
+        db.session.delete(second)
+        db.session.commit()
+        similarity_index.remove(second.id)
+        self.assertEqual(self.similar('Masters abroad or a job offer'), [first])
+
+    def test_syncs_with_writes_from_other_processes(self):
+        first = self.add_moment('Masters abroad or job offer', status='Open')
+        self.assertEqual(self.similar('Masters abroad or a job offer'), [first])
+
+        # Written without touching this process's index, as another worker would
+        second = CareerMoment(author_id=self.author.id, title='Masters abroad vs job offer', description='d')
+        db.session.add(second)
+        db.session.commit()
+        self.assertEqual(self.similar('Masters abroad or a job offer'), [first, second])
+
+        second.status = 'Resolved'
+        db.session.commit()
+        self.assertEqual(self.similar('Masters abroad or a job offer'), [second])
+
+        db.session.delete(second)
+        db.session.commit()
+        self.assertEqual(self.similar('Masters abroad or a job offer'), [first])
+
+    def test_sync_reads_back_only_other_processes_changes(self):
+        self.add_moment('Masters abroad or job offer', status='Open')
+        similarity_index.sync()
+        # Applied here already, so the next search doesn't read it again
+        self.add_moment('Masters abroad vs job offer')
+        with count_queries() as queries:
+            similarity_index.search('Masters abroad or a job offer')
+        self.assertEqual([s for s in queries.statements if 'FROM career_moment' in s], [])
+
+        # Written by another worker: only that moment is read
+        other = CareerMoment(author_id=self.author.id, title='Masters abroad and a job offer', description='d')
+        db.session.add(other)
+        db.session.commit()
+        with count_queries() as queries:
+            results = similarity_index.search('Masters abroad or a job offer', any_status=True)
+        reads = [s for s in queries.statements if 'FROM career_moment' in s]
+        self.assertEqual(len(reads), 1)
+        self.assertIn('career_moment.id IN', reads[0])
+        self.assertIn(other.id, [moment_id for _, moment_id in results])
+
+        # Updates that don't touch the indexed fields aren't logged
+        changes = MomentChange.query.count()
+        other.urgency = 'Urgent'
+        db.session.commit()
+        self.assertEqual(MomentChange.query.count(), changes)
+
+    def test_queries_skip_very_common_terms(self):
+        for i in range(60):
+            self.add_moment(f'Job offer number {i}')
+        target = self.add_moment('Masters abroad or job offer')
+        # ' jo', 'job', 'ob ', ... are in every moment; the 'masters abroad' terms find the match
+        self.assertEqual(similarity_index.search('Masters abroad or a job offer', limit=1)[0][1], target.id)
+        # All-common queries still get candidates from their rarest terms
+        self.assertTrue(similarity_index.search('Job offer', limit=1))
+
+    def test_refresh_job_syncs_the_index_once_per_batch(self):
+        self.add_moment('Masters abroad or job offer')
+        # Written by another worker after this process built its index
+        moments = [CareerMoment(author_id=self.author.id, title=f'Masters abroad or job offer {i}',
+                                description='d', status='Resolved')
+                   for i in range(3)]
+        db.session.add_all(moments)
+        db.session.commit()
+        with count_queries() as queries:
+            similar_cache.refresh_ids([m.id for m in moments])
+        self.assertEqual(sum('FROM moment_change' in s for s in queries.statements), 1)
+        rows = SimilarMoment.query.filter_by(moment_id=moments[0].id).all()
+        self.assertEqual({r.similar_id for r in rows}, {1, moments[1].id, moments[2].id})
+
+    def test_views_and_changes_only_queue_jobs(self):
+        self.flask_app.config.update(JOBS_SYNC=False, JOBS_WORKERS=0) # Leave the jobs queued
+        self.add_moment('Masters abroad or job offer')
+        viewed = self.add_moment('Masters abroad or a job offer', status='Open')
+        with count_queries() as queries:
+            similar_cache.moment_changed(viewed)
+            self.assertEqual(similar_cache.get(viewed), [])
+            similar_cache.get(viewed)
+            similar_cache.moment_changed(viewed)
+        # No similarity search in the request, and repeat views or changes don't add jobs
+        self.assertFalse([s for s in queries.statements if 'FROM moment_change' in s])
+        jobs = Job.query.order_by(Job.id).all()
+        self.assertEqual([(j.name, json.loads(j.payload)) for j in jobs], [
+            ('refresh_similar_neighbours', {'moment_id': viewed.id}),
+            ('refresh_similar', {'moment_ids': [viewed.id]})])
+
+        self.assertEqual(job_queue.run_pending(), 2)
+        db.session.expire_all()
+        self.assertEqual([m.title for m in similar_cache.get(viewed)], ['Masters abroad or job offer'])
+        self.assertEqual(Job.query.count(), 2)
+
+    def test_create_flashes_similar_moments_before_the_job_runs(self):
+        self.flask_app.config.update(JOBS_SYNC=False, JOBS_WORKERS=0)
+        self.add_moment('Masters abroad or job offer')
+        client = self.flask_app.test_client()
+        client.post('/register', data=dict(name='Author', email='author@example.com', password='password'))
+        client.post('/post/new', data=dict(title='Masters abroad or a job offer', description='d', urgency='Normal'))
+        with client.session_transaction() as session:
+            flashes = [message for _, message in session.get('_flashes', [])]
+        self.assertIn('We found 1 similar past moments that might help while you wait!', flashes)
+        self.assertEqual(SimilarMoment.query.count(), 0) # The rows are still the job's to write
+
+    def test_respects_limit_and_skips_self(self):
+        for i in range(5):
+            self.add_moment(f'Internship offer number {i}')
+        results = self.similar('Internship offer number 0', limit=2)
+        self.assertEqual(len(results), 2)
+        self.assertNotIn('Internship offer number 0', [m.title for m in results])
+
+    def test_materialized_rows_follow_changes(self):
+        self.add_moment('Masters abroad or job offer', status='Open')
+        second = self.add_moment('Masters abroad vs job offer', status='Open')
+        viewed = self.add_moment('Masters abroad or a job offer', status='Open')
+
+        # Queued on first view (and run straight away with JOBS_SYNC), then served from similar_moment
+        self.assertIsNone(viewed.similar_refreshed_at)
+        self.assertEqual([m.title for m in similar_cache.get(viewed)], ['Masters abroad or job offer', 'Masters abroad vs job offer'])
+        self.assertIsNotNone(viewed.similar_refreshed_at)
+        self.assertEqual(SimilarMoment.query.filter_by(moment_id=viewed.id).count(), 2)
+
+        # Resolving a moment refreshes the moments around it
+        second.status = 'Resolved'
+        db.session.commit()
+        similarity_index.update_status(second)
+        similar_cache.moment_changed(second)
+        db.session.expire_all()
+        self.assertEqual([m.title for m in similar_cache.get(viewed)], ['Masters abroad vs job offer'])
+
+        # Deleting it leaves the pointing moments stale, so they recompute on the next view
+        similar_cache.moment_deleted(second.id)
+        db.session.delete(second)
+        db.session.commit()
+        similarity_index.remove(second.id)
+        db.session.expire_all()
+        self.assertIsNone(viewed.similar_refreshed_at)
+        self.assertEqual([m.title for m in similar_cache.get(viewed)], ['Masters abroad or job offer'])
+
+        SimilarMoment.query.delete()
+        db.session.commit()
+        self.assertEqual(similar_cache.rebuild(), 2)
+        self.assertEqual(SimilarMoment.query.filter_by(moment_id=viewed.id).count(), 1)
+
+if __name__ == '__main__':
+    unittest.main()
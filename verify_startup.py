@@ -0,0 +1,47 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+# Run in a fresh interpreter so nothing imported by other tests (the Gemini SDK, say) is already loaded
+SCRIPT = """
+import json, sys
+from sqlalchemy import inspect
+from app import create_app, prepare_database, db
+
+fresh = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': sys.argv[1]})
+with fresh.app_context():
+    before = inspect(db.engine).get_table_names()
+prepare_database(fresh)
+with fresh.app_context():
+    after = inspect(db.engine).get_table_names()
+print(json.dumps({
+    'genai_imported': 'google.generativeai' in sys.modules,
+    'startup': fresh.extensions['startup'],
+    'tables_before': before,
+    'tables_after': after,
+    'index_url': fresh.url_map.bind('localhost').build('main.index'),
+}))
+"""
+
+class StartupTest(unittest.TestCase):
+    def test_import_and_create_app_are_lazy(self):
+        db_file = os.path.join(tempfile.mkdtemp(prefix='pathseeker-startup-'), 'startup.db')
+        env = dict(os.environ, GOOGLE_API_KEY='')
+        output = subprocess.run([sys.executable, '-c', SCRIPT, f'sqlite:///{db_file}'], env=env,
+                                cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, timeout=60, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+
+        self.assertFalse(result['genai_imported'])
+        self.assertEqual(result['tables_before'], [])
+        self.assertIn('user', result['tables_after'])
+        self.assertIn('schema_version', result['tables_after'])
+        self.assertEqual(result['index_url'], '/')
+        startup = result['startup']
+        self.assertGreater(startup['import_to_ready_seconds'], startup['create_app_seconds'])
+
+if __name__ == '__main__':
+    unittest.main()
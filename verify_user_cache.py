@@ -0,0 +1,49 @@
+import unittest
+from app import create_app, db, User
+from werkzeug.security import check_password_hash
+from user_cache import user_cache
+
+class UserCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.flask_app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+        self.app = self.flask_app.test_client()
+        with self.flask_app.app_context():
+            db.create_all()
+        self.app.post('/register', data=dict(name='Mentor One', email='mentor@example.com', password='password',
+                                             role='mentor', skills='Python', bio='Hi'))
+
+    def tearDown(self):
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_loader_hits_cache_and_profile_edit_invalidates(self):
+        self.app.get('/notifications/check')
+        self.app.get('/notifications/check')
+        with self.flask_app.app_context():
+            stats = user_cache.stats()
+        self.assertEqual((stats['misses'], stats['hits']), (1, 1))
+
+        response = self.app.post('/edit-profile', data=dict(name='Mentor Renamed', email='mentor@example.com',
+                                                             education='Graduate', skills='Go', bio='Hello'))
+        self.assertEqual(response.status_code, 302)
+        with self.flask_app.app_context():
+            self.assertIsNone(user_cache.backend.get('user:1'))
+            self.assertEqual(user_cache.get(1).name, 'Mentor Renamed')
+            # A cached copy is usable like a normally loaded row
+            cached = user_cache.get(1)
+            self.assertEqual([s.name for s in cached.skill_tags], ['go'])
+            cached.bio = 'Updated'
+            db.session.commit()
+            self.assertEqual(db.session.get(User, 1).bio, 'Updated')
+
+    def test_password_hash_is_not_cached(self):
+        self.app.get('/notifications/check')
+        with self.flask_app.app_context():
+            self.assertNotIn('password', user_cache.backend.get('user:1'))
+            cached = user_cache.get(1)
+            # Loaded from the database when something needs it
+            self.assertTrue(check_password_hash(cached.password, 'password'))
+
+if __name__ == '__main__':
+    unittest.main()